@@ -1,17 +1,20 @@
 """Rebuilds the exported references, curves, constraints and
 connections in the Maya scene."""
 
-import maya.cmds as cmds
+from animlib.scene import cmds
 import animlib.channel
+import animlib.document
 import animlib.info
 import animlib.reference
 import animlib.curve
-import animlib.constraint
-import animlib.pairblend
+import animlib.handler
 import animlib.retime
+import animlib.bake
+import animlib.trace
 import pprint
 
 #======================================================================
+@animlib.trace.traced('apply.build')
 def build(data,
           reference_filter=None,
           channel_filter=None,
@@ -20,15 +23,24 @@ def build(data,
           force_build=False,
           retime_filter=None,
           anim_blend_filter=None,
+          curve_instancing=False,
           ):
     """Rebuilds the given references, animation curves and constraints
     then uses the channel data to rebuild connections or set values.
     
     reference_filter: remaps the source data
     build_unfound: if a remapped namespace is empty, try to import a rig 
+    curve_instancing: tokens sharing a curve payload connect to a single
+                      curve instead of a duplicate each
+    
+    The data may be the export data or an animlib.document.AnimDocument,
+    of which only the entries of the tokens that are built or applied
+    are decoded.
     """
 
     # Unpack the data.
+    if not isinstance(data, animlib.document.AnimDocument):
+        data = animlib.document.wrap(data)
     (info_data,
      dependency_data,
      reference_data,
@@ -36,177 +48,240 @@ def build(data,
      constraint_data,
      pairblend_data,
      channel_data,) = data
+    node_handlers = animlib.handler.handlers()
 
     #=== BUILD REFRENCES ===============================================
     # If there is no reference filter then populate a default filter 
     # with all namespaces, attempting to use source namespaces and to
     # build all inputs.
-    if not reference_filter:
-        reference_filter = {}
-        for reference in reference_data.keys():
-            source_namespace = reference_data[reference]['namespace']
-            reference_filter[source_namespace]=(source_namespace,
-                                                'connections')
-            
-    # Attempt to remap the source tokens to the namespaces in the 
-    # reference filter.
-    print 'Processing {0} References.'.format(len(reference_filter))
-    remap = {}
-    token_mode = {}
-    scene_namespaces = ref_namespaces()
-    for source_namespace in reference_filter.keys():
-        token = info_data['references'][source_namespace]['token']
-        dest_namespace = reference_filter[source_namespace][0]
-        if not dest_namespace:
-            continue
-        if force_build:
-            namespace = animlib.reference.build(reference_data[token],
-                                         ref_namespace=dest_namespace)
-            if namespace:
-                remap[token] = namespace
-        else:
-            # If the namespace exists and belongs to a reference file  
-            # then add it to the remap dictionary.
-            if dest_namespace in scene_namespaces:
-                remap[token] = dest_namespace
+    with animlib.trace.span('apply.references') as span:
+        if not reference_filter:
+            reference_filter = {}
+            for reference in reference_data.keys():
+                source_namespace = reference_data[reference]['namespace']
+                reference_filter[source_namespace]=(source_namespace,
+                                                    'connections')
             
-            # Else if build unfound is true attempt to import the 
-            # original rig and remap to the resulting reference.  
-            elif reference_unfound:
+        # Attempt to remap the source tokens to the namespaces in the 
+        # reference filter.
+        print 'Processing {0} References.'.format(len(reference_filter))
+        remap = {}
+        token_mode = {}
+        scene_namespaces = ref_namespaces()
+        for source_namespace in reference_filter.keys():
+            token = info_data['references'][source_namespace]['token']
+            dest_namespace = reference_filter[source_namespace][0]
+            if not dest_namespace:
+                continue
+            if force_build:
                 namespace = animlib.reference.build(reference_data[token],
-                                        ref_namespace=dest_namespace)
+                                             ref_namespace=dest_namespace)
                 if namespace:
                     remap[token] = namespace
-        token_mode[token] = reference_filter[source_namespace][1]
+            else:
+                # If the namespace exists and belongs to a reference file  
+                # then add it to the remap dictionary.
+                if dest_namespace in scene_namespaces:
+                    remap[token] = dest_namespace
+            
+                # Else if build unfound is true attempt to import the 
+                # original rig and remap to the resulting reference.  
+                elif reference_unfound:
+                    namespace = animlib.reference.build(reference_data[token],
+                                            ref_namespace=dest_namespace)
+                    if namespace:
+                        remap[token] = namespace
+            token_mode[token] = reference_filter[source_namespace][1]
+        span.count(references=len(reference_filter), remapped=len(remap))
           
     #=== BUILD DEPENDENT NODES =========================================
     # For the references that have successfully been remapped create a
     # set of curves, constraints and pair blends based on the dependency 
     # data and the reference filter apply settings.
-    new = []
-    for reference in remap.keys():
-        # Retrieve the 'apply filter' for this reference.
-        source_namespace = reference_data[reference]['namespace']
-        filter = reference_filter[source_namespace][1]
-        if filter == 'skip':
-            continue
-        if reference in dependency_data:
-            # Apply the filter to the dependent nodes to determine which
-            # should be built.
-            dependencies = dependency_data[reference]
-            if filter in ['connections', 'constraints']:
-                nodes = []
-                nodes+=[x for x in dependencies if x.startswith('@CON')]
-                nodes+=[x for x in dependencies if x.startswith('@PRB')]
-                new += nodes
-                if filter == 'constraints':
-                    for node in nodes:
-                        token_mode[node]='constraints'
-            if filter in ['connections', 'curves']:
-                new +=  [x for x in dependencies if x.startswith('@CRV')]
+    with animlib.trace.span('apply.dependencies') as span:
+        new = []
+        for reference in remap.keys():
+            # Retrieve the 'apply filter' for this reference.
+            source_namespace = reference_data[reference]['namespace']
+            filter = reference_filter[source_namespace][1]
+            if filter == 'skip':
+                continue
+            if reference in dependency_data:
+                # Apply the filter to the dependent nodes to determine which
+                # should be built.
+                dependencies = dependency_data[reference]
+                for handler in node_handlers:
+                    if not filter in handler.filters:
+                        continue
+                    nodes = [x for x in dependencies
+                             if x.startswith(handler.prefix)]
+                    new += nodes
+                    if filter == 'constraints':
+                        for node in nodes:
+                            token_mode[node]='constraints'
                 
             
-    # Travel through the dependency tree to gather upstream nodes.
-    processed = []
-    while new:
-        tokens = new[:]
-        processed += tokens
-        new = []
-        for token in tokens:
-            if token in dependency_data:
-                dependencies = dependency_data[token]
-                new += [x for x in dependencies if x not in processed]
+        # Travel through the dependency tree to gather upstream nodes.
+        processed = []
+        while new:
+            tokens = new[:]
+            processed += tokens
+            new = []
+            for token in tokens:
+                if token in dependency_data:
+                    dependencies = dependency_data[token]
+                    new += [x for x in dependencies if x not in processed]
                 
-    # Collate the dependencies into lists by type.
-    pairblends = [x for x in processed if x.startswith('@PRB')]
-    constraints = [x for x in processed if x.startswith('@CON')]
-    curves = [x for x in processed if x.startswith('@CRV')]
+        # Collate the dependencies into lists by handler prefix.
+        built_tokens = {}
+        for handler in node_handlers:
+            built_tokens[handler.prefix] = sorted(set(
+                    [x for x in processed if x.startswith(handler.prefix)]))
+        curves = built_tokens[animlib.handler.CURVE]
+        span.count(tokens=len(processed))
             
-    # Build the pairBlend curves, remapping the token to the new node.
-    pairblends = list(set(pairblends))
-    if pairblends:
-        print 'Building {0} Pair Blends.'.format(len(pairblends))
-        for pairblend in pairblends:
-            new_prb = animlib.pairblend.build(pairblend_data[pairblend],
-                                              remap)
-            remap[pairblend] = new_prb
-        print
-        
-    # Build the constraints, remapping the token to the new constraint.
-    constraints = list(set(constraints))
-    if constraints:
-        print 'Building {0} Constraints.'.format(len(constraints))
-        for constraint in constraints:
-            new_con = animlib.constraint.build(
-                                           constraint_data[constraint])
-            remap[constraint] = new_con
-        print
+    # Build the pairBlends, constraints and other nodes in the order
+    # their handlers were registered, remapping each token to its new
+    # node. The anim curves are built below.
+    for handler in node_handlers:
+        if handler.prefix == animlib.handler.CURVE:
+            continue
+        with animlib.trace.span('apply.'+handler.name) as span:
+            tokens = built_tokens[handler.prefix]
+            if tokens:
+                print 'Building {0} {1}.'.format(len(tokens), handler.label)
+                for token in tokens:
+                    remap[token] = handler.build(data[handler.section][token],
+                                                 remap)
+                print
+            span.count(nodes=len(tokens))
         
     # Build the anim curves, remapping the token to the new curve. Apply
     # any retime value.
-    curves = list(set(curves))
-    if curves:
-        print 'Building {0} Curves.'.format(len(curves))
-        for anim_curve in curves:
-            new_curve = animlib.curve.build(anim_curve_data[anim_curve])
-            remap[anim_curve] = new_curve
+    # Curves that share their data with another token are built once
+    # and then duplicated, or instanced if curve_instancing is True.
+    with animlib.trace.span('apply.curves') as span:
+        if curves:
+            print 'Building {0} Curves.'.format(len(curves))
+            built = {}
+            for anim_curve in curves:
+                data = anim_curve_data[anim_curve]
+                source = data.get('shared', anim_curve)
+                if source in built:
+                    if curve_instancing:
+                        remap[anim_curve] = built[source]
+                        continue
+                    new_curve = cmds.duplicate(built[source],
+                                               name=data['name'])[0]
+                else:
+                    new_curve = animlib.curve.build(
+                            dict(anim_curve_data[source], name=data['name']))
+                    built[source] = new_curve
+                    anim_curve_data.release(source)
+                anim_curve_data.release(anim_curve)
+                remap[anim_curve] = new_curve
             if retime_filter:
-                new_curve = animlib.retime.curve(new_curve, 
-                                                 retime_filter)
+                for new_curve in sorted(set([remap[x] for x in curves])):
+                    animlib.retime.curve(new_curve, retime_filter)
+        span.count(curves=len(curves))
     
     print token_mode
     
+    # === BUILD BAKED SAMPLES ==========================================
+    # Key the baked samples of each channel that takes connections onto
+    # a new curve, created with all its keys at once.
+    baked = {}
+    sample_data = info_data.get('samples')
+    with animlib.trace.span('apply.baked') as span:
+        if sample_data:
+            targets = {}
+            for channel in sample_data['channels']:
+                token = None
+                if channel.startswith('@'):
+                    token = channel.split('!')[0]+'!'
+                if token_mode.get(token) in ['skip',
+                                             'pass',
+                                             'values',
+                                             'constraints']:
+                    continue
+                target = remap_name(channel, remap)
+                if '@' not in target and cmds.objExists(target):
+                    targets[channel] = target
+            print 'Building {0} Baked Curves.'.format(len(targets))
+            baked = animlib.bake.build(sample_data, targets)
+            if retime_filter:
+                for new_curve in sorted(baked.values()):
+                    animlib.retime.curve(new_curve, retime_filter)
+            print
+        span.count(curves=len(baked))
+    
     # === CONNECT NODES / APPLY VALUES ON CHANNELS =====================
     # Apply the channel data.
-    if channel_data:
-        # Report the number of channels
-        i = 0
-        for token in channel_data:
-            i += len(channel_data[token])
-        print 'Applying data to {0} channels.'.format(i)
+    with animlib.trace.span('apply.channels') as span:
+        if channel_data:
+            # Only the channels of nodes that aren't tokenised, or whose
+            # token was remapped, can be applied.
+            tokens = [x for x in channel_data
+                      if x is None or not x.startswith('@') or x in remap]
+            
+            # Report the number of channels
+            i = 0
+            for token in tokens:
+                i += len(channel_data[token])
+            print 'Applying data to {0} channels.'.format(i)
         
-        # Process the channels by the token they belong to.
-        for token in channel_data:
+            # Process the channels by the token they belong to.
+            for token in tokens:
         
-            # Figure out what data we're applying. If the mode is skip
-            # or pass, we don't want to apply any data. If the mode is
-            # constraints, we only want to do connections that start or
-            # end in a pair blend or constraint. If the mode is 'curves'
-            # 
-            apply_mode = 'all'
-            if token in token_mode:
-                apply_mode = token_mode[token]
-                if apply_mode in ['skip', 'pass']:
-                    continue
-            for channel in channel_data[token].keys():
-                data = channel_data[token][channel]
-                if apply_mode == 'values':
-                    data = (None, data[1], data[2], data[3])
-                elif apply_mode == 'constraints':
-                    print '$$$'+str(data[0])
-                    if data[0] and '@CRV' in data[0]:
+                # Figure out what data we're applying. If the mode is skip
+                # or pass, we don't want to apply any data. If the mode is
+                # constraints, we only want to do connections that start or
+                # end in a pair blend or constraint. If the mode is 'curves'
+                # 
+                apply_mode = 'all'
+                if token in token_mode:
+                    apply_mode = token_mode[token]
+                    if apply_mode in ['skip', 'pass']:
+                        continue
+                for channel in channel_data[token].keys():
+                    data = channel_data[token][channel]
+                    if apply_mode == 'values':
                         data = (None, data[1], data[2], data[3])
+                    elif apply_mode == 'constraints':
+                        print '$$$'+str(data[0])
+                        if (data[0] and data[0].startswith(
+                                                animlib.handler.CURVE)):
+                            data = (None, data[1], data[2], data[3])
+                        else:
+                            data = (remap_name(data[0], remap),
+                                    data[1], data[2], data[3])
                     else:
                         data = (remap_name(data[0], remap),
                                 data[1], data[2], data[3])
-                else:
-                    data = (remap_name(data[0], remap),
-                            data[1], data[2], data[3])
-                        
+                
+                    # Connect channels to their baked curve.
+                    if channel in baked:
+                        data = (baked[channel]+'.output',
+                                data[1], data[2], data[3])
                         
-                # Apply the channel data.
-                channel = remap_name(channel, remap)
-                if '@' in channel:
-                    continue
-                animlib.channel.set(channel,
-                                    data,
-                                    skip_connected=False,
-                                    blend_filter = anim_blend_filter)
-        print
+                    # Apply the channel data.
+                    channel = remap_name(channel, remap)
+                    if '@' in channel:
+                        continue
+                    animlib.channel.set(channel,
+                                        data,
+                                        skip_connected=False,
+                                        blend_filter = anim_blend_filter)
+                    span.count(channels=1)
+                channel_data.release(token)
+            print
             
     # Clean up any constraints
-    for constraint in list(set(constraints)):
-        animlib.constraint.tidy_constraint_node(remap[constraint])
+    with animlib.trace.span('apply.tidy'):
+        for handler in node_handlers:
+            if handler.tidy:
+                for token in built_tokens[handler.prefix]:
+                    handler.tidy(remap[token])
         
     return None
 
@@ -0,0 +1,139 @@
+"""Samples channels per frame into a compact binary block, and rebuilds
+the samples as keys.
+
+Baked exports skip the curve, constraint and pairBlend networks behind
+the channels. The samples are stored channel by channel as a flat
+array of little-endian floats, written next to the .anim file, and
+rebuilt as one linear keyed anim curve per channel.
+"""
+import array
+import math
+import os.path
+import sys
+from animlib.scene import cmds
+import animlib.curve
+
+EXT = '.samples'
+
+# The array typecodes of the supported sample types.
+SAMPLE_TYPES = {'float32': 'f',
+                'float64': 'd',}
+
+# The anim curve type used to rebuild each attribute type. Anything
+# else is rebuilt with a unitless curve.
+CURVE_TYPES = {'doubleLinear': 'animCurveTL',
+               'doubleAngle': 'animCurveTA',}
+
+# Attribute types that hold whole numbers, which are keyed with stepped
+# tangents.
+STEPPED_TYPES = ('bool',
+                 'long',
+                 'short',
+                 'byte',
+                 'char',
+                 'enum',)
+
+#======================================================================
+def frames(frame_range, step=1.0):
+    """Returns the list of frames sampled over the inclusive frame range
+    at the given step."""
+    start, end = frame_range
+    count = int(math.floor((end - start) / float(step) + 1e-9)) + 1
+    return [start + i*step for i in range(max(count, 0))]
+
+
+#======================================================================
+def sample(channel_list, frame_list, sample_type='float32'):
+    """Returns a tuple of an array of the values of each channel at each
+    frame, with all the frames of one channel followed by those of the
+    next, and the list of channels in the array. Channels that hold one
+    value over every frame are left out, as their value is enough to
+    rebuild them."""
+    if sample_type not in SAMPLE_TYPES:
+        cmds.error("Unknown sample type {0}, expected one of: "
+                   "{1}".format(sample_type, sorted(SAMPLE_TYPES)))
+    samples = array.array(SAMPLE_TYPES[sample_type])
+    sampled = []
+    for channel in channel_list:
+        values = [float(cmds.getAttr(channel, time=x)) for x in frame_list]
+        if len(set(values)) > 1:
+            samples.extend(values)
+            sampled.append(channel)
+    return (samples, sampled)
+
+
+#======================================================================
+def write(filepath, samples):
+    """Writes the sample array to the filepath as little-endian floats.
+    Returns the filepath."""
+    if sys.byteorder == 'big':
+        samples = array.array(samples.typecode, samples)
+        samples.byteswap()
+    with open(filepath, 'wb') as sample_file:
+        samples.tofile(sample_file)
+    return filepath
+
+
+#======================================================================
+def read(filepath, sample_type, count):
+    """Reads an array of count little-endian samples of the given type
+    from the filepath."""
+    samples = array.array(SAMPLE_TYPES[sample_type])
+    with open(filepath, 'rb') as sample_file:
+        try:
+            samples.fromfile(sample_file, count)
+        except EOFError:
+            raise IOError("Expected {0} samples in {1}, found "
+                          "{2}.".format(count, filepath, len(samples)))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples
+
+
+#======================================================================
+def sample_filepath(anim_filepath):
+    """Returns the path of the sample file stored with an anim file."""
+    return os.path.splitext(anim_filepath)[0] + EXT
+
+
+#======================================================================
+def build(sample_data, targets):
+    """Keys the sampled values onto scene channels. The targets map the
+    exported channel names to the channels to key, and only those
+    channels are built. Each channel gets a new anim curve with one key
+    per frame, created in bulk. Returns a dictionary of the new curve
+    for each exported channel name."""
+    frame_list = frames((sample_data['start'], sample_data['end']),
+                        sample_data['step'])
+    frame_count = len(frame_list)
+    samples = sample_data['data']
+    curves = {}
+    for index, channel in enumerate(sample_data['channels']):
+        if channel not in targets:
+            continue
+        target = targets[channel]
+        data_type = sample_data['types'][index]
+        in_type = animlib.curve.type_index('linear')
+        out_type = in_type
+        if data_type in STEPPED_TYPES:
+            out_type = animlib.curve.type_index('step')
+        start = index * frame_count
+        keys = {'time': frame_list,
+                'value': list(samples[start:start+frame_count]),
+                'in_type': [in_type]*frame_count,
+                'in_angle': [0.0]*frame_count,
+                'in_weight': [1.0]*frame_count,
+                'out_type': [out_type]*frame_count,
+                'out_angle': [0.0]*frame_count,
+                'out_weight': [1.0]*frame_count,
+                'locked': [True]*frame_count,}
+
+        # Name the curve after the channel, as Maya does when keying.
+        name = target.split(':')[-1].replace('.', '_')
+        node_type = CURVE_TYPES.get(data_type, 'animCurveTU')
+        anim_curve = cmds.createNode(node_type,
+                                     name=name,
+                                     skipSelect=True)
+        animlib.curve.set_keys(anim_curve, keys, False, node_type)
+        curves[channel] = anim_curve
+    return curves
@@ -0,0 +1,433 @@
+"""Exports the animation of many scene files at once, spread across a
+pool of headless mayapy worker processes.
+
+A manifest is a json list of jobs, one per scene file:
+
+    [{"scene": "/shots/sq010/sh0010/anim.mb",
+      "namespaces": ["hero01", "prop03"],
+      "node_filter": "*_ctrl",
+      "output": "/library/sq010/sh0010"},]
+
+Each job opens its scene and writes an anim file for each namespace
+into its output directory, or a single anim file for all of them in
+one pass if it sets "single_pass": true. Jobs that fail or run past the
+timeout are retried. From a shell:
+
+    mayapy -m animlib.batch manifest.json --processes 8 --report out.json
+
+The jobs can also be run one after another in this process, against
+the current animlib.scene backend, by passing in_process=True to run().
+This is how a batch is tested on an animlib.memscene.Scene without
+Maya.
+"""
+import argparse
+import collections
+import json
+import os
+import os.path
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from animlib.scene import cmds
+import animlib.export_wrapper
+import animlib.file
+
+# Values used for any setting a job in the manifest leaves out.
+JOB_DEFAULTS = {'node_filter': '*_ctrl',
+                'keyable': True,
+                'nonkeyable': True,
+                'single_pass': False,
+                'export': {},}
+
+# The command that starts a worker process.
+MAYAPY = ['mayapy']
+
+# Seconds between checks on the running workers.
+POLL_INTERVAL = 0.2
+
+#======================================================================
+class ProcessWorker(object):
+    """Runs one attempt at a job in a mayapy process. The job is passed
+    in a json file, and the worker writes its result to another, next
+    to a log of the worker's output."""
+
+    def __init__(self, job, command, directory):
+        self.job = job
+        name = 'job{0}_{1}'.format(job['index'], job['attempt'])
+        self.job_path = os.path.join(directory, name+'.json')
+        self.result_path = os.path.join(directory, name+'_result.json')
+        self.log_path = os.path.join(directory, name+'.log')
+        with open(self.job_path, 'w') as job_file:
+            json.dump(job, job_file)
+
+        # Make sure the worker can import this package.
+        env = dict(os.environ)
+        package_root = os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join(
+                    [package_root] + [x for x in [env.get('PYTHONPATH')]
+                                      if x])
+        self.log = open(self.log_path, 'w')
+        try:
+            self.process = subprocess.Popen(
+                            command + ['-m', 'animlib.batch',
+                                       '--job', self.job_path,
+                                       '--result', self.result_path],
+                            stdout=self.log,
+                            stderr=subprocess.STDOUT,
+                            env=env)
+        except OSError:
+            self.log.close()
+            raise
+
+    def poll(self):
+        """Returns True once the worker has finished."""
+        return self.process.poll() is not None
+
+    def kill(self):
+        """Stops the worker."""
+        if not self.poll():
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
+
+    def result(self):
+        """Returns the result the worker wrote, or a failure if it wrote
+        none."""
+        self.log.close()
+        if os.path.exists(self.result_path):
+            with open(self.result_path, 'r') as result_file:
+                return json.load(result_file)
+        return failure(self.job,
+                       "Worker exited with code {0}, see {1}".format(
+                                                    self.process.returncode,
+                                                    self.log_path))
+
+
+#======================================================================
+class InProcessWorker(object):
+    """Runs one attempt at a job in this process, against the current
+    scene backend. The job is run as soon as the worker is created, so
+    it cannot be stopped by a timeout."""
+
+    def __init__(self, job, command=None, directory=None):
+        self.job = job
+        self.outcome = run_job(job)
+
+    def poll(self):
+        """Returns True, as the job has already run."""
+        return True
+
+    def kill(self):
+        """Does nothing, as the job has already run."""
+        pass
+
+    def result(self):
+        """Returns the result of the job."""
+        return self.outcome
+
+
+#======================================================================
+class FailedWorker(object):
+    """Stands in for a worker that could not be started, such as when
+    the mayapy command is not found, with the failure as its result."""
+
+    def __init__(self, job, error):
+        self.job = job
+        self.outcome = failure(job,
+                               "Could not start worker: {0}".format(error))
+
+    def poll(self):
+        """Returns True, as there is nothing to wait for."""
+        return True
+
+    def kill(self):
+        """Does nothing, as there is nothing running."""
+        pass
+
+    def result(self):
+        """Returns the failure."""
+        return self.outcome
+
+
+#======================================================================
+def read_manifest(filepath):
+    """Reads a json manifest and returns its list of jobs with any
+    missing settings filled in."""
+    with open(filepath, 'r') as manifest_file:
+        jobs = json.load(manifest_file)
+    return [prepare_job(x) for x in jobs]
+
+
+#======================================================================
+def prepare_job(job):
+    """Returns a copy of the job with the defaults filled in. Raises a
+    ValueError if it has no scene, namespaces or output directory."""
+    for key in ('scene', 'namespaces', 'output'):
+        if not job.get(key):
+            raise ValueError("Batch job is missing '{0}': {1}".format(
+                                                                key, job))
+    prepared = dict(JOB_DEFAULTS)
+    prepared.update(job)
+    if not isinstance(prepared['namespaces'], list):
+        prepared['namespaces'] = [prepared['namespaces']]
+    return prepared
+
+
+#======================================================================
+def output_filepath(job, namespace=None):
+    """Returns the anim filepath for a namespace of the job, named after
+    the scene and the namespace, or for all of its namespaces, named
+    after the scene alone."""
+    scene_name = os.path.splitext(os.path.basename(job['scene']))[0]
+    if namespace is None:
+        return os.path.join(job['output'], scene_name+animlib.file.EXT)
+    return os.path.join(job['output'], '{0}_{1}{2}'.format(
+                                        scene_name,
+                                        namespace.strip(':').replace(':',
+                                                                     '_'),
+                                        animlib.file.EXT))
+
+
+#======================================================================
+def export_job(job):
+    """Opens the scene of the job and exports each of its namespaces,
+    or all of them at once if the job is single_pass, returning the
+    result with the filepath, size and time taken for each anim file."""
+    start_time = time.time()
+    cmds.file(job['scene'], open=True, force=True)
+    if job['single_pass']:
+        exports = [(job['namespaces'], output_filepath(job))]
+    else:
+        exports = [([x], output_filepath(job, x)) for x in job['namespaces']]
+    files = []
+    for namespaces, filepath in exports:
+        file_start = time.time()
+        animlib.export_wrapper.export_scene_file(
+                                        filepath,
+                                        namespaces,
+                                        node_filter=job['node_filter'],
+                                        keyable=job['keyable'],
+                                        nonkeyable=job['nonkeyable'],
+                                        **job['export'])
+        files.append({'namespace': ' '.join(namespaces),
+                      'filepath': filepath,
+                      'bytes': os.path.getsize(filepath),
+                      'seconds': time.time() - file_start,})
+    return {'scene': job['scene'],
+            'status': 'ok',
+            'files': files,
+            'seconds': time.time() - start_time,}
+
+
+#======================================================================
+def run_job(job):
+    """Exports the job, returning a failure result in place of any
+    error it raises."""
+    try:
+        return export_job(job)
+    except Exception:
+        return failure(job, traceback.format_exc())
+
+
+#======================================================================
+def failure(job, error, status='failed'):
+    """Returns the result of a job that did not finish."""
+    return {'scene': job['scene'],
+            'status': status,
+            'error': error,
+            'files': [],
+            'seconds': 0.0,}
+
+
+#======================================================================
+def run(jobs,
+        processes=4,
+        timeout=600.0,
+        retries=1,
+        command=None,
+        in_process=False,
+        directory=None):
+    """Exports the jobs across a pool of worker processes and returns a
+    result for each job, in order.
+
+    Up to processes workers run at once, each started with command, a
+    list that defaults to MAYAPY. A worker that runs longer than the
+    timeout in seconds is stopped. A job that fails or times out is
+    tried again up to retries more times. The job, result and log files
+    of the workers are kept in directory, or a new temporary directory.
+
+    If in_process is True the jobs are run one at a time in this process
+    instead, against the current scene backend, and the timeout does
+    not apply.
+
+    Each result records when its job was first started and when its
+    last attempt finished, as epoch seconds under 'started' and
+    'finished'. A worker that cannot be started fails its attempt, and
+    any workers still running if run() is interrupted are stopped.
+    """
+    jobs = [prepare_job(x) for x in jobs]
+    if command is None:
+        command = MAYAPY
+    if directory is None and not in_process:
+        directory = tempfile.mkdtemp(prefix='animlib_batch_')
+    worker_type = ProcessWorker
+    if in_process:
+        worker_type = InProcessWorker
+        processes = 1
+
+    print('Exporting {0} scenes.'.format(len(jobs)))
+    pending = collections.deque([(x, 0) for x in range(len(jobs))])
+    running = {}
+    started = {}
+    results = [None] * len(jobs)
+    try:
+        while pending or running:
+            # Start jobs until the pool is full.
+            while pending and len(running) < processes:
+                index, attempt = pending.popleft()
+                job = dict(jobs[index], index=index, attempt=attempt)
+                start_time = time.time()
+                started.setdefault(index, start_time)
+                try:
+                    worker = worker_type(job, command, directory)
+                except OSError as error:
+                    worker = FailedWorker(job, error)
+                running[index] = (worker, attempt, start_time)
+
+            # Collect the jobs that have finished or run out of time.
+            for index in sorted(running):
+                worker, attempt, start_time = running[index]
+                if worker.poll():
+                    result = worker.result()
+                elif time.time() - start_time > timeout:
+                    worker.kill()
+                    result = failure(jobs[index],
+                                     "Timed out after {0}s".format(timeout),
+                                     status='timeout')
+                else:
+                    continue
+                del running[index]
+                result['attempts'] = attempt + 1
+                result['finished'] = time.time()
+                result['started'] = started[index]
+                result['wall_seconds'] = result['finished'] - start_time
+                if result['status'] != 'ok' and attempt < retries:
+                    print(" > Retrying {0} ({1}).".format(
+                                                    jobs[index]['scene'],
+                                                    result['status']))
+                    pending.append((index, attempt + 1))
+                else:
+                    results[index] = result
+
+            if running:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        for worker, attempt, start_time in running.values():
+            worker.kill()
+    return results
+
+
+#======================================================================
+def summarise(results):
+    """Returns the number of jobs, failures, anim files and bytes
+    written and the time taken by the results. The time is from the
+    start of the first job to the end of the last, as jobs run in
+    parallel, or the sum of their times for results that don't record
+    when they ran."""
+    files = [x for result in results for x in result['files']]
+    timed = [x for x in results if 'started' in x]
+    if results and len(timed) == len(results):
+        seconds = (max([x['finished'] for x in timed]) -
+                   min([x['started'] for x in timed]))
+    else:
+        seconds = sum([x.get('wall_seconds', x['seconds'])
+                       for x in results])
+    return {'jobs': len(results),
+            'failed': len([x for x in results if x['status'] != 'ok']),
+            'files': len(files),
+            'bytes': sum([x['bytes'] for x in files]),
+            'seconds': seconds,}
+
+
+#======================================================================
+def report(results, filepath=None):
+    """Prints the time taken and the anim files written by each job
+    followed by the summary, and writes them as json to the filepath if
+    given."""
+    for result in results:
+        print(" > {0}: {1} in {2:.2f}s ({3} attempts).".format(
+                                    result['scene'],
+                                    result['status'],
+                                    result.get('wall_seconds',
+                                               result['seconds']),
+                                    result.get('attempts', 1)))
+        for anim_file in result['files']:
+            print("     {0}: {1} bytes in {2:.2f}s.".format(
+                                                anim_file['filepath'],
+                                                anim_file['bytes'],
+                                                anim_file['seconds']))
+        if result['status'] != 'ok':
+            print("     {0}".format(result['error'].strip()
+                                                .splitlines()[-1]))
+    summary = summarise(results)
+    print(" > Exported {0} files, {1} bytes, from {2} scenes with {3} "
+          "failures in {4:.2f}s.".format(summary['files'],
+                                         summary['bytes'],
+                                         summary['jobs'],
+                                         summary['failed'],
+                                         summary['seconds']))
+    if filepath:
+        with open(filepath, 'w') as report_file:
+            json.dump({'summary': summary, 'results': results},
+                      report_file,
+                      indent=2)
+    return summary
+
+
+#======================================================================
+def work(job_path, result_path):
+    """Runs a single job inside a worker process, starting Maya without
+    its interface and writing the result to the result path."""
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    with open(job_path, 'r') as job_file:
+        job = json.load(job_file)
+    result = run_job(job)
+    with open(result_path, 'w') as result_file:
+        json.dump(result, result_file)
+
+
+#======================================================================
+def main(argv=None):
+    """Runs a manifest from the command line, or a single job when
+    started as a worker."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('manifest', nargs='?')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=600.0)
+    parser.add_argument('--retries', type=int, default=1)
+    parser.add_argument('--mayapy', default=MAYAPY[0])
+    parser.add_argument('--report')
+    parser.add_argument('--job', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.job:
+        work(args.job, args.result)
+        return 0
+    if not args.manifest:
+        parser.error("A manifest is required.")
+    results = run(read_manifest(args.manifest),
+                  processes=args.processes,
+                  timeout=args.timeout,
+                  retries=args.retries,
+                  command=[args.mayapy])
+    summary = report(results, args.report)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Measures the cost of the export and apply engine by counting the
+Maya commands it makes and timing how long they take."""
+
+import os.path
+import time
+import animlib.bake
+import animlib.curve
+import animlib.export
+import animlib.file
+import animlib.scene
+
+#======================================================================
+class CallCounter(object):
+    """Stands in for a scene backend and counts the calls made to each
+    command before passing them on."""
+
+    def __init__(self, cmds):
+        self.cmds = cmds
+        self.counts = {}
+
+    def __getattr__(self, name):
+        command = getattr(self.cmds, name)
+        if not callable(command):
+            return command
+        def counted(*args, **kwargs):
+            self.counts[name] = self.counts.get(name, 0) + 1
+            return command(*args, **kwargs)
+        return counted
+
+    def total(self):
+        """Returns the number of commands called."""
+        return sum(self.counts.values())
+
+#======================================================================
+def count_calls(func, *args, **kwargs):
+    """Runs func with the scene backend wrapped in a CallCounter, so the
+    commands made by every module are counted. Returns a tuple of the
+    result, the counter and the time taken in seconds."""
+    backend = animlib.scene.get_backend()
+    counter = CallCounter(backend)
+    animlib.scene.set_backend(counter)
+    start_time = time.time()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        animlib.scene.set_backend(backend)
+    return (result, counter, time.time() - start_time)
+
+#======================================================================
+def curve_export(anim_curves):
+    """Compares the number of commands used to gather the key data of
+    each curve key by key against the whole-curve query. Prints a
+    table and returns a list of (curve, keys, per-key calls, bulk
+    calls) tuples."""
+    def per_key(anim_curve):
+        key_count = animlib.scene.cmds.keyframe(anim_curve,
+                                                keyframeCount=True,
+                                                query=True)
+        return [animlib.curve.key_info_by_index(anim_curve, i)
+                for i in range(key_count)]
+
+    results = []
+    print('{0:<40} {1:>6} {2:>10} {3:>10}'.format('Curve',
+                                                  'Keys',
+                                                  'Per key',
+                                                  'Bulk'))
+    for anim_curve in anim_curves:
+        old_data, old_count, old_time = count_calls(per_key, anim_curve)
+        new_data, new_count, new_time = count_calls(
+                                                animlib.curve.key_info_all,
+                                                anim_curve)
+        if old_data != new_data:
+            print(" > Key data differs: {0}".format(anim_curve))
+        results.append((anim_curve,
+                        len(old_data),
+                        old_count.total(),
+                        new_count.total(),))
+        print('{0:<40} {1:>6} {2:>10} {3:>10}'.format(*results[-1]))
+    return results
+
+#======================================================================
+def curve_build(curve_data):
+    """Compares the number of commands used to rebuild each curve in a
+    list of exported curve data key by key against the batched build.
+    The rebuilt curves are deleted afterwards. Prints a table and
+    returns a list of (curve, keys, per-key calls, batched calls)
+    tuples."""
+    def per_key(data):
+        anim_curve = animlib.scene.cmds.createNode(data['type'],
+                                                   skipSelect=True)
+        keys = data['keys']
+        for i in range(len(keys['time'])):
+            animlib.curve.add_keyframe(
+                        anim_curve,
+                        animlib.curve.key_row(keys, data['weighted'], i))
+        return anim_curve
+
+    def batched(data):
+        anim_curve = animlib.scene.cmds.createNode(data['type'],
+                                                   skipSelect=True)
+        return animlib.curve.set_keys(anim_curve,
+                                      data['keys'],
+                                      data['weighted'],
+                                      data['type'])
+
+    results = []
+    print('{0:<40} {1:>6} {2:>10} {3:>10}'.format('Curve',
+                                                  'Keys',
+                                                  'Per key',
+                                                  'Batched'))
+    for data in curve_data:
+        data = animlib.curve.upgrade(data)
+        old_curve, old_count, old_time = count_calls(per_key, data)
+        new_curve, new_count, new_time = count_calls(batched, data)
+        if (animlib.curve.key_info_all(old_curve) != 
+                                animlib.curve.key_info_all(new_curve)):
+            print(" > Rebuilt keys differ: {0}".format(data['name']))
+        animlib.scene.cmds.delete(old_curve, new_curve)
+        results.append((data['name'],
+                        len(data['keys']['time']),
+                        old_count.total(),
+                        new_count.total(),))
+        print('{0:<40} {1:>6} {2:>10} {3:>10}'.format(*results[-1]))
+    return results
+
+#======================================================================
+def baked_export(channel_list, frame_range, directory):
+    """Compares the size and read time of the library files written by
+    the graph export and the baked export of the channels over the
+    frame range. The files are written to the directory. Prints a table
+    and returns a list of (mode, bytes, read seconds) tuples."""
+    results = []
+    print('{0:<10} {1:>12} {2:>10}'.format('Export', 'Bytes', 'Read'))
+    for mode, kwargs in (('graph', {}),
+                         ('baked', {'bake_range': frame_range}),):
+        filepath = os.path.join(directory,
+                                'benchmark_{0}{1}'.format(mode,
+                                                          animlib.file.EXT))
+        data = animlib.export.channels(channel_list, **kwargs)
+        animlib.file.write(filepath, data, overwrite=True)
+        size = os.path.getsize(filepath)
+        if 'samples' in data[0]:
+            size += os.path.getsize(
+                                animlib.bake.sample_filepath(filepath))
+        start_time = time.time()
+        animlib.file.read(filepath)
+        results.append((mode, size, time.time() - start_time,))
+        print('{0:<10} {1:>12} {2:>10.4f}'.format(*results[-1]))
+    return results
+
+#======================================================================
+def compression(data, directory, levels=(1, 6, 9), repeats=3):
+    """Compares the size and the write and read time of an anim file of
+    the export data written with each codec at each level. The files
+    are written to the directory. Prints a table and returns a list of
+    (codec, level, bytes, ratio, write seconds, read seconds) tuples,
+    with the fastest of the repeated times."""
+    codecs = [x for x in animlib.file.CODECS
+              if x != 'lzma' or animlib.file.lzma]
+    results = []
+    print('{0:<6} {1:>5} {2:>12} {3:>7} {4:>10} {5:>10}'.format(
+                            'Codec', 'Level', 'Bytes', 'Ratio', 'Write', 'Read'))
+    for codec in codecs:
+        for level in (levels if codec else [None]):
+            filepath = os.path.join(directory,
+                                    'benchmark_{0}{1}{2}'.format(
+                                                        codec or 'none',
+                                                        level or '',
+                                                        animlib.file.EXT))
+            write_times = []
+            read_times = []
+            for i in range(repeats):
+                start_time = time.time()
+                animlib.file.write(filepath,
+                                   data,
+                                   overwrite=True,
+                                   codec=codec,
+                                   level=level)
+                write_times.append(time.time() - start_time)
+                start_time = time.time()
+                animlib.file.read(filepath)
+                read_times.append(time.time() - start_time)
+            size = os.path.getsize(filepath)
+            if not results:
+                raw_size = size
+            results.append((codec or 'none',
+                            '-' if level is None else level,
+                            size,
+                            float(raw_size) / size,
+                            min(write_times),
+                            min(read_times),))
+            print('{0:<6} {1:>5} {2:>12} {3:>7.2f} {4:>10.4f} '
+                  '{5:>10.4f}'.format(*results[-1]))
+    return results
@@ -1,6 +1,6 @@
 """Blends two curves together, inserting or merging the first curve into the second."""
 
-import maya.cmds as cmds
+from animlib.scene import cmds
 
 
 #! Note: it may be necessary to convert a non-weighted tangent curve to
@@ -0,0 +1,415 @@
+"""Keeps a catalog of the anim files in the library in a local SQLite
+database, so takes can be found without opening the files one by one.
+
+Each file is recorded with its size, modification and export times,
+channel, curve and constraint counts, frame range, and the namespace
+and rig file of each of its references. Scanning a directory again only
+reads the files whose modification time or size has changed, and
+forgets those that have gone:
+
+    with animlib.catalog.Catalog() as catalog:
+        catalog.scan(animlib.defaults.DEFAULT_FILEPATH)
+        takes = catalog.find(rig='hero.ma',
+                             namespace='hero01',
+                             start=datetime.datetime(2026, 10, 1),
+                             end=datetime.datetime(2026, 10, 31))
+
+From a shell:
+
+    python -m animlib.catalog scan /library
+    python -m animlib.catalog find --rig hero.ma --since 2026-10-01
+"""
+import argparse
+import datetime
+import os
+import os.path
+import re
+import sqlite3
+import sys
+import time
+import animlib.defaults
+import animlib.file
+import animlib.handler
+import animlib.keyarray
+import animlib.curve
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY,
+                                  mtime REAL,
+                                  size INTEGER,
+                                  export_time REAL,
+                                  fps REAL,
+                                  channels INTEGER,
+                                  curves INTEGER,
+                                  constraints INTEGER,
+                                  first_frame REAL,
+                                  last_frame REAL);
+CREATE TABLE IF NOT EXISTS refs (path TEXT,
+                                 namespace TEXT,
+                                 filename TEXT,
+                                 rig TEXT,
+                                 rig_name TEXT);
+CREATE INDEX IF NOT EXISTS files_export_time ON files (export_time);
+CREATE INDEX IF NOT EXISTS refs_path ON refs (path, namespace, rig_name, rig);
+CREATE INDEX IF NOT EXISTS refs_namespace ON refs (namespace, rig_name, path);
+CREATE INDEX IF NOT EXISTS refs_rig ON refs (rig, namespace, path);
+CREATE INDEX IF NOT EXISTS refs_rig_name ON refs (rig_name, namespace, path);
+'''
+
+# The references are indexed by each column they can be searched by,
+# together with the others, so a search can be answered from the
+# indexes alone. Once the catalog changes its statistics are updated
+# with ANALYZE, which lets SQLite start from whichever of the rig,
+# namespace or export time narrows the search most.
+
+FILE_COLUMNS = ('path',
+                'mtime',
+                'size',
+                'export_time',
+                'fps',
+                'channels',
+                'curves',
+                'constraints',
+                'first_frame',
+                'last_frame',)
+
+# The copy number Maya adds to the filename of a rig referenced more
+# than once, such as '/rigs/hero.ma{2}'.
+COPY_NUMBER = re.compile(r'\{\d+\}$')
+
+#======================================================================
+class Catalog(object):
+    """A connection to a catalog database, created if it doesn't exist
+    yet."""
+
+    def __init__(self, filepath=None):
+        self.filepath = filepath or animlib.defaults.DEFAULT_CATALOG
+        directory = os.path.dirname(self.filepath)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(self.filepath)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+        return False
+
+    def close(self):
+        """Closes the connection to the database."""
+        self.connection.close()
+
+    def scan(self, directory):
+        """Records the anim files in the directory and below that are new
+        or have changed since the last scan, and forgets those that have
+        gone. Returns a tuple of the number of files indexed, unchanged
+        and removed."""
+        directory = os.path.abspath(directory)
+        prefix = os.path.join(directory, '')
+        known = dict([(x['path'], (x['mtime'], x['size']))
+                      for x in self.connection.execute(
+                            'SELECT path, mtime, size FROM files '
+                            'WHERE substr(path, 1, ?) = ?',
+                            (len(prefix), prefix))])
+        indexed = 0
+        unchanged = 0
+        with self.connection:
+            for filepath, mtime, size in iter_files(directory):
+                if known.pop(filepath, None) == (mtime, size):
+                    unchanged += 1
+                    continue
+                try:
+                    file_data, references = describe(filepath)
+                except Exception as exception:
+                    print(" > Could not index {0}: {1}".format(filepath,
+                                                               exception))
+                    continue
+                file_data.update(path=filepath, mtime=mtime, size=size)
+                self.remove(filepath)
+                self.connection.execute(
+                        'INSERT INTO files ({0}) VALUES ({1})'.format(
+                                        ', '.join(FILE_COLUMNS),
+                                        ', '.join(['?'] * len(FILE_COLUMNS))),
+                        [file_data[x] for x in FILE_COLUMNS])
+                self.connection.executemany(
+                        'INSERT INTO refs VALUES (?, ?, ?, ?, ?)',
+                        [(filepath,) + x for x in references])
+                indexed += 1
+            for filepath in known:
+                self.remove(filepath)
+            if indexed or known:
+                self.connection.execute('ANALYZE')
+        print(" > Indexed {0} anim files, {1} unchanged, {2} "
+              "removed.".format(indexed, unchanged, len(known)))
+        return (indexed, unchanged, len(known))
+
+    def remove(self, filepath):
+        """Forgets the anim file."""
+        self.connection.execute('DELETE FROM files WHERE path = ?',
+                                (filepath,))
+        self.connection.execute('DELETE FROM refs WHERE path = ?',
+                                (filepath,))
+
+    def find(self, rig=None, namespace=None, start=None, end=None):
+        """Returns a list of dictionaries of the recorded details of the
+        anim files that reference the rig under the namespace, exported
+        between the start and end, in the order they were exported. Any
+        of them can be left out.
+
+        The rig is matched against the path of the rig file, or against
+        its name if it has no directory, and both it and the namespace
+        can contain * and ? wildcards. The start and end are datetimes
+        or seconds since the epoch."""
+        conditions = []
+        values = []
+        for column, value in (('rig', rig), ('namespace', namespace),):
+            if value is None:
+                continue
+            if column == 'rig' and not os.path.dirname(value):
+                column = 'rig_name'
+            if column == 'namespace':
+                value = value.lstrip(':')
+            operator = 'GLOB' if re.search(r'[*?\[]', value) else '='
+            conditions.append('refs.{0} {1} ?'.format(column, operator))
+            values.append(value)
+        if start is not None:
+            conditions.append('files.export_time >= ?')
+            values.append(seconds(start))
+        if end is not None:
+            conditions.append('files.export_time <= ?')
+            values.append(seconds(end))
+        query = 'SELECT files.* FROM files'
+        if rig is not None or namespace is not None:
+            query = ('SELECT DISTINCT files.* FROM files '
+                     'JOIN refs ON refs.path = files.path')
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY files.export_time'
+        return [dict(zip(x.keys(), x))
+                for x in self.connection.execute(query, values)]
+
+    def references(self, filepath):
+        """Returns a list of the namespace and rig filename of each
+        reference recorded for the anim file."""
+        return [(x['namespace'], x['filename'])
+                for x in self.connection.execute(
+                            'SELECT namespace, filename FROM refs '
+                            'WHERE path = ? ORDER BY namespace',
+                            (os.path.abspath(filepath),))]
+
+
+#======================================================================
+def iter_files(directory):
+    """Yields the path, modification time and size of each anim file in
+    the directory and below. Directories that can't be listed are
+    skipped."""
+    if scandir is not None:
+        try:
+            entries = list(scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                for result in iter_files(entry.path):
+                    yield result
+            elif entry.name.endswith(animlib.file.EXT):
+                stat = entry.stat()
+                yield (entry.path, stat.st_mtime, stat.st_size)
+        return
+
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(directory, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            for result in iter_files(path):
+                yield result
+        elif name.endswith(animlib.file.EXT):
+            stat = os.stat(path)
+            yield (path, stat.st_mtime, stat.st_size)
+
+
+#======================================================================
+def describe(filepath):
+    """Returns a dictionary of the export time, frame rate, counts and
+    frame range of an anim file, and a list of the namespace, filename,
+    rig file and rig name of each of its references.
+    
+    Only the info and index are read from a sectioned anim file, with
+    the channels too if the info has no export stats. Its frame range is
+    read from the directory of its key arrays, and only the curves that
+    aren't stored as key arrays are decoded for it."""
+    info_data = animlib.file.read_info(filepath)
+    curve_data = {}
+    curve_tokens = []
+    with open(filepath, 'rb') as anim_file:
+        header = animlib.file.read_header(anim_file)
+        if header and not 'base' in info_data:
+            index_data = animlib.file.read_section(anim_file,
+                                                   header,
+                                                   animlib.file.INDEX)
+            curve_count = len(index_data['curves'])
+            key_tokens = index_data.get('keys', {})
+            if not 'frame_range' in info_data and not 'samples' in info_data:
+                curve_tokens = [x for x in index_data['curves']
+                                if not x in key_tokens]
+            constraint_tokens = list(index_data['constraints'])
+            channel_data = None
+            if not 'stats' in info_data:
+                channel_data = animlib.file.read_section(
+                                                    anim_file,
+                                                    header,
+                                                    animlib.file.CHANNELS)
+        else:
+            data = animlib.file.read(filepath)
+            info_data = data[0]
+            curve_data = data[3]
+            curve_count = len(curve_data)
+            key_tokens = {}
+            constraint_tokens = list(data[4])
+            channel_data = data[6]
+    if curve_tokens:
+        curve_data = animlib.file.read_tokens(filepath,
+                                              animlib.file.CURVES,
+                                              curve_tokens)
+
+    if channel_data is None:
+        channel_count = info_data['stats']['channels']
+    else:
+        channel_count = sum([len(channel_data[x]) for x in channel_data])
+    # The constraints section holds the utility nodes too.
+    constraint_count = 0
+    for token in constraint_tokens:
+        handler = animlib.handler.for_token(token)
+        if handler and handler.name == 'constraints':
+            constraint_count += 1
+    first_frame, last_frame = frame_range(filepath,
+                                          info_data,
+                                          curve_data,
+                                          bool(key_tokens))
+    file_data = {'export_time': export_time(info_data),
+                 'fps': info_data.get('fps'),
+                 'channels': channel_count,
+                 'curves': curve_count,
+                 'constraints': constraint_count,
+                 'first_frame': first_frame,
+                 'last_frame': last_frame,}
+
+    references = []
+    reference_info = info_data.get('references', {})
+    for namespace in sorted(reference_info):
+        filename = reference_info[namespace]['filename']
+        rig = COPY_NUMBER.sub('', filename)
+        references.append((namespace.lstrip(':'),
+                           filename,
+                           rig,
+                           os.path.basename(rig),))
+    return file_data, references
+
+
+#======================================================================
+def frame_range(filepath, info_data, curve_data, key_arrays=False):
+    """Returns the first and last frame exported, from the frame range
+    the export was clipped or baked to, or else the first and last keys
+    of its time curves: those in the curve data, and those stored as key
+    arrays in the anim file if key_arrays is True. Returns (None, None)
+    if it has no keys."""
+    if 'frame_range' in info_data:
+        return tuple(info_data['frame_range'])
+    if 'samples' in info_data:
+        return (info_data['samples']['start'], info_data['samples']['end'])
+    times = []
+    for data in curve_data.values():
+        if not animlib.keyarray.is_timed(data) or 'key_array' in data:
+            continue
+        key_times = animlib.curve.upgrade(data)['keys']['time']
+        times += key_times[:1] + key_times[-1:]
+    if key_arrays:
+        with animlib.keyarray.KeyArrays(filepath) as key_array_file:
+            times += list(key_array_file.frame_range() or ())
+    if not times:
+        return (None, None)
+    return (min(times), max(times))
+
+
+#======================================================================
+def export_time(info_data):
+    """Returns the time the export info was recorded, in seconds since
+    the epoch, or None if it can't be read. Exports made before the
+    timestamp was recorded are read from their locale formatted time."""
+    if 'timestamp' in info_data:
+        return info_data['timestamp']
+    try:
+        return time.mktime(time.strptime(info_data['time'], '%c'))
+    except (KeyError, ValueError):
+        return None
+
+
+#======================================================================
+def seconds(value):
+    """Returns a datetime, date or number of seconds since the epoch as
+    seconds since the epoch."""
+    if hasattr(value, 'timetuple'):
+        return time.mktime(value.timetuple())
+    return float(value)
+
+
+#======================================================================
+def main(argv=None):
+    """Scans a library into the catalog, or prints the takes in the
+    catalog that match a query."""
+    parser = argparse.ArgumentParser(
+                    description="Catalogs the anim files in a library.")
+    parser.add_argument('--database')
+    commands = parser.add_subparsers(dest='command')
+    scan_parser = commands.add_parser('scan')
+    scan_parser.add_argument('directories', nargs='+')
+    find_parser = commands.add_parser('find')
+    find_parser.add_argument('--rig')
+    find_parser.add_argument('--namespace')
+    find_parser.add_argument('--since', help='YYYY-MM-DD')
+    find_parser.add_argument('--until', help='YYYY-MM-DD')
+    args = parser.parse_args(argv)
+
+    with Catalog(args.database) as catalog:
+        if args.command == 'scan':
+            for directory in args.directories:
+                catalog.scan(directory)
+            return 0
+        dates = [datetime.datetime.strptime(x, '%Y-%m-%d') if x else None
+                 for x in (args.since, args.until)]
+        if dates[1]:
+            dates[1] += datetime.timedelta(days=1)
+        for file_data in catalog.find(rig=args.rig,
+                                      namespace=args.namespace,
+                                      start=dates[0],
+                                      end=dates[1]):
+            exported = '-'
+            if file_data['export_time'] is not None:
+                exported = time.strftime(
+                                    '%Y-%m-%d %H:%M',
+                                    time.localtime(file_data['export_time']))
+            print('{0}  {1}  {2} channels  frames {3} to {4}'.format(
+                                                exported,
+                                                file_data['path'],
+                                                file_data['channels'],
+                                                file_data['first_frame'],
+                                                file_data['last_frame']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,7 +5,8 @@ The engine at the heart of the anim library, this script converts chan-
 nels in Maya into a tuple (source channel, value, is_default, type) and 
 then applies those values back into the Maya scene.
 """
-import maya.cmds as cmds
+from animlib.scene import cmds
+import animlib.query
 import blend
 import pprint
 
@@ -49,6 +50,116 @@ def get(channel):
             
     return(source, value, is_altered, data_type)
 
+#======================================================================
+def get_channels(channel_list):
+    """Returns a dictionary of the get() tuple for each channel in the
+    list that is_gettable(). The channels are grouped by node so each
+    node's connections and reference edits are queried once, rather
+    than once per channel.
+    """
+    node_attrs = {}
+    for channel in channel_list:
+        if not channel or '.' not in channel:
+            continue
+        node, attr = channel.split('.', 1)
+        node_attrs.setdefault(node, []).append(attr)
+    channel_data = {}
+    for node in sorted(node_attrs):
+        channel_data.update(get_node_channels(node, node_attrs[node]))
+    return channel_data
+    
+#======================================================================
+def get_node_channels(node, attrs):
+    """Returns a dictionary of the get() tuple for each of the node's
+    attributes that is_gettable(), keyed by channel name.
+    
+    The incoming connections and the attributes changed since the file
+    was opened are listed once for the whole node. These lists use long
+    attribute names, so attributes that aren't found in them by name, 
+    such as short names, fall back to querying the channel itself.
+    """
+    channel_data = {}
+    if not cmds.objExists(node):
+        for attr in attrs:
+            print(" > Could not find channel: {0}.{1}".format(node, attr))
+        return channel_data
+        
+    # List the sources of every connected attribute on the node.
+    connected = {}
+    connections = cmds.listConnections(node,
+                                       connections=True,
+                                       source=True,
+                                       destination=False,
+                                       plugs=True,
+                                       skipConversionNodes=True)
+    if connections:
+        for i in range(0, len(connections), 2):
+            dest_attr = connections[i].split('.', 1)[1]
+            if dest_attr not in connected:
+                connected[dest_attr] = connections[i+1]
+            
+    # List the attributes changed since the file was opened if the node
+    # is referenced.
+    # (This module's set() hides the builtin, so dictionaries are used
+    # for the lookups.)
+    changed = {}
+    referenced = animlib.query.is_referenced(node)
+    if referenced:
+        changed = dict.fromkeys(cmds.listAttr(node,
+                                              changedSinceFileOpen=True)
+                                or [])
+        
+    # The node's long attribute names, listed if an attribute needs
+    # checking against them.
+    long_names = None
+    
+    for attr in attrs:
+        channel = "{0}.{1}".format(node, attr)
+        
+        # Skip attributes that don't exist or can't be exported.
+        try:
+            data_type = cmds.getAttr(channel, type=True)
+        except (ValueError, RuntimeError):
+            print(" > Could not find channel: {0}".format(channel))
+            continue
+        if not is_type_exportable(data_type):
+            print(" > Skipping due to type "
+                  "{0}: {1}.".format(data_type, channel))
+            continue
+        value = cmds.getAttr(channel)
+        
+        # Check whether the attribute could be missing from the node
+        # lists because of its name.
+        unlisted = False
+        if ((connected and attr not in connected) or
+                (changed and attr not in changed)):
+            if long_names is None:
+                long_names = dict.fromkeys(cmds.listAttr(node) or [])
+            unlisted = attr not in long_names
+            
+        # Find the source of the connection.
+        source = connected.get(attr)
+        if not source and connected and unlisted:
+            sources = cmds.listConnections(channel,
+                                           source=True,
+                                           destination=False,
+                                           plugs=True,
+                                           skipConversionNodes=True)
+            if sources:
+                source = sources[0]
+                
+        # Connected channels are always altered, referenced channels are
+        # if they have been edited.
+        is_altered = bool(source)
+        if not is_altered and referenced:
+            if attr in changed:
+                is_altered = True
+            elif changed and unlisted:
+                is_altered = bool(cmds.listAttr(channel,
+                                                changedSinceFileOpen=True))
+        channel_data[channel] = (source, value, is_altered, data_type)
+    return channel_data
+    
 #======================================================================
 def set(channel,
         channel_data,
@@ -0,0 +1,192 @@
+"""Clips exported anim curves to a frame range.
+
+Keys outside the range are dropped. Where an end of the range cuts
+through a segment a key is inserted at the cut, splitting the segment
+so the curve keeps its shape within the range. Unweighted segments are
+cubic Hermites, so the new key takes the value and slope of the curve
+at the cut. Weighted segments are cubic Beziers, and are split with de
+Casteljau's algorithm, which also shortens the tangents of the keys
+either side of the cut.
+
+Beyond its keys a curve is shaped by its infinity modes, so the range
+is only clipped to the keys it overlaps, and curves whose repeating
+infinity falls within the range are left whole. Driven curves are
+keyed on their input rather than on time, and are left whole too.
+
+This works on the curve dictionary format alone, like animlib.reduce.
+"""
+import bisect
+import math
+import animlib.curve
+import animlib.evaluate
+
+# Tangent types that Maya recomputes from the neighbouring keys when the
+# curve is rebuilt. Keys that gain or lose a neighbour have these
+# tangents fixed at their exported angles.
+COMPUTED_TYPES = ('spline',
+                  'linear',
+                  'fast',
+                  'slow',
+                  'clamped',
+                  'plateau',
+                  'auto',)
+
+# Maya's infinity enums that repeat the curve: cycle, cycle with offset
+# and oscillate.
+CYCLE_MODES = (3, 4, 5,)
+
+# Out tangent types that hold a value across the segment, which the keys
+# inserted into the segment keep.
+STEPPED_TYPES = ('step',
+                 'stepnext',)
+
+#======================================================================
+def curve(data, start, end, fps=24.0):
+    """Returns the curve data with only the keys from start to end,
+    with keys inserted where the range cuts a segment."""
+    data = animlib.curve.upgrade(data)
+    if 'shared' in data or not data['type'].startswith('animCurveT'):
+        return data
+    keys = data['keys']
+    times = keys['time']
+    if not times:
+        return data
+
+    # An infinity that repeats the curve depends on all of its keys, so
+    # a range reaching into one is left whole.
+    if ((start < times[0] and data['pre'] in CYCLE_MODES) or
+            (end > times[-1] and data['post'] in CYCLE_MODES)):
+        return data
+
+    # A range that misses the keys sees only the infinity beyond the key
+    # nearest to it, which is all that is kept.
+    if end < times[0] or start > times[-1]:
+        index = 0 if end < times[0] else len(times)-1
+        clipped = dict([(x, [keys[x][index]]) for x in keys])
+        fix_tangents(clipped, 0)
+        data = dict(data)
+        data['keys'] = clipped
+        return data
+
+    # Insert keys at the ends of the range that fall between keys. Ends
+    # beyond the keys are left to the infinity modes.
+    scale = animlib.evaluate.time_scale(data, fps)
+    keys = dict([(x, list(keys[x])) for x in keys])
+    first = bisect.bisect_left(keys['time'], start)
+    if first > 0 and keys['time'][first] > start:
+        insert_key(keys, data['weighted'], first-1, start, scale)
+    last = bisect.bisect_right(keys['time'], end) - 1
+    if last < len(keys['time'])-1 and keys['time'][last] < end:
+        insert_key(keys, data['weighted'], last, end, scale)
+        last += 1
+
+    # Keep the keys in the range, fixing the tangents of the keys at
+    # either end if they lost a neighbour.
+    clipped = dict([(x, keys[x][first:last+1]) for x in keys])
+    if first > 0:
+        fix_tangents(clipped, 0)
+    if last < len(keys['time'])-1:
+        fix_tangents(clipped, -1)
+    data = dict(data)
+    data['keys'] = clipped
+    return data
+
+
+#======================================================================
+def insert_key(keys, weighted, index, time, scale):
+    """Inserts a key at the time into the segment from the key at index
+    to the next, in the key arrays, without changing the shape of the
+    segment."""
+    t0 = keys['time'][index]
+    t1 = keys['time'][index+1]
+    v0 = keys['value'][index]
+    v1 = keys['value'][index+1]
+    value = animlib.evaluate.segment(keys, weighted, index, index+1,
+                                     time, scale)
+    out_type = animlib.curve.type_name(keys['out_type'][index])
+    new_key = {'time': time,
+               'value': value,
+               'in_type': animlib.curve.type_index('fixed'),
+               'in_angle': 0.0,
+               'in_weight': 1.0,
+               'out_type': animlib.curve.type_index('fixed'),
+               'out_angle': 0.0,
+               'out_weight': 1.0,
+               'locked': True,}
+
+    # Stepped segments hold their value up to the next key, as does the
+    # new key.
+    if out_type in STEPPED_TYPES:
+        new_key['out_type'] = keys['out_type'][index]
+
+    # Unweighted segments are a cubic Hermite in time. The slope at the
+    # cut gives the tangents of the new key; the tangents either side
+    # are unchanged.
+    elif not weighted:
+        span = float(t1 - t0)
+        s = (time - t0) / span
+        m0 = math.tan(math.radians(keys['out_angle'][index])) / scale * span
+        m1 = math.tan(math.radians(keys['in_angle'][index+1])) / scale * span
+        slope = ((6*s**2 - 6*s) * v0 + (3*s**2 - 4*s + 1) * m0 +
+                 (-6*s**2 + 6*s) * v1 + (3*s**2 - 2*s) * m1) / span
+        angle = math.degrees(math.atan(slope * scale))
+        new_key['in_angle'] = angle
+        new_key['out_angle'] = angle
+
+    # Weighted segments are a cubic Bezier, split at the parameter of
+    # the cut into two Beziers by de Casteljau's algorithm. Segments
+    # whose tangent handles overlap in time are clamped when evaluated,
+    # so are only kept approximately.
+    else:
+        x1, y1, x2, y2 = animlib.evaluate.control_points(keys,
+                                                         index,
+                                                         index+1,
+                                                         scale)
+        u = animlib.evaluate.bezier_parameter(t0, x1, x2, t1, time)
+        a = lerp((t0, v0), (x1, y1), u)
+        b = lerp((x1, y1), (x2, y2), u)
+        c = lerp((x2, y2), (t1, v1), u)
+        d = lerp(a, b, u)
+        e = lerp(b, c, u)
+        f = lerp(d, e, u)
+        new_key['value'] = f[1]
+        new_key['in_angle'], new_key['in_weight'] = tangent(d, f, scale)
+        new_key['out_angle'], new_key['out_weight'] = tangent(f, e, scale)
+        (keys['out_angle'][index],
+         keys['out_weight'][index]) = tangent((t0, v0), a, scale)
+        (keys['in_angle'][index+1],
+         keys['in_weight'][index+1]) = tangent(c, (t1, v1), scale)
+
+    # Fix the tangents of the keys either side, whose neighbour changes.
+    fix_tangents(keys, index)
+    fix_tangents(keys, index+1)
+    for field in animlib.curve.KEY_FIELDS:
+        keys[field].insert(index+1, new_key[field])
+
+
+#======================================================================
+def fix_tangents(keys, index):
+    """Changes any tangent types of the key at index that Maya would
+    recompute from its neighbours to 'fixed', so they keep their
+    exported angles."""
+    for field in ('in_type', 'out_type'):
+        if animlib.curve.type_name(keys[field][index]) in COMPUTED_TYPES:
+            keys[field][index] = animlib.curve.type_index('fixed')
+
+
+#======================================================================
+def tangent(p0, p1, scale):
+    """Returns the angle in degrees and the weight of a weighted tangent
+    running from point p0 to point p1, the inverse of
+    animlib.evaluate.control_points()."""
+    dx = (p1[0] - p0[0]) / scale
+    dy = p1[1] - p0[1]
+    return (math.degrees(math.atan2(dy, dx)),
+            3.0 * math.hypot(dx, dy))
+
+
+#======================================================================
+def lerp(p0, p1, u):
+    """Returns the point at u along the line from point p0 to p1."""
+    return (p0[0] + (p1[0] - p0[0]) * u,
+            p0[1] + (p1[1] - p0[1]) * u)
@@ -1,6 +1,13 @@
 """Exports and rebuilds constraint nodes using the constraint diction-
 ary format."""
-import maya.cmds as cmds
+from animlib.scene import cmds
+import animlib.query
+
+EXPORTABLE_TYPES = frozenset(['pointConstraint',
+                              'aimConstraint',
+                              'orientConstraint',
+                              'scaleConstraint',
+                              'parentConstraint',])
 
 SINGLE_ATTRS = {'pointConstraint':  ('constraintParentInverseMatrix',
                                      'constraintRotatePivotX',
@@ -214,12 +221,7 @@ def build(constraint_data):
 #=======================================================================
 def is_type_exportable(node_type):
     """Returns True if the node type is something we can export."""
-    exportable_types = ['pointConstraint',
-                        'aimConstraint',
-                        'orientConstraint',
-                        'scaleConstraint',
-                        'parentConstraint',]
-    return node_type in exportable_types
+    return node_type in EXPORTABLE_TYPES
     
 #=======================================================================
 def list_channels(constraint_node):
@@ -227,10 +229,10 @@ def list_channels(constraint_node):
     to later rebuild the constraint.
     """
     # Determine the type of constraint and the number of targets.
-    node_type = cmds.nodeType(constraint_node)
+    node_type = animlib.query.node_type(constraint_node)
     if not is_type_exportable(node_type):
         return None
-    indices = cmds.getAttr(constraint_node+'.target', multiIndices=True)
+    indices = animlib.query.multi_indices(constraint_node+'.target')
     
     # Return a list of attributes to export, including custom weight
     # attributes that plug into the actual target weight attrs.
@@ -249,7 +251,7 @@ def get_custom_weight_attrs(constraint_node):
     internal target weight attr that it links to.
     """
     # Get a list of target weight attributes.
-    indices = cmds.getAttr(constraint_node+'.target', multiIndices=True)
+    indices = animlib.query.multi_indices(constraint_node+'.target')
     weight_attrs = [constraint_node+'.target['+str(x)+'].targetWeight'
                                                        for x in indices]
     
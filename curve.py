@@ -1,12 +1,60 @@
 """Exports and rebuilds animation curves using the curve dictionary
 format."""
 
-import maya.cmds as cmds
+import bisect
+import hashlib
+import json
+from animlib.scene import cmds
+import animlib.query
+import animlib.clip
+
+# Version of the curve dictionary format. Version 1 stored 'key_data' as
+# a list of dictionaries, one per key. Version 2 stores 'keys' as a dic-
+# tionary of parallel arrays, one per field, with tangent types as
+# indices into TANGENT_TYPES.
+SCHEMA = 2
+
+# The anim curve types that can be exported.
+EXPORTABLE_TYPES = frozenset(["animCurveTL",
+                              "animCurveTA",
+                              "animCurveTT",
+                              "animCurveTU",
+                              "animCurveUL",
+                              "animCurveUA",
+                              "animCurveUT",
+                              "animCurveUU",])
+
+TANGENT_TYPES = ('spline',
+                 'linear',
+                 'fast',
+                 'slow',
+                 'flat',
+                 'step',
+                 'stepnext',
+                 'fixed',
+                 'clamped',
+                 'plateau',
+                 'auto',)
+                 
+KEY_FIELDS = ('time',
+              'value',
+              'in_type',
+              'in_angle',
+              'in_weight',
+              'out_type',
+              'out_angle',
+              'out_weight',
+              'locked',)
 
 #=======================================================================
-def export(anim_curve):
+def export(anim_curve, frame_range=None, fps=24.0):
     """Creates a dictionary of all the data necessary to rebuild the
-    curve."""
+    curve.
+    
+    If a frame_range (start, end) is given, only the keys within it are
+    read and exported, with keys added at the ends of the range to keep
+    the shape of the curve. See animlib.clip.
+    """
     
     # Check the curve exists and is an animation curve.
     if not cmds.objExists(anim_curve):
@@ -16,17 +64,12 @@ def export(anim_curve):
     if not is_type_exportable(type):
         cmds.error("Node {0} is not an anim curve".format(anim_curve))
     
-    # Get the keys on the curve.
-    keys = cmds.keyframe(anim_curve, query=True)
-    key_count = cmds.keyframe(anim_curve,
-                              keyframeCount=True,
-                              query=True)
-                              
     # Gather the value and in/out tangent type, and x,y coordinates of
-    # each key.
-    data = {'name':anim_curve,'type':type}
-    data['key_data'] = [key_info_by_index(anim_curve, i)
-                        for i in range(key_count)]
+    # each key. The whole curve is read in one query per field.
+    data = {'name':anim_curve,'type':type,'schema':SCHEMA}
+    data['keys'], data['weighted'] = key_columns(anim_curve,
+                                                 type,
+                                                 frame_range)
     
     # Get infinity values
     data['pre'] = cmds.getAttr("{0}.preInfinity".format(anim_curve))
@@ -37,10 +80,17 @@ def export(anim_curve):
                                                             anim_curve))
     data['color'] = cmds.getAttr("{0}.curveColor".format(anim_curve))[0]
     
+    # Clip the keys to the frame range.
+    if frame_range is not None:
+        data = animlib.clip.curve(data, frame_range[0], frame_range[1], fps)
+    
     return data 
     
 #=======================================================================
 def build(data):
+    # Bring older curve data up to the current format.
+    data = upgrade(data)
+    
     # Create and name the anim curve.
     anim_curve = cmds.createNode(data['type'],
                                  name=data['name'],
@@ -55,21 +105,129 @@ def build(data):
              float(data['color'][1]),
              float(data['color'][2]),)
     cmds.setAttr("{0}.curveColorR".format(anim_curve), color[0])
-    cmds.setAttr("{0}.curveColorR".format(anim_curve), color[1])
-    cmds.setAttr("{0}.curveColorR".format(anim_curve), color[2])
+    cmds.setAttr("{0}.curveColorG".format(anim_curve), color[1])
+    cmds.setAttr("{0}.curveColorB".format(anim_curve), color[2])
                       
-    # Create the keys using the time, value and tangency in key_data.             
-    for key_data in data['key_data']:
-        add_keyframe(anim_curve, key_data)
+    # Create the keys using the time, value and tangency in keys.
+    set_keys(anim_curve, data['keys'], data['weighted'], data['type'])
 
     return anim_curve
     
     
+#=======================================================================
+def set_keys(anim_curve, keys, weighted, node_type=None):
+    """Creates every key in a dictionary of key arrays on an empty
+    anim_curve. Rather than adding the keys one at a time, the keys are
+    set in a single keyTimeValue edit, or keyValue edit on curves driven
+    by another attribute, and the tangents are edited for groups of keys
+    that share the same settings, so the number of commands depends on
+    the variety of tangents rather than the number of keys. Pass the
+    node_type if it is known to save querying it again."""
+    key_count = len(keys['time'])
+    if not key_count:
+        return anim_curve
+        
+    # Set the weighted tangents mode for the whole curve before any
+    # tangents are adjusted.
+    cmds.setAttr("{0}.weightedTangents".format(anim_curve), 
+                 bool(weighted))
+    
+    # Create all the keys at once. Keys created this way have default 
+    # tangents until they are set below. Curves keyed in time hold their
+    # keys in keyTimeValue, and driven curves in keyValue, both as pairs
+    # of the key's input and value.
+    if node_type is None:
+        node_type = cmds.nodeType(anim_curve)
+    key_attr = 'kv'
+    if node_type.startswith('animCurveT'):
+        key_attr = 'ktv'
+    time_values = []
+    for i in range(key_count):
+        time_values += [keys['time'][i], keys['value'][i]]
+    cmds.setAttr("{0}.{1}[0:{2}]".format(anim_curve,
+                                         key_attr,
+                                         key_count-1),
+                 *time_values,
+                 size=key_count)
+                 
+    # Group the keys by the tangent edits they need. Non-fixed tangents
+    # on unweighted curves are computed by Maya from the neighbouring 
+    # keys when their type is set, so only their lock needs setting.
+    # Everything else has its angle and weight set, which sets its type
+    # to 'fixed', before any other types are applied.
+    angle_groups = {}
+    lock_groups = {}
+    in_type_groups = {}
+    out_type_groups = {}
+    for i in range(key_count):
+        in_type = type_name(keys['in_type'][i])
+        out_type = type_name(keys['out_type'][i])
+        if weighted or 'fixed' in (in_type, out_type):
+            tangent = (keys['in_angle'][i],
+                       keys['in_weight'][i],
+                       keys['out_angle'][i],
+                       keys['out_weight'][i],
+                       bool(keys['locked'][i]),)
+            angle_groups.setdefault(tangent, []).append(i)
+        else:
+            lock_groups.setdefault(bool(keys['locked'][i]), []).append(i)
+        if in_type != 'fixed':
+            in_type_groups.setdefault(in_type, []).append(i)
+        if out_type != 'fixed':
+            out_type_groups.setdefault(out_type, []).append(i)
+            
+    # Set the tangent angles, weights and locks.
+    for tangent, indices in sorted(angle_groups.items()):
+        in_angle, in_weight, out_angle, out_weight, locked = tangent
+        cmds.keyTangent(anim_curve,
+                        edit=True,
+                        index=index_ranges(indices),
+                        absolute=True,
+                        inAngle=in_angle,
+                        inWeight=in_weight,
+                        outAngle=out_angle,
+                        outWeight=out_weight,
+                        lock=locked,)
+    for locked, indices in sorted(lock_groups.items()):
+        cmds.keyTangent(anim_curve,
+                        edit=True,
+                        index=index_ranges(indices),
+                        lock=locked,)
+                        
+    # Apply the tangency types that aren't 'fixed'.
+    for in_type, indices in sorted(in_type_groups.items()):
+        cmds.keyTangent(anim_curve,
+                        edit=True,
+                        index=index_ranges(indices),
+                        inTangentType=in_type,)
+    for out_type, indices in sorted(out_type_groups.items()):
+        cmds.keyTangent(anim_curve,
+                        edit=True,
+                        index=index_ranges(indices),
+                        outTangentType=out_type,)
+    return anim_curve
+    
     
 #=======================================================================
-def add_keyframe(anim_curve, key_data):
+def index_ranges(indices):
+    """Returns a sorted list of key indices as a list of (start, end)
+    ranges that can be passed to the multi-use index flag."""
+    ranges = []
+    for i in sorted(indices):
+        if ranges and ranges[-1][1] == i-1:
+            ranges[-1] = (ranges[-1][0], i)
+        else:
+            ranges.append((i, i))
+    return ranges
+    
+    
+    
+#=======================================================================
+def add_keyframe(anim_curve, key_data, node_type=None):
     """Adds a keyframe to an anim_curve based on a data set in the form
-    key_time, key_value, key_intan (type,x,y), key_outtan (type,x,y)"""
+    key_time, key_value, key_intan (type,x,y), key_outtan (type,x,y).
+    Pass the node_type if it is known to save querying it again. Use 
+    set_keys() to create many keys at once."""
     
     # Unpack the values.
     key_time = key_data['key_time']
@@ -77,7 +235,7 @@ def add_keyframe(anim_curve, key_data):
     
     # Check type: if it is a driven curve then we need to add keyframes
     # by float instead of by time.
-    type = cmds.nodeType(anim_curve)
+    type = node_type or cmds.nodeType(anim_curve)
     if type.startswith('animCurveT'):
         # Create the keyframe. Default to linear to allow tangency info 
         # to be applied.
@@ -165,16 +323,7 @@ def add_keyframe(anim_curve, key_data):
 #=======================================================================
 def is_type_exportable(node_type):
     """Returns True if the node type is something we can export."""
-    return node_type in [
-                            "animCurveTL",
-                            "animCurveTA",
-                            "animCurveTT",
-                            "animCurveTU",
-                            "animCurveUL",
-                            "animCurveUA",
-                            "animCurveUT",
-                            "animCurveUU",
-                           ]
+    return node_type in EXPORTABLE_TYPES
 
 
 
@@ -259,6 +408,250 @@ def key_info_by_index(anim_curve, key_index):
             
 
 
+#======================================================================
+def reaches_cycle(anim_curve, times, frame_range):
+    """Returns True if the frame range reaches past the first or last of
+    the key times into an infinity of the anim curve that repeats it.
+    See animlib.clip.CYCLE_MODES."""
+    if (frame_range[0] < times[0] and
+            cmds.getAttr("{0}.preInfinity".format(anim_curve)) in
+                                            animlib.clip.CYCLE_MODES):
+        return True
+    if (frame_range[1] > times[-1] and
+            cmds.getAttr("{0}.postInfinity".format(anim_curve)) in
+                                            animlib.clip.CYCLE_MODES):
+        return True
+    return False
+
+
+#======================================================================
+def key_columns(anim_curve, node_type=None, frame_range=None):
+    """Returns a tuple of the curve's keys as a dictionary of parallel
+    arrays, one per field in KEY_FIELDS, and whether the curve has
+    weighted tangents. Each field is read for the whole curve in a 
+    single range query, so the number of commands doesn't grow with the
+    number of keys.
+    
+    If a frame_range (start, end) overlapping the keys of a time curve
+    is given, only the keys within it and the key either side of it are
+    read, unless the range reaches into an infinity that repeats the
+    curve, which needs all of them."""
+    
+    # Check type: if it is a driven curve then we need to query the
+    # keyframes by float instead of by time.
+    if not node_type:
+        node_type = cmds.nodeType(anim_curve)
+    if node_type.startswith('animCurveT'):
+        times = cmds.keyframe(anim_curve,
+                              absolute=True,
+                              timeChange=True,
+                              query=True)
+    else:
+        times = cmds.keyframe(anim_curve,
+                              absolute=True,
+                              floatChange=True,
+                              query=True)
+    weighted = cmds.keyTangent(anim_curve,
+                               weightedTangents=True,
+                               query=True)[0]
+    if not times:
+        return (dict([(x, []) for x in KEY_FIELDS]), weighted)
+        
+    # Narrow the queries to the keys within the frame range and the keys
+    # either side, which the clipping needs to split the segments cut by
+    # the range. A cycling curve is left whole by the clipping if the
+    # range reaches its cycle, so all of its keys are read.
+    window = {}
+    if (frame_range is not None and node_type.startswith('animCurveT') and
+            frame_range[1] >= times[0] and frame_range[0] <= times[-1] and
+            not reaches_cycle(anim_curve, times, frame_range)):
+        first = max(bisect.bisect_left(times, frame_range[0]) - 1, 0)
+        last = min(bisect.bisect_right(times, frame_range[1]),
+                   len(times) - 1)
+        times = times[first:last+1]
+        window['index'] = (first, last)
+    
+    # Record the values and tangent information.
+    keys = {'time': times}
+    keys['value'] = cmds.keyframe(anim_curve,
+                                  absolute=True,
+                                  valueChange=True,
+                                  query=True,
+                                  **window)
+    keys['in_type'] = [type_index(x) for x in cmds.keyTangent(
+                                                    anim_curve,
+                                                    inTangentType=True,
+                                                    query=True,
+                                                    **window)]
+    keys['in_angle'] = cmds.keyTangent(anim_curve,
+                                       inAngle=True,
+                                       query=True,
+                                       **window)
+    keys['in_weight'] = cmds.keyTangent(anim_curve,
+                                        inWeight=True,
+                                        query=True,
+                                        **window)
+    keys['out_type'] = [type_index(x) for x in cmds.keyTangent(
+                                                    anim_curve,
+                                                    outTangentType=True,
+                                                    query=True,
+                                                    **window)]
+    keys['out_angle'] = cmds.keyTangent(anim_curve,
+                                        outAngle=True,
+                                        query=True,
+                                        **window)
+    keys['out_weight'] = cmds.keyTangent(anim_curve,
+                                         outWeight=True,
+                                         query=True,
+                                         **window)
+    keys['locked'] = cmds.keyTangent(anim_curve,
+                                     lock=True,
+                                     query=True,
+                                     **window)
+    return (keys, weighted)
+    
+    
+#======================================================================
+def key_info_all(anim_curve, node_type=None):
+    """Returns a list of key_info_by_index() dictionaries for every key
+    on the curve, read with key_columns()."""
+    keys, weighted = key_columns(anim_curve, node_type)
+    return [key_row(keys, weighted, i) for i in range(len(keys['time']))]
+    
+    
+#======================================================================
+def key_row(keys, weighted, index):
+    """Returns the key at index in a dictionary of key arrays as a
+    key_info_by_index() style dictionary that add_keyframe() accepts.
+    """
+    return {'key_time': keys['time'][index],
+            'key_value': keys['value'][index],
+            'in_type': type_name(keys['in_type'][index]),
+            'in_angle': keys['in_angle'][index],
+            'in_weight': keys['in_weight'][index],
+            'out_type': type_name(keys['out_type'][index]),
+            'out_angle': keys['out_angle'][index],
+            'out_weight': keys['out_weight'][index],
+            'tan_weighted': weighted,
+            'tan_locked': keys['locked'][index],}
+            
+            
+#======================================================================
+class CurveSnapshot(object):
+    """Holds the key data of an anim curve read in bulk with
+    key_columns(), with a lookup from key time to key index. A snapshot
+    doesn't see later edits to the curve, so it should only be kept for
+    as long as the curve is known not to change."""
+    
+    def __init__(self, anim_curve, node_type=None):
+        self.anim_curve = anim_curve
+        self.node_type = node_type or cmds.nodeType(anim_curve)
+        self.keys, self.weighted = key_columns(anim_curve, self.node_type)
+        self.indices = dict([(t, i) for i, t in
+                             enumerate(self.keys['time'])])
+        
+    def __len__(self):
+        return len(self.keys['time'])
+        
+    def times(self, start=None, end=None):
+        """Returns the key times, limited to the inclusive range from
+        start to end if given."""
+        return [x for x in self.keys['time']
+                if (start is None or x >= start) and
+                   (end is None or x <= end)]
+        
+    def index(self, time):
+        """Returns the index of the key at the given time. Times that
+        don't match a key exactly are looked up with Maya's tolerance."""
+        if time in self.indices:
+            return self.indices[time]
+        return cmds.keyframe(self.anim_curve,
+                             indexValue=True,
+                             time=(time,),
+                             query=True)[0]
+        
+    def key_by_index(self, index):
+        """Returns the key at index as a key_info_by_index() style
+        dictionary."""
+        return key_row(self.keys, self.weighted, index)
+        
+    def key_by_time(self, time):
+        """Returns the key at the given time as a key_info_by_index()
+        style dictionary."""
+        return self.key_by_index(self.index(time))
+        
+
+#======================================================================
+def upgrade(data):
+    """Returns the curve data in the current SCHEMA, converting the 
+    version 1 list of key dictionaries to key arrays if necessary."""
+    if 'shared' in data or data.get('schema', 1) >= SCHEMA:
+        return data
+    data = dict(data)
+    key_data = data.pop('key_data')
+    data['keys'] = dict([(x, []) for x in KEY_FIELDS])
+    data['weighted'] = False
+    for key in key_data:
+        data['keys']['time'].append(key['key_time'])
+        data['keys']['value'].append(key['key_value'])
+        data['keys']['in_type'].append(type_index(key['in_type']))
+        data['keys']['in_angle'].append(key['in_angle'])
+        data['keys']['in_weight'].append(key['in_weight'])
+        data['keys']['out_type'].append(type_index(key['out_type']))
+        data['keys']['out_angle'].append(key['out_angle'])
+        data['keys']['out_weight'].append(key['out_weight'])
+        data['keys']['locked'].append(key['tan_locked'])
+        if key.get('tan_weighted'):
+            data['weighted'] = True
+    data['schema'] = SCHEMA
+    return data
+    
+    
+#======================================================================
+def is_static(data):
+    """Returns True if the curve data holds a single value at all times:
+    every key has the same value, every tangent is flat and both 
+    infinities are constant."""
+    keys = upgrade(data)['keys']
+    if not keys['value']:
+        return False
+    if data['pre'] != 0 or data['post'] != 0:
+        return False
+    if len(set(keys['value'])) > 1:
+        return False
+    for angle in keys['in_angle'] + keys['out_angle']:
+        if angle != 0:
+            return False
+    return True
+    
+    
+#======================================================================
+def payload_hash(data):
+    """Returns a hash of everything in the curve data except its name,
+    so curves with identical keys and settings hash the same."""
+    payload = dict([(x, data[x]) for x in data if x != 'name'])
+    return hashlib.sha1(json.dumps(payload,
+                                   sort_keys=True).encode('utf-8')
+                        ).hexdigest()
+    
+    
+#======================================================================
+def type_index(tangent_type):
+    """Returns the enum stored for a tangent type name. Unknown types
+    are stored as their name."""
+    if tangent_type in TANGENT_TYPES:
+        return TANGENT_TYPES.index(tangent_type)
+    return tangent_type
+    
+    
+#======================================================================
+def type_name(tangent_type):
+    """Returns the tangent type name for a stored tangent type enum."""
+    if isinstance(tangent_type, int):
+        return TANGENT_TYPES[tangent_type]
+    return tangent_type
+    
+    
 #======================================================================
 def key_info_by_time(anim_curve, time):
     """Wrapper script for key_info_by_index if you only know the frame.
@@ -276,7 +669,7 @@ def key_info_by_time(anim_curve, time):
     
 #======================================================================
 def list_channels(anim_curve):
-    type = cmds.nodeType(anim_curve)
+    type = animlib.query.node_type(anim_curve)
     if type.startswith('animCurveU'):
         return [anim_curve+'.input']
     else:
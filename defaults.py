@@ -1,2 +1,4 @@
 """Store default values here."""
-DEFAULT_FILEPATH = '/Volumes/Assets/art/projects/test/animlib_test_library/'
\ No newline at end of file
+import os.path
+DEFAULT_FILEPATH = '/Volumes/Assets/art/projects/test/animlib_test_library/'
+DEFAULT_CATALOG = os.path.join(os.path.expanduser('~'), '.animlib', 'catalog.db')
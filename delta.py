@@ -0,0 +1,173 @@
+"""Records content hashes of the exported data, and builds and merges
+delta exports that hold only what changed since a base export.
+
+Every export records a hash of each entry of its data in the info data
+under 'hashes': one per token of the dependency, reference, curve,
+constraint and pairBlend data, and one per channel of the channel data.
+Curves are hashed as they are read from the scene, before any reduction,
+along with the payload hash of the data they store, so an unchanged curve
+is neither reduced nor written again.
+
+A delta export holds only the entries whose hashes differ from those of
+its base, lists the entries the base has that it does not under
+'removed', and names the base file under 'base'. Its hashes are those of
+the whole export, so a delta can itself be the base of another delta.
+The base is identified by a hash of its hashes under 'base_hash', and
+animlib.file.read() checks it before merging a delta over its base.
+"""
+import hashlib
+import json
+import animlib.file
+
+# The sections of the data that are hashed by token, with their index
+# in the data. The channel data is hashed per channel.
+SECTIONS = (('dependency', 1),
+            ('references', 2),
+            ('curves', 3),
+            ('constraints', 4),
+            ('pairblends', 5),)
+CHANNELS = 6
+
+# The number of hex digits kept of each hash. The hashes are only
+# compared token by token, so a short hash is enough and keeps the info
+# data small.
+HASH_LENGTH = 16
+
+#======================================================================
+def content_hash(value):
+    """Returns a hash of a json compatible value."""
+    return hashlib.sha1(json.dumps(value,
+                                   sort_keys=True).encode('utf-8')
+                        ).hexdigest()[:HASH_LENGTH]
+
+
+#======================================================================
+def curve_hash(data, tolerance=None):
+    """Returns a hash of the curve data as read from the scene, and the
+    tolerance it will be reduced with."""
+    return content_hash([data, tolerance])
+
+
+#======================================================================
+def base_hash(hashes):
+    """Returns a hash identifying the export with the hashes, which a
+    delta taken against it records under 'base_hash'."""
+    return content_hash(hashes)
+
+
+#======================================================================
+def empty_hashes():
+    """Returns the hashes of an export with no data, for add_hash() to
+    fill in as the data is exported."""
+    result = dict([(name, {}) for name, index in SECTIONS])
+    result['payloads'] = {}
+    result['shared'] = {}
+    result['channels'] = {}
+    return result
+
+
+#======================================================================
+def add_hash(hashes, index, key, value):
+    """Adds the hash of an entry of the export data to the hashes, given
+    the index of its section in the data. Curves are hashed as they are
+    read from the scene, so only the token a curve shares is added."""
+    if index == CHANNELS:
+        hashes['channels'][key] = dict([(x, content_hash(value[x]))
+                                        for x in value])
+    elif index == 3:
+        if 'shared' in value:
+            hashes['shared'][key] = value['shared']
+    else:
+        hashes[SECTIONS[index - 1][0]][key] = content_hash(value)
+
+
+#======================================================================
+def string_keys(hashes):
+    """Returns a copy of a dictionary of hashes with its keys as json
+    stores them, so the hashes of an export that hasn't been written
+    compare with those read from an anim file."""
+    return dict([(animlib.file.string_key(x), hashes[x]) for x in hashes])
+
+
+#======================================================================
+def diff(data, base_hashes):
+    """Returns the delta of the export data against the hashes of its
+    base export. Entries that hash the same as in the base are left out.
+    The curve data is expected to hold only the curves the base does not
+    store in full already, and of those, curves that share the same data
+    as in the base are left out too. Entries in the base but not in the
+    data are listed in the info data under 'removed'.
+    
+    Keys are compared as json stores them, so the channels of nodes
+    without a token, keyed under None in the data and 'null' in the
+    base, are matched."""
+    info_data = dict(data[0])
+    new_hashes = info_data['hashes']
+    delta = [info_data] + [{} for x in range(CHANNELS)]
+    removed = {}
+    base_shared = string_keys(base_hashes['shared'])
+    for name, index in SECTIONS:
+        old = string_keys(base_hashes.get(name, {}))
+        new = string_keys(new_hashes[name])
+        for key in data[index]:
+            json_key = animlib.file.string_key(key)
+            if name == 'curves':
+                changed = (old.get(json_key) != new.get(json_key) or
+                           base_shared.get(json_key) !=
+                                        data[index][key].get('shared'))
+            else:
+                changed = old.get(json_key) != new.get(json_key)
+            if changed:
+                delta[index][key] = data[index][key]
+        removed[name] = sorted([x for x in old if x not in new])
+
+    # Compare the channel data per channel.
+    old = string_keys(base_hashes.get('channels', {}))
+    new = string_keys(new_hashes['channels'])
+    removed['channels'] = {}
+    for token in data[CHANNELS]:
+        json_token = animlib.file.string_key(token)
+        old_channels = old.get(json_token, {})
+        for channel in data[CHANNELS][token]:
+            if old_channels.get(channel) != new[json_token][channel]:
+                if not token in delta[CHANNELS]:
+                    delta[CHANNELS][token] = {}
+                delta[CHANNELS][token][channel] = \
+                                        data[CHANNELS][token][channel]
+    for token in old:
+        gone = [x for x in old[token] if x not in new.get(token, {})]
+        if gone:
+            removed['channels'][token] = sorted(gone)
+    info_data['removed'] = removed
+    return tuple(delta)
+
+
+#======================================================================
+def merge(base_data, delta_data):
+    """Returns the export data of the delta merged over its base."""
+    info_data = dict(delta_data[0])
+    removed = info_data.pop('removed', {})
+    info_data.pop('base', None)
+    info_data.pop('base_hash', None)
+    merged = [info_data] + [{} for x in range(CHANNELS)]
+    for name, index in SECTIONS:
+        section = dict(base_data[index])
+        for key in removed.get(name, []):
+            section.pop(key, None)
+        section.update(delta_data[index])
+        merged[index] = section
+
+    # Merge the channel data per channel.
+    section = dict([(x, dict(base_data[CHANNELS][x]))
+                    for x in base_data[CHANNELS]])
+    for token, channels in removed.get('channels', {}).items():
+        for channel in channels:
+            section.get(token, {}).pop(channel, None)
+        if token in section and not section[token]:
+            del section[token]
+    for token in delta_data[CHANNELS]:
+        if not token in section:
+            section[token] = {}
+        section[token].update(delta_data[CHANNELS][token])
+    merged[CHANNELS] = section
+    return merged
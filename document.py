@@ -0,0 +1,220 @@
+"""Reads an anim file as a document whose sections, and the entries of
+each token within them, are decoded from json the first time they are
+used rather than all at once.
+
+    with animlib.document.load(filepath) as document:
+        info_data = document.info
+        curve_data = document[3]['@CRV0!']
+        animlib.apply.build(document, reference_filter=reference_filter)
+
+A document stands in for the 7 part export data returned by animlib.
+file.read(): it can be indexed and unpacked the same way, and each of
+its sections is a dictionary-like Section. animlib.apply.build() only
+asks for the entries of the tokens that pass its reference filter, so
+applying one reference from a file of many decodes little more than
+that reference's share of it. Entries that are no longer needed can be
+released, and are decoded again if they are asked for later.
+
+Only sectioned anim files are read lazily. Json anim files, deltas and
+baked exports are read in full by animlib.file.read() and wrapped.
+
+Only the sections of an uncompressed anim file can be read a token at a
+time. A compressed section is a single stream that can't be entered
+part way, so the first entry decoded from it decompresses the whole
+section, which is then held in memory until the section is released.
+Decoding one reference of a compressed file still converts only its
+share of the json, but reads and holds all of every section it
+touches: export without a codec for files that are read in parts.
+"""
+import json
+import os.path
+from animlib.scene import cmds
+import animlib.curve
+import animlib.file
+import animlib.keyarray
+
+#======================================================================
+class AnimDocument(object):
+    """The export info and lazily decoded sections of an anim file.
+    
+    The first entry decoded from a compressed section decompresses and
+    holds all of it until it is released, see the module notes."""
+
+    def __init__(self, info, sections, filepath=None, header=None):
+        self.info = info
+        self.sections = sections
+        self.filepath = filepath
+        self.header = header
+        self.anim_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+        return False
+
+    def __getitem__(self, index):
+        if index == 0:
+            return self.info
+        return self.sections[index - 1]
+
+    def __iter__(self):
+        return iter([self.info] + self.sections)
+
+    def __len__(self):
+        return len(self.sections) + 1
+
+    def read(self, section, start=0, end=None):
+        """Returns the bytes of the section of the anim file from start to
+        end, opening the file if it is closed."""
+        if self.anim_file is None:
+            self.anim_file = open(self.filepath, 'rb')
+        return animlib.file.read_bytes(self.anim_file,
+                                       self.header,
+                                       section,
+                                       start,
+                                       end)
+
+    def restore_keys(self, curve_data):
+        """Puts back the keys stored as arrays of the curves in the curve
+        data."""
+        if self.anim_file is None:
+            self.anim_file = open(self.filepath, 'rb')
+        animlib.keyarray.restore(self.anim_file, self.header, curve_data)
+
+    def release(self):
+        """Forgets the decoded entries of every section."""
+        for section in self.sections:
+            section.release()
+
+    def close(self):
+        """Closes the anim file. It is opened again if any entries are
+        decoded afterwards."""
+        if self.anim_file is not None:
+            self.anim_file.close()
+            self.anim_file = None
+
+
+#======================================================================
+class Section(object):
+    """A dictionary-like section of an anim document, which decodes the
+    entry of a token the first time it is asked for."""
+
+    def __init__(self, document, section, index=None, data=None):
+        self.document = document
+        self.section = section
+        self.index = index
+        self.data = data
+        self._entries = {}
+        self._bytes = None
+
+    def __contains__(self, token):
+        if self.data is not None:
+            return token in self.data
+        return token in self.index
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __getitem__(self, token):
+        if self.data is not None:
+            return self.data[token]
+        if token not in self._entries:
+            self._entries[token] = self.decode(token)
+        return self._entries[token]
+
+    def keys(self):
+        """Returns the tokens of the section, without decoding them."""
+        if self.data is not None:
+            return self.data.keys()
+        return self.index.keys()
+
+    def get(self, token, default=None):
+        """Returns the entry of the token, or the default if it has
+        none."""
+        if token not in self:
+            return default
+        return self[token]
+
+    def items(self):
+        """Returns a list of the token and entry of every token, decoding
+        them all."""
+        return [(x, self[x]) for x in self.keys()]
+
+    def values(self):
+        """Returns a list of the entry of every token, decoding them
+        all."""
+        return [self[x] for x in self.keys()]
+
+    def decode(self, token):
+        """Reads the entry of the token from the anim file and converts
+        it from json."""
+        start, length = self.index[token]
+        header = self.document.header
+
+        # A compressed section is decompressed in full the first time an
+        # entry of it is decoded, and the bytes kept for the others.
+        if header[self.section][2]:
+            if self._bytes is None:
+                self._bytes = self.document.read(self.section)
+            entry_bytes = self._bytes[start:start + length]
+        else:
+            entry_bytes = self.document.read(self.section,
+                                             start,
+                                             start + length)
+        entry = json.loads(entry_bytes.decode('utf-8'))
+        if self.section == animlib.file.CURVES:
+            curve_data = {token: entry}
+            self.document.restore_keys(curve_data)
+            entry = animlib.curve.upgrade(curve_data[token])
+        return entry
+
+    def release(self, token=None):
+        """Forgets the decoded entry of the token, or of every token if
+        token is None."""
+        if token is None:
+            self._entries = {}
+            self._bytes = None
+        else:
+            self._entries.pop(token, None)
+
+
+#======================================================================
+def load(filepath):
+    """Returns an AnimDocument of the anim file, reading only its header,
+    info and index."""
+    if not filepath.endswith(animlib.file.EXT):
+        cmds.error("Filepath missing extension "
+                   "{0}: {1}".format(animlib.file.EXT, filepath))
+    if not os.path.exists(filepath):
+        cmds.error("Could not find anim file: {0}".format(filepath))
+    with open(filepath, 'rb') as anim_file:
+        header = animlib.file.read_header(anim_file)
+        if header:
+            info_data = animlib.file.read_section(anim_file, header, 0)
+            if not 'base' in info_data and not 'samples' in info_data:
+                index_data = animlib.file.read_section(anim_file,
+                                                       header,
+                                                       animlib.file.INDEX)
+                document = AnimDocument(info_data, [], filepath, header)
+                document.sections = [
+                            Section(document,
+                                    x,
+                                    index=index_data[animlib.file.SECTIONS[x]])
+                            for x in range(1, 7)]
+                return document
+    return wrap(animlib.file.read(filepath))
+
+
+#======================================================================
+def wrap(data):
+    """Returns an AnimDocument of export data that is already decoded,
+    such as that returned by animlib.file.read()."""
+    document = AnimDocument(data[0], [])
+    document.sections = [Section(document, x, data=data[x])
+                         for x in range(1, 7)]
+    return document
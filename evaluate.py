@@ -0,0 +1,308 @@
+"""Evaluates exported anim curve data without Maya.
+
+The curve dictionary format is sampled directly, following Maya's
+tangent maths: unweighted segments are a cubic Hermite, weighted
+segments a cubic Bezier, and the pre and post infinity modes repeat or
+extend the keyed range. When NumPy is available many times are
+evaluated in one vectorised pass, otherwise each time is evaluated in
+turn.
+"""
+import bisect
+import math
+import animlib.curve
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Maya's infinity enums.
+CONSTANT = 0
+LINEAR = 1
+CYCLE = 3
+CYCLE_RELATIVE = 4
+OSCILLATE = 5
+
+# The number of bisection steps used to find the Bezier parameter of a
+# time on a weighted segment.
+BISECTION_STEPS = 50
+
+#======================================================================
+def curve(data, times, fps=24.0):
+    """Returns the values of the curve data at each of the times. On
+    time curves the times are frames at the given frame rate, on driven
+    curves they are input values.
+
+    A NumPy array is returned when NumPy is available, otherwise a
+    list. Shared curve stubs must be resolved to the data of the token
+    they point at first.
+    """
+    data = animlib.curve.upgrade(data)
+    if 'shared' in data:
+        raise ValueError("Curve {0} shares the data of {1}.".format(
+                                                        data['name'],
+                                                        data['shared']))
+    scale = time_scale(data, fps)
+    if numpy is not None:
+        return _curve_array(data, times, scale)
+    return [value(data, x, scale) for x in times]
+
+
+#======================================================================
+def sample(data, start, end, step=1.0, fps=24.0):
+    """Returns a tuple of the times from start to end inclusive at the
+    given step, and the curve's values at those times."""
+    count = int(math.floor((end - start) / float(step) + 1e-9)) + 1
+    times = [start + i*step for i in range(max(count, 0))]
+    return (times, curve(data, times, fps))
+
+
+#======================================================================
+def difference(data_a, data_b, times, fps=24.0):
+    """Returns the largest absolute difference between two curves at
+    the given times."""
+    values_a = curve(data_a, times, fps)
+    values_b = curve(data_b, times, fps)
+    if not len(values_a):
+        return 0.0
+    return float(max([abs(a - b) for a, b in zip(values_a, values_b)]))
+
+
+#======================================================================
+def time_scale(data, fps):
+    """Returns the number of time units per unit of tangent slope.
+    Tangent angles on time curves are measured per second, on driven
+    curves per unit of input."""
+    if data['type'].startswith('animCurveT'):
+        return float(fps)
+    return 1.0
+
+
+#======================================================================
+def value(data, time, scale):
+    """Returns the value of the upgraded curve data at a single time,
+    given the time scale of its tangents."""
+    keys = data['keys']
+    key_times = keys['time']
+    key_values = keys['value']
+    if not key_times:
+        return 0.0
+    first = key_times[0]
+    last = key_times[-1]
+
+    # Extend the curve beyond its keys with the infinity modes.
+    offset = 0.0
+    if time < first or time > last:
+        if time < first:
+            mode, end = data['pre'], 0
+            angle = keys['in_angle'][0]
+        else:
+            mode, end = data['post'], -1
+            angle = keys['out_angle'][-1]
+        period = last - first
+        if mode == LINEAR:
+            slope = math.tan(math.radians(angle)) / scale
+            return key_values[end] + slope * (time - key_times[end])
+        if mode not in (CYCLE, CYCLE_RELATIVE, OSCILLATE) or period <= 0:
+            return key_values[end]
+        cycles = math.floor((time - first) / period)
+        time = time - cycles * period
+        if mode == OSCILLATE and cycles % 2:
+            time = last - (time - first)
+        if mode == CYCLE_RELATIVE:
+            offset = cycles * (key_values[-1] - key_values[0])
+
+    # Find the segment the time falls in.
+    if time >= last:
+        return key_values[-1] + offset
+    index = bisect.bisect_right(key_times, time) - 1
+    index = min(max(index, 0), len(key_times) - 2)
+    if time <= key_times[index]:
+        return key_values[index] + offset
+    return segment(keys,
+                   data['weighted'],
+                   index,
+                   index+1,
+                   time,
+                   scale) + offset
+
+
+#======================================================================
+def segment(keys, weighted, start, end, time, scale):
+    """Evaluates the segment running from the out tangent of key start
+    to the in tangent of key end at the given time."""
+    t0 = keys['time'][start]
+    t1 = keys['time'][end]
+    v0 = keys['value'][start]
+    v1 = keys['value'][end]
+    out_type = animlib.curve.type_name(keys['out_type'][start])
+    if out_type == 'step':
+        return v0
+    if out_type == 'stepnext':
+        return v1
+    span = t1 - t0
+    out_angle = math.radians(keys['out_angle'][start])
+    in_angle = math.radians(keys['in_angle'][end])
+
+    # Unweighted tangents are a cubic Hermite in time.
+    if not weighted:
+        s = (time - t0) / span
+        m0 = math.tan(out_angle) / scale * span
+        m1 = math.tan(in_angle) / scale * span
+        return ((2*s**3 - 3*s**2 + 1) * v0 + (s**3 - 2*s**2 + s) * m0 +
+                (-2*s**3 + 3*s**2) * v1 + (s**3 - s**2) * m1)
+
+    # Weighted tangents are a cubic Bezier.
+    x1, y1, x2, y2 = control_points(keys, start, end, scale)
+    return bezier(v0, y1, y2, v1, bezier_parameter(t0, x1, x2, t1, time))
+
+
+#======================================================================
+def control_points(keys, start, end, scale):
+    """Returns the inner control points (x1, y1, x2, y2) of the weighted
+    segment from key start to key end. The control points sit a third
+    of the tangent vector from each key, and are kept within the segment
+    so the curve stays single valued in time."""
+    t0 = keys['time'][start]
+    t1 = keys['time'][end]
+    span = t1 - t0
+    out_angle = math.radians(keys['out_angle'][start])
+    in_angle = math.radians(keys['in_angle'][end])
+    out_weight = keys['out_weight'][start]
+    in_weight = keys['in_weight'][end]
+    return (t0 + min(out_weight*math.cos(out_angle)*scale/3.0, span),
+            keys['value'][start] + out_weight*math.sin(out_angle)/3.0,
+            t1 - min(in_weight*math.cos(in_angle)*scale/3.0, span),
+            keys['value'][end] - in_weight*math.sin(in_angle)/3.0,)
+
+
+#======================================================================
+def bezier_parameter(t0, x1, x2, t1, time):
+    """Returns the Bezier parameter at which a weighted segment with the
+    given times and control point times reaches the time, found by
+    bisection."""
+    low, high = 0.0, 1.0
+    for i in range(BISECTION_STEPS):
+        u = (low + high) * 0.5
+        if bezier(t0, x1, x2, t1, u) < time:
+            low = u
+        else:
+            high = u
+    return (low + high) * 0.5
+
+
+#======================================================================
+def bezier(p0, p1, p2, p3, u):
+    """Returns the value of a one dimensional cubic Bezier at u. Works
+    on floats or NumPy arrays."""
+    w = 1.0 - u
+    return w*w*w*p0 + 3*w*w*u*p1 + 3*w*u*u*p2 + u*u*u*p3
+
+
+#======================================================================
+def _curve_array(data, times, scale):
+    """Evaluates the upgraded curve data at an array of times with
+    NumPy. Mirrors value() one step at a time over the whole array."""
+    keys = data['keys']
+    times = numpy.array(times, dtype=numpy.float64).ravel()
+    key_times = numpy.array(keys['time'], dtype=numpy.float64)
+    key_values = numpy.array(keys['value'], dtype=numpy.float64)
+    result = numpy.zeros(times.shape)
+    if not len(key_times):
+        return result
+    first = key_times[0]
+    last = key_times[-1]
+    period = last - first
+
+    # Fold the times beyond the keys back into the keyed range, or
+    # resolve them directly for constant and linear infinity.
+    local = times.copy()
+    offset = numpy.zeros(times.shape)
+    resolved = numpy.zeros(times.shape, dtype=bool)
+    for mask, mode, end, angle in ((times < first,
+                                    data['pre'],
+                                    0,
+                                    keys['in_angle'][0]),
+                                   (times > last,
+                                    data['post'],
+                                    -1,
+                                    keys['out_angle'][-1]),):
+        if not mask.any():
+            continue
+        if mode == LINEAR:
+            slope = math.tan(math.radians(angle)) / scale
+            result[mask] = (key_values[end] +
+                            slope * (times[mask] - key_times[end]))
+            resolved |= mask
+        elif (mode not in (CYCLE, CYCLE_RELATIVE, OSCILLATE) or
+                period <= 0):
+            result[mask] = key_values[end]
+            resolved |= mask
+        else:
+            cycles = numpy.floor((times[mask] - first) / period)
+            folded = times[mask] - cycles * period
+            if mode == OSCILLATE:
+                odd = numpy.mod(cycles, 2) == 1
+                folded[odd] = last - (folded[odd] - first)
+            local[mask] = folded
+            if mode == CYCLE_RELATIVE:
+                offset[mask] = cycles * (key_values[-1] - key_values[0])
+
+    # Times on or past the last key take its value.
+    at_last = ~resolved & (local >= last)
+    result[at_last] = key_values[-1] + offset[at_last]
+    resolved |= at_last
+    if len(key_times) < 2 or resolved.all():
+        return result
+
+    # Gather the keys either side of each remaining time.
+    todo = ~resolved
+    t = local[todo]
+    index = numpy.searchsorted(key_times, t, side='right') - 1
+    index = numpy.clip(index, 0, len(key_times) - 2)
+    t0 = key_times[index]
+    t1 = key_times[index+1]
+    v0 = key_values[index]
+    v1 = key_values[index+1]
+    span = t1 - t0
+    out_angle = numpy.radians(numpy.array(keys['out_angle'],
+                                          dtype=numpy.float64))[index]
+    in_angle = numpy.radians(numpy.array(keys['in_angle'],
+                                         dtype=numpy.float64))[index+1]
+
+    if not data['weighted']:
+        s = (t - t0) / span
+        m0 = numpy.tan(out_angle) / scale * span
+        m1 = numpy.tan(in_angle) / scale * span
+        values = ((2*s**3 - 3*s**2 + 1) * v0 + (s**3 - 2*s**2 + s) * m0 +
+                  (-2*s**3 + 3*s**2) * v1 + (s**3 - s**2) * m1)
+    else:
+        out_weight = numpy.array(keys['out_weight'],
+                                 dtype=numpy.float64)[index]
+        in_weight = numpy.array(keys['in_weight'],
+                                dtype=numpy.float64)[index+1]
+        x1 = t0 + numpy.minimum(out_weight*numpy.cos(out_angle)*scale/3.0,
+                                span)
+        y1 = v0 + out_weight*numpy.sin(out_angle)/3.0
+        x2 = t1 - numpy.minimum(in_weight*numpy.cos(in_angle)*scale/3.0,
+                                span)
+        y2 = v1 - in_weight*numpy.sin(in_angle)/3.0
+        low = numpy.zeros(t.shape)
+        high = numpy.ones(t.shape)
+        for i in range(BISECTION_STEPS):
+            u = (low + high) * 0.5
+            below = bezier(t0, x1, x2, t1, u) < t
+            low = numpy.where(below, u, low)
+            high = numpy.where(below, high, u)
+        values = bezier(v0, y1, y2, v1, (low + high) * 0.5)
+
+    # Stepped segments hold one of their key values, and times exactly
+    # on a key take its value.
+    out_types = [animlib.curve.type_name(x) for x in keys['out_type']]
+    step = numpy.array([x == 'step' for x in out_types])[index]
+    step_next = numpy.array([x == 'stepnext' for x in out_types])[index]
+    values = numpy.where(step, v0, values)
+    values = numpy.where(step_next, v1, values)
+    values = numpy.where(t <= t0, v0, values)
+    result[todo] = values + offset[todo]
+    return result
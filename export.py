@@ -4,71 +4,481 @@ import animlib.channel
 import animlib.info
 import animlib.reference
 import animlib.curve
-import animlib.constraint
-import maya.cmds as cmds
-import pprint
+import animlib.handler
+import animlib.reduce
+import animlib.bake
+import animlib.query
+import animlib.delta
+import animlib.file
+import animlib.trace
+from animlib.scene import cmds
 import time
 
 #======================================================================
-def channels(channel_list):
+class ExportStats(object):
+    """Counts the work done by an export: the rounds of the graph walk,
+    the channels and nodes it visited and the time it took."""
+    
+    def __init__(self):
+        self.rounds = 0
+        self.channels = 0
+        self.nodes = 0
+        self.seconds = 0.0
+        self.start_time = time.time()
+        
+    def finish(self):
+        """Records the time taken since the stats were created."""
+        self.seconds = time.time() - self.start_time
+        
+    def as_dict(self):
+        """Returns the stats as a dictionary for the info data."""
+        return {'rounds': self.rounds,
+                'channels': self.channels,
+                'nodes': self.nodes,
+                'seconds': self.seconds,}
+                
+    def report(self):
+        """Prints the stats."""
+        print(" > Visited {0} channels on {1} nodes in {2} rounds in "
+              "{3:.3f}s.".format(self.channels,
+                                 self.nodes,
+                                 self.rounds,
+                                 self.seconds))
+    
+
+#======================================================================
+def channels(channel_list,
+             deduplicate=True,
+             collapse_static=False,
+             tolerance=None,
+             bake_range=None,
+             bake_step=1.0,
+             sample_type='float32',
+             stats=None,
+             base_filepath=None,
+             frame_range=None,
+             verbose=False):
     """Returns dictionaries of channel data, reference data, animation
     curve data and constraint node data that can be used to rebuild the
     incoming graph for the given channels.
+    
+    If deduplicate is True, anim curves with identical data are stored
+    once and the other tokens refer to it.
+    
+    If collapse_static is True, channels driven by anim curves whose
+    value never changes record that value instead of the connection, 
+    and the curves are not exported.
+    
+    If a tolerance is given, keys that the rest of the curve reproduces
+    within that tolerance are removed from the exported curves, and the
+    per-curve stats are recorded in the info data under 'reduction'.
+    
+    If a bake_range (start, end) is given, the channels are sampled at 
+    every bake_step over the range instead and no nodes upstream of the
+    channels are exported. See bake_channels().
+    
+    If the base_filepath of a previous anim file is given, only the
+    entries that changed since it are returned, and the base is recorded
+    in the info data under 'base'. Curves that have not changed are not
+    reduced again. See animlib.delta.
+    
+    If a frame_range (start, end) is given, only the keys of the anim 
+    curves within it are exported, with keys added at the ends of the 
+    range to keep the shape of the curves. The range is recorded in the
+    info data under 'frame_range'. See animlib.clip.
+    
+    The work done is counted in the stats, an ExportStats, or a new one
+    if none is given, and recorded in the info data under 'stats'. The
+    hit rates of the cached scene queries are recorded under 
+    'query_cache'. Both are printed if verbose is True or animlib.trace
+    is enabled.
     """
+    if stats is None:
+        stats = ExportStats()
+    if bake_range is not None:
+        return bake_channels(channel_list,
+                             bake_range,
+                             bake_step,
+                             sample_type,
+                             stats,
+                             verbose)
       
+    # Read the hashes of the base export. A base without hashes cannot
+    # be compared against, so the export is made in full.
+    base_hashes = None
+    if base_filepath:
+        base_hashes = animlib.file.read_info(base_filepath).get('hashes')
+        if not base_hashes:
+            print(" > No hashes in {0}, exporting in full.".format(
+                                                        base_filepath))
+    
+    with animlib.trace.span('export.channels'):
+        data = collect(stream(channel_list,
+                              deduplicate,
+                              collapse_static,
+                              tolerance,
+                              stats,
+                              base_hashes,
+                              frame_range,
+                              verbose))
+    
+    # Reduce the data to the changes since the base if there is one.
+    if base_hashes:
+        channel_count = len(data[6])
+        with animlib.trace.span('export.delta') as span:
+            data = animlib.delta.diff(data, base_hashes)
+            span.count(curves=len(data[3]), channel_tokens=len(data[6]))
+        data[0]['base'] = base_filepath
+        print(" > Exported {0} of {1} curves and {2} of {3} channel "
+              "tokens changed since {4}.".format(
+                                    len(data[3]),
+                                    len(data[0]['hashes']['curves']),
+                                    len(data[6]),
+                                    channel_count,
+                                    base_filepath))
+    return data
+    
+    
+#======================================================================
+def stream(channel_list,
+           deduplicate=True,
+           collapse_static=False,
+           tolerance=None,
+           stats=None,
+           base_hashes=None,
+           frame_range=None,
+           verbose=False):
+    """Exports the channels as channels() does, but yields the data as
+    it is captured, as (index, key, value) records: the index of the
+    section of the data, and the token or channel the value is stored
+    under in it. The info data comes last, with a key of None.
+    
+    The anim curves, which make up most of an export, are exported,
+    reduced and yielded one at a time, so only the curve being yielded
+    is held in memory. Use animlib.file.write_stream() to write the
+    records to an anim file as they come, or collect() to gather them.
+    
+    Curves that are unchanged since the export with the base_hashes are
+    not yielded if the base stores them in full, and the base is noted
+    in the info data under 'base_hash'. The records are then only fit to
+    be reduced to a delta by channels(), and animlib.file.write_stream()
+    refuses them. See animlib.delta.
+    
+    Each phase is timed with an animlib.trace span. The spans around
+    yielded records include the time taken to consume them.
+    """
+    if stats is None:
+        stats = ExportStats()
+    
+    # Start with an empty query cache, as the scene may have changed
+    # since the last export.
+    animlib.query.clear()
+    hashes = animlib.delta.empty_hashes()
+    
     # Process the channels first, and receive a dictionary of channel
-    # data and dictionaries listing the reference nodes, curve nodes and
-    # constraint nodes with their tokens as the dictionary keys.
-    (channel_data,
-     reference_nodes,
-     anim_curve_nodes,
-     constraint_nodes,
-     pairblend_nodes,
-     dependency_data,) = process_channels(channel_list)
+    # data and dictionaries listing the reference nodes and the nodes of
+    # each handler's prefix with their tokens as the dictionary keys.
+    curve_data = {}
+    collapsed = set()
+    with animlib.trace.span('export.walk') as span:
+        (channel_data,
+         node_list,
+         dependency_data,) = process_channels(channel_list,
+                                              collapse_static,
+                                              curve_data,
+                                              collapsed,
+                                              stats,
+                                              frame_range)
+        reference_nodes = node_list[animlib.handler.REFERENCE]
+        anim_curve_nodes = node_list.pop(animlib.handler.CURVE)
+        span.count(rounds=stats.rounds,
+                   channels=stats.channels,
+                   nodes=stats.nodes)
      
     # Export the data for the nodes the channels are dependent upon.
-    reference_data = process_references(reference_nodes)
-    anim_curve_data = process_anim_curves(anim_curve_nodes)
-    constraint_data = process_constraints(constraint_nodes)
-    pairblend_data = process_pairblends(pairblend_nodes, channel_data)
+    with animlib.trace.span('export.references') as span:
+        reference_data = process_references(reference_nodes)
+        for token in sorted(reference_data):
+            yield record(hashes, 2, token, reference_data[token])
+        span.count(references=len(reference_data))
+    reduction = {}
+    with animlib.trace.span('export.curves') as span:
+        for token, data in iter_anim_curves(anim_curve_nodes,
+                                            deduplicate,
+                                            curve_data,
+                                            tolerance,
+                                            reduction,
+                                            base_hashes,
+                                            hashes['curves'],
+                                            hashes['payloads'],
+                                            frame_range):
+            yield record(hashes, 3, token, data)
+            span.count(written=1)
+        span.count(curves=len(anim_curve_nodes))
+    
+    # Export the nodes of the other handlers into their sections.
+    for handler in animlib.handler.handlers():
+        if not handler.prefix in node_list:
+            continue
+        with animlib.trace.span('export.'+handler.name) as span:
+            node_data = process_nodes(handler,
+                                      node_list[handler.prefix],
+                                      channel_data)
+            for token in sorted(node_data):
+                yield record(hashes,
+                             handler.section,
+                             token,
+                             node_data[token])
+            span.count(nodes=len(node_data))
+    with animlib.trace.span('export.channel_data') as span:
+        for token in sorted(dependency_data):
+            yield record(hashes, 1, token, dependency_data[token])
+        for token in channel_data:
+            yield record(hashes, 6, token, channel_data[token])
+            span.count(channels=len(channel_data[token]))
     
     # Export information about the 
-    info_data = animlib.info.export(channels, reference_data)
+    with animlib.trace.span('export.info'):
+        info_data = animlib.info.export(channels, reference_data)
+    
+        # Report the static curves that were recorded as values.
+        if collapse_static:
+            print(" > Collapsed {0} static anim curves.".format(
+                                                            len(collapsed)))
+            info_data['collapsed_curves'] = len(collapsed)
+        
+        # Record the frame range the curves were clipped to.
+        if frame_range is not None:
+            print(" > Clipped anim curves to frames {0} to {1}.".format(
+                                                            frame_range[0],
+                                                            frame_range[1]))
+            info_data['frame_range'] = [frame_range[0], frame_range[1]]
+        
+        # Report the keys removed by the reduction.
+        if tolerance is not None:
+            summary = animlib.reduce.summarise(reduction)
+            print(" > Reduced {0} keys to {1}.".format(summary['keys'],
+                                                       summary['kept']))
+            info_data['reduction'] = reduction
+        
+        # Record the work done, and report it if asked to.
+        stats.finish()
+        if verbose or animlib.trace.is_enabled():
+            stats.report()
+        info_data['stats'] = stats.as_dict()
+    
+        # Record what the cached queries saved, report it if asked to,
+        # and release the cache.
+        if verbose or animlib.trace.is_enabled():
+            animlib.query.report()
+        info_data['query_cache'] = animlib.query.stats()
+        animlib.query.clear()
+    
+        info_data['hashes'] = hashes
+        if base_hashes:
+            info_data['base_hash'] = animlib.delta.base_hash(base_hashes)
+    yield (0, None, info_data)
+    
+    
+#======================================================================
+def record(hashes, index, key, value):
+    """Adds the hash of the value to the hashes, and returns the record
+    of it for stream()."""
+    animlib.delta.add_hash(hashes, index, key, value)
+    return (index, key, value)
+    
+    
+#======================================================================
+def collect(records):
+    """Gathers the records yielded by stream() into the export data."""
+    data = [None] + [{} for x in range(6)]
+    for index, key, value in records:
+        if index == 0:
+            data[0] = value
+        else:
+            data[index][key] = value
+    return tuple(data)
+    
+    
+#======================================================================
+def bake_channels(channel_list,
+                  frame_range,
+                  step=1.0,
+                  sample_type='float32',
+                  stats=None,
+                  verbose=False):
+    """Returns the same data as channels(), with the values of the 
+    channels sampled over the frame range in place of the curves, 
+    constraints and pairBlends driving them.
+    
+    The samples are recorded in the info data under 'samples' with the
+    frame range, the sample type, and the tokenised name and attribute
+    type of each channel. The sample array itself is held under 'data'
+    and is written to its own binary file next to the anim file.
     
+    The work done is counted in the stats, an ExportStats, if given.
+    It and the query cache hit rates are printed if verbose is True or
+    animlib.trace is enabled.
+    """
+    if stats is None:
+        stats = ExportStats()
+    animlib.query.clear()
+    node_list = animlib.handler.node_lists()
+    processed_nodes = {}
+    channel_data = {}
+    baked_channels = []
+    baked_names = []
+    baked_types = []
+    for channel in sorted(set(channel_list)):
+        if not animlib.channel.is_gettable(channel):
+            continue
+        data_type = cmds.getAttr(channel, type=True)
+        if not animlib.channel.is_type_numeric(data_type):
+            print(" > Skipping non-numeric channel {0}.".format(channel))
+            continue
+            
+        # Tokenise the channel name, so the samples can be applied if
+        # the namespace changes or is remapped at build time.
+        (token,
+         name,
+         node_list,
+         processed_nodes,) = tokenise_attr(channel,
+                                           node_list,
+                                           processed_nodes,
+                                           [],)
+        if token and not token.startswith(animlib.handler.REFERENCE):
+            print(" > Skipping channel on an exported node "
+                  "{0}.".format(channel))
+            continue
+        if not token in channel_data:
+            channel_data[token] = {}
+        channel_data[token][name] = (None,
+                                     cmds.getAttr(channel),
+                                     True,
+                                     data_type)
+        baked_channels.append(channel)
+        baked_names.append(name)
+        baked_types.append(data_type)
+        
+    # Sample every channel over the frame range.
+    frame_list = animlib.bake.frames(frame_range, step)
+    with animlib.trace.span('export.bake') as span:
+        samples, sampled = animlib.bake.sample(baked_channels,
+                                               frame_list,
+                                               sample_type)
+        span.count(channels=len(baked_channels), frames=len(frame_list))
+    print(" > Baked {0} of {1} channels over {2} frames.".format(
+                                                    len(sampled),
+                                                    len(baked_channels),
+                                                    len(frame_list)))
+    indices = [baked_channels.index(x) for x in sampled]
+    
+    reference_data = process_references(
+                                    node_list[animlib.handler.REFERENCE])
+    info_data = animlib.info.export(channels, reference_data)
+    info_data['samples'] = {'start': frame_range[0],
+                            'end': frame_range[1],
+                            'step': step,
+                            'type': sample_type,
+                            'channels': [baked_names[x] for x in indices],
+                            'types': [baked_types[x] for x in indices],
+                            'data': samples,}
+    stats.rounds = 1
+    stats.channels = len(baked_channels)
+    stats.nodes = len(processed_nodes)
+    stats.finish()
+    if verbose or animlib.trace.is_enabled():
+        stats.report()
+    info_data['stats'] = stats.as_dict()
+    if verbose or animlib.trace.is_enabled():
+        animlib.query.report()
+    info_data['query_cache'] = animlib.query.stats()
+    animlib.query.clear()
     return (info_data,
-            dependency_data,
+            {},
             reference_data,
-            anim_curve_data,
-            constraint_data,
-            pairblend_data,
+            {},
+            {},
+            {},
             channel_data,
             )
-    
-    
-    
+            
+            
 #======================================================================
-def process_channels(channel_list):
+def process_channels(channel_list,
+                     collapse_static=False,
+                     curve_data=None,
+                     collapsed=None,
+                     stats=None,
+                     frame_range=None):
     """ Cycles through a list of channels, recording channel data and
     the downstream nodes that can be exported.
+    
+    The channels are walked in rounds: each round processes, in sorted
+    order, the channels found on the nodes exported by the last round
+    that haven't been visited yet.
+    
+    If collapse_static is True, connections from static anim curves are
+    recorded as values. The curves checked are exported into the 
+    curve_data dictionary so they needn't be read again, and the static 
+    ones are added to the collapsed set.
+    
+    The rounds, channels and nodes visited are counted in the stats, an
+    ExportStats, if given.
+    
+    The curves checked are clipped to the frame_range, if given, so only
+    the keys within it decide whether a curve is static.
     """
+    if curve_data is None:
+        curve_data = {}
+    if collapsed is None:
+        collapsed = set()
+    if stats is None:
+        stats = ExportStats()
+    fps = None
+    if collapse_static and frame_range is not None:
+        fps = animlib.info.frame_rate()
     processed_nodes = {}
     channel_data = {}
-    node_list = {"@REF":{},
-                 "@CRV":{},
-                 "@CON":{},
-                 "@PRB":{},}
+    node_list = animlib.handler.node_lists()
     dependency_data = {}
-    processed_channels = []
+    visited = set()
+    channel_list = sorted(set(channel_list))
     while channel_list:
+        stats.rounds += 1
+        stats.channels += len(channel_list)
+        visited.update(channel_list)
         new_channels = []
-        channel_list = list(set(channel_list))
+        
+        # Retrieve the data of the channels in bulk, node by node.
+        captured = animlib.channel.get_channels(channel_list)
+        
+        # Resolve the types of the nodes met this round in one query,
+        # rather than one query per node as they are tokenised.
+        round_nodes = [x.split('.')[0] for x in channel_list]
+        round_nodes += [x[0].split('.')[0] for x in captured.values()
+                        if x[0]]
+        animlib.query.prime_node_types([x for x in round_nodes
+                                        if x not in processed_nodes])
         for channel in channel_list:
             # If the channel data can't be retrieved, skip this channel.
-            if not animlib.channel.is_gettable(channel):
+            if channel not in captured:
                 continue
                 
             # Retrieve the channel data.
-            source_attr, value, altered, type = animlib.channel.get(channel)
+            source_attr, value, altered, type = captured[channel]
+            
+            # If the source is a static anim curve, keep the value and
+            # drop the connection.
+            if source_attr and collapse_static:
+                source_node = source_attr.split('.')[0]
+                if is_static_curve(source_node,
+                                   curve_data,
+                                   frame_range,
+                                   fps):
+                    collapsed.add(source_node)
+                    source_attr = None
+                    altered = True
     
             # Tokenise the channel name, so the data can be applied if
             #  the name changes or is remapped at build time.
@@ -105,9 +515,12 @@ def process_channels(channel_list):
             if not token in channel_data:
                 channel_data[token]={}
             channel_data[token][channel] = (source_attr, value, altered, type)
-        processed_channels += channel_list
-        channel_list = [x for x in new_channels
-                        if x not in processed_channels]
+            
+        # Queue the channels of newly exported nodes that haven't been
+        # visited yet.
+        channel_list = sorted(set([x for x in new_channels
+                                   if x not in visited]))
+    stats.nodes = len(processed_nodes)
         
     # Tidy up the dependency data:
     for key in dependency_data:
@@ -115,10 +528,7 @@ def process_channels(channel_list):
         dependency_data[key].sort()
         
     return (channel_data,
-            node_list["@REF"],
-            node_list["@CRV"],
-            node_list["@CON"],
-            node_list["@PRB"],
+            node_list,
             dependency_data,)
             
             
@@ -141,38 +551,25 @@ def tokenise_attr(attr,
     else:
         # If the node is referenced create a 'REF#' token and add the  
         # node to the anim curve node dictionary.
-        if cmds.referenceQuery(node, isNodeReferenced=True):
-            ref_node = cmds.referenceQuery(node,
-                                           referenceNode=True,
-                                           topReference=True)
-            if ref_node in node_list['@REF']:
-                token = node_list['@REF'][ref_node]
+        reference_nodes = node_list[animlib.handler.REFERENCE]
+        if animlib.query.is_referenced(node):
+            ref_node = animlib.query.reference_node(node)
+            if ref_node in reference_nodes:
+                token = reference_nodes[ref_node]
             else:
-                token = "@REF{0}!".format(len(node_list['@REF']))
-                node_list['@REF'][ref_node] = token
+                token = "{0}{1}!".format(animlib.handler.REFERENCE,
+                                         len(reference_nodes))
+                reference_nodes[ref_node] = token
         else:
-            # If the node is exportable as an anim curve create a 'CRV#' 
-            # token and add the node to the anim curve node dictionary.
-            node_type = cmds.nodeType(node)
-            if animlib.curve.is_type_exportable(node_type):
-                token = "@CRV{0}!".format(len(node_list['@CRV']))
-                node_list['@CRV'][token] = node
-                new_channels +=  animlib.curve.list_channels(node)
-            
-            # If the node is exportable as an anim curve create a 'CRV#' 
-            # token and add the node to the anim curve node dictionary.
-            elif animlib.constraint.is_type_exportable(node_type):
-                token = "@CON{0}!".format(len(node_list['@CON']))
-                node_list['@CON'][token] = node
-                new_channels +=  animlib.constraint.list_channels(node)
-                
-            
-            # If the node is exportable as an pair blend create a 'PRB#' 
-            # token and add the node to the pair blend node dictionary.
-            elif animlib.pairblend.is_type_exportable(node_type):
-                token = "@PRB{0}!".format(len(node_list['@PRB']))
-                node_list['@PRB'][token] = node
-                new_channels +=  animlib.pairblend.list_channels(node)
+            # If a handler exports the node's type, create a token with
+            # its prefix and add the node to its node dictionary.
+            handler = animlib.handler.for_type(
+                                            animlib.query.node_type(node))
+            if handler:
+                nodes = node_list[handler.prefix]
+                token = handler.token(len(nodes))
+                nodes[token] = node
+                new_channels += handler.list_channels(node)
                 
             # Otherwise the node is not exportable.
             else:
@@ -184,80 +581,175 @@ def tokenise_attr(attr,
     if token:
         # If the token starts with REF, the node is referenced. Replace 
         # the top level of the namespace.
-        if "@REF" in token:
-            ref_node = cmds.referenceQuery(node,
-                                           referenceNode=True,
-                                           topReference=True)
-            namespace = cmds.referenceQuery(ref_node, namespace=True)
+        if token.startswith(animlib.handler.REFERENCE):
+            ref_node = animlib.query.reference_node(node)
+            namespace = animlib.query.namespace(ref_node)
             attr = attr.replace(namespace[1:], token)
             
-        # If it is an animation curve or a constraint. Replace the
+        # Otherwise it is a node exported by a handler. Replace the
         # entire name of the node, leaving only the channel name.
-        if "@CRV" in token or "@CON" in token or "@PRB" in token:
+        else:
             attr = token + attr[len(attr.split('.')[0]):]
 
     return (token, attr, node_list, processed_nodes,)
     
 
 
+#======================================================================
+def is_static_curve(node, curve_data, frame_range=None, fps=24.0):
+    """Returns True if the node is an unreferenced anim curve that holds
+    one value at all times, or over the frame_range if given. Checked
+    curves are exported into the curve_data dictionary, and other nodes
+    are recorded as None, so each node is only queried once."""
+    if node not in curve_data:
+        curve_data[node] = None
+        if (animlib.curve.is_type_exportable(
+                                    animlib.query.node_type(node)) and
+                not animlib.query.is_referenced(node)):
+            curve_data[node] = animlib.curve.export(node,
+                                                    frame_range,
+                                                    fps)
+    if not curve_data[node]:
+        return False
+    return animlib.curve.is_static(curve_data[node])
+    
+    
 #======================================================================
 def process_references(reference_nodes):
     """Cycles through the list of reference nodes and gathers the data
     needed to recreate the reference at build time.
     """
     reference_data = {}
-    reference_times = {}
     for reference_node in reference_nodes.keys():
-        start_time = time.time()
-        token = reference_nodes[reference_node]
-        data = animlib.reference.export(reference_node)
-        reference_data[token] = data
-        reference_times[reference_node] = str(time.time() - start_time)
-    pprint.pprint(reference_times)
+        with animlib.trace.span('export.reference',
+                                node=reference_node):
+            token = reference_nodes[reference_node]
+            data = animlib.reference.export(reference_node)
+            reference_data[token] = data
         
     return reference_data
     
 #======================================================================
-def process_anim_curves(anim_curve_nodes):
+def process_anim_curves(anim_curve_nodes,
+                        deduplicate=True,
+                        curve_data=None,
+                        tolerance=None,
+                        reduction=None,
+                        base_hashes=None,
+                        curve_hashes=None,
+                        payload_hashes=None,
+                        frame_range=None):
     """Cycles through the list of anim curve nodes and gathers the data
-    needed to recreate the curve at build time.
+    needed to recreate the curve at build time. See iter_anim_curves().
     """
-    anim_curve_data = {}
-    for token in anim_curve_nodes.keys():
-        anim_curve = anim_curve_nodes[token]
-        data = animlib.curve.export(anim_curve)
-        anim_curve_data[token] = data
-        
-    return anim_curve_data
+    return dict(iter_anim_curves(anim_curve_nodes,
+                                 deduplicate,
+                                 curve_data,
+                                 tolerance,
+                                 reduction,
+                                 base_hashes,
+                                 curve_hashes,
+                                 payload_hashes,
+                                 frame_range))
     
 #======================================================================
-def process_constraints(constraint_nodes):
-    """Cycles through the list of constraint nodes and gathers the data
-    needed to recreate the constraint at build time.
+def iter_anim_curves(anim_curve_nodes,
+                     deduplicate=True,
+                     curve_data=None,
+                     tolerance=None,
+                     reduction=None,
+                     base_hashes=None,
+                     curve_hashes=None,
+                     payload_hashes=None,
+                     frame_range=None):
+    """Cycles through the list of anim curve nodes and yields the token
+    and the data needed to recreate each curve at build time, one curve
+    at a time.
+    
+    If deduplicate is True, only the first token with a given curve
+    payload stores it. Later tokens store {'name': name, 'shared': 
+    token} pointing at the first.
+    
+    Curves already exported into curve_data, keyed by node, are reused
+    and removed from it.
+    
+    If a tolerance is given the curves are reduced and their stats are
+    added to the reduction dictionary by token.
+    
+    The hash of each curve as read from the scene is added to the 
+    curve_hashes dictionary by token, and the payload hash of the data
+    it stores to the payload_hashes. Curves that are unchanged since the
+    export with the base_hashes are not reduced again, and are left out
+    if the base stored their data in full.
+    
+    If a frame_range is given the curves are clipped to it.
     """
-    constraints_data = {}
-    for token in constraint_nodes.keys():
-        constraint_node = constraint_nodes[token]
-        data = animlib.constraint.export(constraint_node)
-        constraints_data[token] = data
+    if curve_data is None:
+        curve_data = {}
+    if reduction is None:
+        reduction = {}
+    if curve_hashes is None:
+        curve_hashes = {}
+    if payload_hashes is None:
+        payload_hashes = {}
+    fps = None
+    if tolerance is not None or frame_range is not None:
+        fps = animlib.info.frame_rate()
+    payloads = {}
+    shared = 0
+    for token in sorted(anim_curve_nodes.keys()):
+        anim_curve = anim_curve_nodes[token]
+        data = curve_data.pop(anim_curve, None)
+        if not data:
+            data = animlib.curve.export(anim_curve, frame_range, fps)
+        curve_hashes[token] = animlib.delta.curve_hash(data, tolerance)
+        
+        # A curve that is unchanged since the base export reduces to the
+        # same payload, so it is only reduced if its data is needed.
+        base_payload = None
+        if base_hashes and (base_hashes['curves'].get(token) ==
+                                                    curve_hashes[token]):
+            base_payload = base_hashes.get('payloads', {}).get(token)
+        if not base_payload and tolerance is not None:
+            data, reduction[token] = animlib.reduce.curve(data,
+                                                          tolerance,
+                                                          fps)
+        payload_hashes[token] = (base_payload or 
+                                 animlib.curve.payload_hash(data))
         
-    return constraints_data
+        if deduplicate:
+            payload = payload_hashes[token]
+            if payload in payloads:
+                shared += 1
+                yield token, {'name': data['name'],
+                              'shared': payloads[payload],}
+                continue
+            payloads[payload] = token
+            
+        # Leave out the data the base already stores in full.
+        if base_payload:
+            if not token in base_hashes.get('shared', {}):
+                continue
+            if tolerance is not None:
+                data, reduction[token] = animlib.reduce.curve(data,
+                                                              tolerance,
+                                                              fps)
+        yield token, data
+    if shared:
+        print(" > Shared {0} duplicate anim curves.".format(shared))
     
 #======================================================================
-def process_pairblends(pairblend_nodes, channel_data):
-    """Cycles through the list of pairBlend nodes and gathers the data
-    needed to recreate the pairBlend at build time.
+def process_nodes(handler, nodes, channel_data):
+    """Cycles through the dictionary of a handler's nodes and gathers the
+    data needed to recreate them at build time. Nodes the handler cannot
+    export are left out.
     """
-    pairblends_data = {}
-    for token in pairblend_nodes.keys():
-        pairblend_node = pairblend_nodes[token]
-        try:
-            pairblend_object = channel_data[token][token+'.weight']
-        except KeyError:
-            continue
-        data = animlib.pairblend.export(pairblend_node,
-                                        pairblend_object)
-        pairblends_data[token] = data
+    nodes_data = {}
+    for token in nodes.keys():
+        data = handler.export(nodes[token], token, channel_data)
+        if data is not None:
+            nodes_data[token] = data
         
-    return pairblends_data
+    return nodes_data
+
 
@@ -1,3 +1,6 @@
+from animlib.scene import cmds
+import animlib.export
+import animlib.file
 
 
 #====================================
@@ -16,20 +19,8 @@ def export_namespace(namespace,
     """
     """
 
-    # Check the namespace exists and is not empty.
-    if not cmds.namespace(exists=namespace):
-        cmds.error("Cannot export namespace {0}, it does not exist.".format(
-                                                                     namespace))
-    if not cmds.namespaceInfo(namespace, listNamespace=True):
-        cmds.error("Cannot export namespace {0}, it is empty.".format(
-                                                                     namespace))
-
-    # Build a list of nodes in the namespace that match the filter. Recursive
-    # allows us to query child namespaces as well.
-    nodes = cmds.ls(namespace+":*"+node_filter, recursive = True)
-
     # Build a list of channels to process.
-    channels = get_channels_from_nodes(nodes, keyable=True, nonkeyable=True)
+    channels = get_namespace_channels(namespace, node_filter)
 
     # Get the channel data for the list of channels.
     channel_data = channel.get_channel_list_input(namespace, channels)
@@ -42,6 +33,162 @@ def export_namespace(namespace,
                 channel_data)
 
 
+#====================================
+def export_file(namespace,
+                filepath,
+                node_filter="*_ctrl",
+                keyable=True,
+                nonkeyable=True,
+                overwrite=True,
+                **export_kwargs):
+    """Exports the channels of the nodes in the namespace that match the
+    filter to an anim file at the filepath and returns the filepath. Any
+    export_kwargs are passed on to animlib.export.channels(). See
+    write_channels().
+    """
+    channels = get_namespace_channels(namespace,
+                                      node_filter,
+                                      keyable=keyable,
+                                      nonkeyable=nonkeyable)
+    return write_channels(filepath,
+                          channels,
+                          overwrite=overwrite,
+                          **export_kwargs)
+
+
+#====================================
+def export_namespaces(namespaces=None,
+                      node_filter="*_ctrl",
+                      keyable=True,
+                      nonkeyable=True,
+                      **export_kwargs):
+    """Exports the channels of the nodes that match the filter in all of
+    the namespaces, or of every top level reference if none are given,
+    in a single pass and returns the export data.
+    
+    The namespaces share one walk of the graph and one table of tokens,
+    so nodes upstream of more than one of them, such as constraints to
+    world props and shared driver curves, are read and stored once. Any
+    export_kwargs are passed on to animlib.export.channels(). Pass a
+    reference_filter to animlib.apply.build() to apply a subset of the
+    namespaces.
+    """
+    channels = get_namespaces_channels(namespaces,
+                                       node_filter,
+                                       keyable=keyable,
+                                       nonkeyable=nonkeyable)
+    return animlib.export.channels(channels, **export_kwargs)
+
+
+#====================================
+def export_scene_file(filepath,
+                      namespaces=None,
+                      node_filter="*_ctrl",
+                      keyable=True,
+                      nonkeyable=True,
+                      overwrite=True,
+                      **export_kwargs):
+    """Exports the channels of the nodes in all of the namespaces that 
+    match the filter to a single anim file at the filepath in one pass,
+    and returns the filepath. See export_namespaces() and
+    write_channels().
+    """
+    channels = get_namespaces_channels(namespaces,
+                                       node_filter,
+                                       keyable=keyable,
+                                       nonkeyable=nonkeyable)
+    return write_channels(filepath,
+                          channels,
+                          overwrite=overwrite,
+                          **export_kwargs)
+
+
+#====================================
+def write_channels(filepath, channels, overwrite=True, **export_kwargs):
+    """Exports the channels to an anim file at the filepath and returns
+    the filepath. Any export_kwargs are passed on to animlib.export.
+    channels().
+    
+    The export is streamed into the file with animlib.export.stream(),
+    so only one curve is held in memory at a time, unless it is a delta
+    export against a base_filepath or is baked over a bake_range, which
+    are exported in full and then written.
+    """
+    if (export_kwargs.get('base_filepath') or
+            export_kwargs.get('bake_range') is not None):
+        data = animlib.export.channels(channels, **export_kwargs)
+        animlib.file.write(filepath, data, overwrite=overwrite)
+        return filepath
+        
+    # Leave out the settings that only apply to deltas and bakes.
+    stream_kwargs = dict(export_kwargs)
+    for key in ('base_filepath', 'bake_range', 'bake_step', 'sample_type'):
+        stream_kwargs.pop(key, None)
+    animlib.file.write_stream(filepath,
+                              animlib.export.stream(channels,
+                                                    **stream_kwargs),
+                              overwrite=overwrite)
+    return filepath
+
+
+#====================================
+def get_namespaces_channels(namespaces=None,
+                            node_filter="*_ctrl",
+                            keyable=True,
+                            nonkeyable=True):
+    """Returns the channels of the nodes that match the filter in all of
+    the namespaces, or of every top level reference if none are given.
+    """
+    if namespaces is None:
+        namespaces = get_reference_namespaces()
+    channels = []
+    for namespace in namespaces:
+        channels += get_namespace_channels(namespace,
+                                           node_filter,
+                                           keyable=keyable,
+                                           nonkeyable=nonkeyable)
+    print("Exporting {0} channels from {1} namespaces.".format(
+                                                            len(channels),
+                                                            len(namespaces)))
+    return channels
+
+
+#====================================
+def get_reference_namespaces():
+    """Returns the namespaces of the top level references in the scene.
+    """
+    namespaces = []
+    for reference_file in cmds.file(query=True, reference=True) or []:
+        namespaces.append(cmds.file(reference_file,
+                                    query=True,
+                                    namespace=True))
+    return namespaces
+
+
+#====================================
+def get_namespace_channels(namespace,
+                           node_filter="*_ctrl",
+                           keyable=True,
+                           nonkeyable=True):
+    """Returns a list of the channels of the nodes in the namespace that
+    match the filter.
+    """
+    # Check the namespace exists and is not empty.
+    if not cmds.namespace(exists=namespace):
+        cmds.error("Cannot export namespace {0}, it does not exist.".format(
+                                                                     namespace))
+    if not cmds.namespaceInfo(namespace, listNamespace=True):
+        cmds.error("Cannot export namespace {0}, it is empty.".format(
+                                                                     namespace))
+
+    # Build a list of nodes in the namespace that match the filter. Recursive
+    # allows us to query child namespaces as well.
+    nodes = cmds.ls(namespace+":*"+node_filter, recursive = True)
+    return get_channels_from_nodes(nodes,
+                                   keyable=keyable,
+                                   nonkeyable=nonkeyable)
+
+
 #====================================
 def get_channels_from_nodes(nodes, keyable=True, nonkeyable=True):
     """Receives a list of nodes and returns a list of channels that match the
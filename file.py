@@ -1,19 +1,165 @@
-"""Reads and writes the .anim files into the library."""
+"""Reads and writes the .anim files into the library.
+
+Anim files are written as a sectioned container, so readers can seek to
+just the sections they need rather than loading the whole file:
+
+    header   the magic bytes, the format version and the offset and
+             length of each section, at a fixed size
+    info     the export info
+    ...      the dependency, reference, anim curve, constraint, pair-
+             blend and channel data, each a json object
+    index    the offset and length of the json value of each token
+             within the dependency to channel sections
+    keys     the keys of the anim curves as binary arrays, see
+             animlib.keyarray
+
+Offsets are in bytes from the start of the first section, and those in
+the index from the start of their section. read_info() reads only the
+header and the info, and read_tokens() only the values of the tokens
+asked for. Anim files written as a single json list by older versions
+are still read.
+
+Each section can be compressed on its own with zlib, gzip or lzma, which
+shrinks the file many times over for a little time spent encoding, so
+files on the network share are quicker to write and read:
+
+    animlib.file.write(filepath, data, codec='gzip', level=6)
+
+The codec is noted in the header and the sections are decompressed as
+they are read. Anim files written as a single json list can be
+compressed too, and are recognised by the magic bytes of their codec.
+lzma is only available if its module can be imported.
+"""
 
 import os
 import os.path
 import errno
+import io
 import json
 import pprint
-import maya.cmds as cmds
+import struct
+import tempfile
+import zlib
+from animlib.scene import cmds
+import animlib.curve
+import animlib.bake
+import animlib.delta
+import animlib.keyarray
+import animlib.trace
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
 
 EXT = '.anim'
 
+# The first bytes of a sectioned anim file, which can't begin a json
+# file.
+MAGIC = b'\x89ANIMLIB'
+VERSION = 2
+
+# The sections of a sectioned anim file, in the order of the export data,
+# followed by the index of their tokens and the key arrays, which
+# version 1 files don't have.
+SECTIONS = ('info',
+            'dependency',
+            'references',
+            'curves',
+            'constraints',
+            'pairblends',
+            'channels',
+            'index',
+            'keys',)
+CURVES = SECTIONS.index('curves')
+CHANNELS = SECTIONS.index('channels')
+INDEX = SECTIONS.index('index')
+KEYS = SECTIONS.index('keys')
+
+# The header holds the magic bytes, version and the index of the codec
+# in CODECS, followed by the offset and length of each section, little-
+# endian, for each version.
+HEADER_START = struct.Struct('<8sHH')
+HEADERS = {1: struct.Struct('<8sHH' + 'QQ' * KEYS),
+           2: struct.Struct('<8sHH' + 'QQ' * len(SECTIONS)),}
+HEADER = HEADERS[VERSION]
+
+# The codecs the sections can be compressed with.
+CODECS = (None,
+          'zlib',
+          'gzip',
+          'lzma',)
+
+# The first bytes of a json anim file compressed by each codec. zlib
+# streams start with a 2 byte header that is a multiple of 31.
+CODEC_MAGIC = (('gzip', b'\x1f\x8b'),
+               ('lzma', b'\xfd7zXZ\x00'),)
+
+# The number of bytes compressed or decompressed at a time.
+CHUNK_SIZE = 1 << 16
+
+try:
+    STRING_TYPES = basestring
+except NameError:
+    STRING_TYPES = str
+
 #======================================================================
-def write(filepath, data, overwrite=False):
+def write(filepath,
+          data,
+          overwrite=False,
+          sectioned=True,
+          codec=None,
+          level=None):
     """Checks the filepath is fine to write to, converts the data using
-    json and then writes the converted data to the filepath. Returns
-    the filepath.
+    json and then writes the converted data to the filepath, as a
+    sectioned anim file unless sectioned is False, when it is written as
+    a single json list. The data is compressed with the codec, one of
+    CODECS, at the level from 0 to 9, or the codec's default if None.
+    Returns the filepath.
+    """
+    directory = check_filepath(filepath, overwrite)
+
+    # Write any baked samples to their own binary file, and record its
+    # name in place of the samples.
+    info_data = data[0]
+    if 'samples' in info_data and 'data' in info_data['samples']:
+        sample_data = dict(info_data['samples'])
+        samples = sample_data.pop('data')
+        sample_filepath = animlib.bake.sample_filepath(filepath)
+        animlib.bake.write(sample_filepath, samples)
+        sample_data['file'] = os.path.basename(sample_filepath)
+        sample_data['count'] = len(samples)
+        data = [dict(info_data, samples=sample_data)] + list(data[1:])
+    
+    # Record the base file of a delta export relative to this file, so
+    # the library can be moved. A delta can't replace its own base.
+    info_data = data[0]
+    if 'base' in info_data:
+        if (os.path.realpath(info_data['base']) ==
+                os.path.realpath(filepath)):
+            cmds.error("Cannot write a delta export over its base: "
+                       "{0}".format(filepath))
+        base = os.path.relpath(os.path.abspath(info_data['base']),
+                               directory)
+        data = [dict(info_data, base=base)] + list(data[1:])
+    
+    # Convert the data using json and write it to the file.
+    with animlib.trace.span('file.write') as span:
+        records = [(x, y, data[x][y]) for x in range(1, 7) for y in data[x]]
+        records.append((0, None, data[0]))
+        count, size = write_records(filepath,
+                                    records,
+                                    sectioned,
+                                    codec,
+                                    level)
+        span.count(bytes=size)
+    return filepath
+    
+#======================================================================
+def check_filepath(filepath, overwrite=False):
+    """Checks the filepath is fine to write to, creating its directory
+    if needed and prompting the user if it would overwrite a file.
+    Returns the directory.
     """
     # Ensure the filepath ends with the extension.
     if not filepath.endswith(EXT):
@@ -46,22 +192,286 @@ def write(filepath, data, overwrite=False):
     
             if result != 'OK':
                 cmds.error("User chose not to overwrite existing file.")
+    return directory
+
 
-    # Pack and convert the data using json.
-    output_data = json.dumps(data)
+#======================================================================
+def write_stream(filepath,
+                 records,
+                 overwrite=False,
+                 sectioned=True,
+                 codec=None,
+                 level=None):
+    """Writes the (index, key, value) records yielded by animlib.export.
+    stream() to the filepath as they come, in the same format as write().
+    Returns the filepath.
+    
+    Records streamed against the hashes of a base export leave out the
+    curves the base stores, and are refused. Delta exports are made with
+    animlib.export.channels() and written with write().
+    """
+    check_filepath(filepath, overwrite)
+    with animlib.trace.span('file.write_stream') as span:
+        count, size = write_records(filepath,
+                                    records,
+                                    sectioned,
+                                    codec,
+                                    level)
+        span.count(records=count, bytes=size)
+    return filepath
+    
+    
+#======================================================================
+def write_records(filepath, records, sectioned=True, codec=None, level=None):
+    """Writes the (index, key, value) records to the filepath, as a
+    sectioned anim file or a json list, compressed with the codec.
+    Returns the number of records and of bytes written.
+    
+    Each record is converted using json on its own and appended to a 
+    temporary file for its section, so only one record is held in 
+    memory at a time. The sections are then copied into the anim file 
+    in order behind the info data, which is yielded last.
+    """
+    compressor(codec, level)
+    parts = [tempfile.TemporaryFile(mode='w+b') for x in range(6)]
+    index = [{} for x in range(6)]
+    key_writer = animlib.keyarray.KeyWriter()
+    count = 0
+    info_data = {}
+    try:
+        # Write each section as a json object, noting where the value of
+        # each token starts and ends within it.
+        for section, key, value in records:
+            if section == 0:
+                info_data = value
+                continue
+            if section == CURVES and sectioned and codec is None:
+                value = key_writer.add(key, value)
+            part = parts[section - 1]
+            part.write(encode((', ' if part.tell() else '{') +
+                              json_key(key) + ': '))
+            output_data = encode(json.dumps(value))
+            index[section - 1][string_key(key)] = (part.tell(),
+                                                   len(output_data))
+            part.write(output_data)
+            count += 1
+        if 'data' in info_data.get('samples', {}):
+            cmds.error("Baked samples can't be streamed, use write().")
+        if 'base_hash' in info_data and not 'base' in info_data:
+            cmds.error("Records streamed against a base export are "
+                       "incomplete, export a delta with channels() and "
+                       "use write().")
+        for part in parts:
+            if not part.tell():
+                part.write(b'{')
+            part.write(b'}')
+        
+        with open(filepath, 'wb') as export_file:
+            if sectioned:
+                write_sections(export_file,
+                               info_data,
+                               parts,
+                               index,
+                               key_writer,
+                               codec,
+                               level)
+            else:
+                packer = compressor(codec, level)
+                pack(export_file, encode('[' + json.dumps(info_data)), packer)
+                for part in parts:
+                    pack(export_file, b', ', packer)
+                    copy_section(part, export_file, packer)
+                pack(export_file, b']', packer)
+                if packer:
+                    export_file.write(packer.flush())
+            size = export_file.tell()
+    finally:
+        for part in parts:
+            part.close()
+        key_writer.close()
+    return count, size
+    
+    
+#======================================================================
+def write_sections(export_file,
+                   info_data,
+                   parts,
+                   index,
+                   key_writer,
+                   codec=None,
+                   level=None):
+    """Writes the info data, the sections in the temporary files, the
+    index of their tokens and the key arrays of the key writer to the
+    open anim file as a sectioned anim file, compressing each section
+    but the key arrays on its own with the codec."""
+    index_data = dict([(SECTIONS[x + 1], index[x]) for x in range(6)])
+    index_data['keys'] = key_writer.tokens
+    sections = ([io.BytesIO(encode(json.dumps(info_data)))] + parts +
+                [io.BytesIO(encode(json.dumps(index_data)))])
+    
+    # Leave room for the header, which is written once the length of
+    # each section is known.
+    start = export_file.tell()
+    export_file.write(b'\0' * HEADER.size)
+    header = []
+    offset = 0
+    for section in sections:
+        packer = compressor(codec, level)
+        length = copy_section(section, export_file, packer)
+        if packer:
+            flushed = packer.flush()
+            export_file.write(flushed)
+            length += len(flushed)
+        header += [offset, length]
+        offset += length
+    
+    # The key arrays start aligned, so they can be viewed in place.
+    padding = -export_file.tell() % animlib.keyarray.ALIGNMENT
+    export_file.write(b'\0' * padding)
+    header += [offset + padding, key_writer.write(export_file)]
+    export_file.seek(start)
+    export_file.write(HEADER.pack(MAGIC, VERSION, CODECS.index(codec), *header))
+    export_file.seek(0, os.SEEK_END)
+    
+    
+#======================================================================
+def copy_section(section_file, export_file, packer=None):
+    """Copies the open section file to the open anim file from its start,
+    compressing it with the packer if given, a chunk at a time. Returns
+    the number of bytes written."""
+    section_file.seek(0)
+    size = 0
+    while True:
+        chunk = section_file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += pack(export_file, chunk, packer)
+    return size
+    
+    
+#======================================================================
+def pack(export_file, chunk, packer=None):
+    """Writes the chunk of bytes to the open anim file, compressed by the
+    packer if given. Returns the number of bytes written."""
+    if packer:
+        chunk = packer.compress(chunk)
+    export_file.write(chunk)
+    return len(chunk)
+    
+    
+#======================================================================
+def compressor(codec, level=None):
+    """Returns a new compressor for the codec at the level, with
+    compress() and flush() methods, or None if the codec is None."""
+    if codec is None:
+        return None
+    if codec == 'zlib':
+        return zlib.compressobj(-1 if level is None else level)
+    if codec == 'gzip':
+        return zlib.compressobj(-1 if level is None else level,
+                                zlib.DEFLATED,
+                                16 + zlib.MAX_WBITS)
+    if codec == 'lzma':
+        check_lzma()
+        return lzma.LZMACompressor(preset=6 if level is None else level)
+    cmds.error("Unknown codec {0}, use one of: {1}".format(
+                                            codec,
+                                            ', '.join(CODECS[1:])))
+    
+    
+#======================================================================
+def decompressor(codec):
+    """Returns a new decompressor for the codec, with a decompress()
+    method, or None if the codec is None."""
+    if codec is None:
+        return None
+    if codec == 'zlib':
+        return zlib.decompressobj()
+    if codec == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if codec == 'lzma':
+        check_lzma()
+        return lzma.LZMADecompressor()
+    cmds.error("Unknown codec: {0}".format(codec))
+    
+    
+#======================================================================
+def check_lzma():
+    """Errors if the lzma module could not be imported."""
+    if lzma is None:
+        cmds.error("The lzma module is not available in this version "
+                   "of Python, use 'zlib' or 'gzip'.")
+    
+    
+#======================================================================
+def encode(text):
+    """Returns the json text as bytes to write to an anim file."""
+    return text.encode('utf-8')
+    
+    
+#======================================================================
+def json_key(key):
+    """Returns the key converted using json as a dictionary key, which
+    json always stores as a string."""
+    return json.dumps(string_key(key))
+    
+    
+#======================================================================
+def string_key(key):
+    """Returns the string that json stores the key as when it is a key
+    of a dictionary, such as 'null' for the channels of nodes without a
+    token, which are keyed under None."""
+    if not isinstance(key, STRING_TYPES):
+        key = json.dumps(key)
+    return key
+    
     
-    # Write the anim data to the file.
-    with open(filepath, 'w') as export_file:
-        export_file.write(output_data)
-        #export_file.write(pprint.pformat(data))
-	return filepath
-	
 #======================================================================
 def read(filepath):
     """Checks the filepath is fine to read from, reads the data, then
     converts it from json and returns the data for the export info, 
     the exported channels and the references, anim_curves and con-
     straints to rebuild.
+    
+    A delta export is merged over its base, which is checked to be the
+    export the delta was taken against. See animlib.delta.
+    """
+    data = read_file(filepath)
+    
+    # Follow the chain of bases of a delta export back to a full export,
+    # stopping if it loops back on itself.
+    chain = [data]
+    delta_filepath = filepath
+    visited = set([os.path.realpath(filepath)])
+    while chain[-1][0].get('base'):
+        delta_info = chain[-1][0]
+        base_filepath = os.path.join(os.path.dirname(delta_filepath),
+                                     delta_info['base'])
+        if os.path.realpath(base_filepath) in visited:
+            cmds.error("The bases of delta export {0} loop back to "
+                       "{1}".format(filepath, base_filepath))
+        visited.add(os.path.realpath(base_filepath))
+        base_data = read_file(base_filepath)
+        if ('base_hash' in delta_info and
+                animlib.delta.base_hash(base_data[0].get('hashes')) !=
+                delta_info['base_hash']):
+            cmds.error("Base {0} of delta export {1} has changed since "
+                       "the delta was exported.".format(base_filepath,
+                                                        delta_filepath))
+        chain.append(base_data)
+        delta_filepath = base_filepath
+    
+    # Merge each delta over its base, starting from the full export.
+    data = chain.pop()
+    while chain:
+        data = animlib.delta.merge(data, chain.pop())
+    return data
+
+
+#======================================================================
+def read_file(filepath):
+    """Reads the data of an anim file as read() does, without merging
+    a delta export over its base.
     """
     # Check the file exists as a .anim file.
     if not filepath.endswith(EXT):
@@ -72,12 +482,188 @@ def read(filepath):
     if not os.path.exists(filepath):
         cmds.error("Could not find anim file: {0}".format(filepath))
 
-    # Read the file into a raw_data variable.
-    with open(filepath, 'r') as anim_file:
-        raw_data = anim_file.read()
-        
-    # Convert the raw_data using json.
-    data = json.loads(raw_data)
+    # Read each section of a sectioned anim file, or convert the whole
+    # of an older file using json.
+    with open(filepath, 'rb') as anim_file:
+        header = read_header(anim_file)
+        if header:
+            data = [read_section(anim_file, header, x) for x in range(7)]
+            animlib.keyarray.restore(anim_file, header, data[3])
+        else:
+            data = read_json(anim_file)
+    
+    # Upgrade any anim curves saved in an older curve format.
+    anim_curve_data = data[3]
+    for token in anim_curve_data:
+        anim_curve_data[token] = animlib.curve.upgrade(
+                                                anim_curve_data[token])
+    
+    # Load any baked samples from the binary file stored with it.
+    sample_data = data[0].get('samples')
+    if sample_data:
+        sample_data['data'] = animlib.bake.read(
+                        os.path.join(os.path.dirname(filepath),
+                                     sample_data['file']),
+                        sample_data['type'],
+                        sample_data['count'])
     return data
 
 
+#======================================================================
+def read_info(filepath):
+    """Returns the export info of an anim file, without loading its
+    samples or merging it over its base. Only the header and info are
+    read from a sectioned anim file."""
+    if not os.path.exists(filepath):
+        cmds.error("Could not find anim file: {0}".format(filepath))
+    with open(filepath, 'rb') as anim_file:
+        header = read_header(anim_file)
+        if header:
+            return read_section(anim_file, header, 0)
+        return read_json(anim_file)[0]
+
+
+#======================================================================
+def read_tokens(filepath, section, tokens):
+    """Returns a dictionary of the data of each of the tokens found in
+    the section of an anim file, given by its index in the export data.
+    Only the values of the tokens are read from a sectioned anim file,
+    unless it is a delta, which is merged over its base first."""
+    if not os.path.exists(filepath):
+        cmds.error("Could not find anim file: {0}".format(filepath))
+    with open(filepath, 'rb') as anim_file:
+        header = read_header(anim_file)
+        if header and not 'base' in read_section(anim_file, header, 0):
+            index = read_section(anim_file, header, INDEX)[SECTIONS[section]]
+            spans = dict([(x, index[x]) for x in tokens if x in index])
+            
+            # A compressed section is decompressed only as far as the last
+            # of the tokens.
+            if header[section][2]:
+                end = max([x[0] + x[1] for x in spans.values()] or [0])
+                section_bytes = read_bytes(anim_file, header, section, 0, end)
+            section_data = {}
+            for token in spans:
+                start, length = spans[token]
+                if header[section][2]:
+                    token_bytes = section_bytes[start:start + length]
+                else:
+                    token_bytes = read_bytes(anim_file,
+                                             header,
+                                             section,
+                                             start,
+                                             start + length)
+                section_data[token] = json.loads(token_bytes.decode('utf-8'))
+            if section == CURVES:
+                animlib.keyarray.restore(anim_file, header, section_data)
+                for token in section_data:
+                    section_data[token] = animlib.curve.upgrade(
+                                                    section_data[token])
+            return section_data
+    section_data = read(filepath)[section]
+    return dict([(x, section_data[x]) for x in tokens if x in section_data])
+
+
+#======================================================================
+def read_header(anim_file):
+    """Returns the absolute offset, length and codec of each section of
+    the open anim file, or None if it is a json anim file. Sections an
+    older version doesn't have are empty. Leaves the file at its
+    start."""
+    header_data = anim_file.read(HEADER.size)
+    anim_file.seek(0)
+    if (len(header_data) < HEADER_START.size or
+            not header_data.startswith(MAGIC)):
+        return None
+    magic, version, codec = HEADER_START.unpack_from(header_data)
+    if version not in HEADERS or codec >= len(CODECS):
+        cmds.error("Anim file version {0} is newer than this version "
+                   "of animlib: {1}".format(version, anim_file.name))
+    header = HEADERS[version]
+    if len(header_data) < header.size:
+        cmds.error("Anim file is truncated: {0}".format(anim_file.name))
+    header_data = header.unpack_from(header_data)
+    codec = CODECS[codec]
+    sections = [(header.size + header_data[x], header_data[x + 1], codec)
+                for x in range(3, len(header_data), 2)]
+    
+    # The key arrays are never compressed.
+    if len(sections) > KEYS:
+        sections[KEYS] = sections[KEYS][:2] + (None,)
+    while len(sections) < len(SECTIONS):
+        sections.append((0, 0, None))
+    return sections
+
+
+#======================================================================
+def read_section(anim_file, header, section):
+    """Reads the section of the open sectioned anim file, given by its
+    index in SECTIONS, and returns it converted from json."""
+    return loads(read_bytes(anim_file, header, section))
+
+
+#======================================================================
+def read_bytes(anim_file, header, section, start=0, end=None):
+    """Returns the bytes of the section of the open sectioned anim file
+    from start to end, or to the end of the section if end is None. A
+    compressed section is decompressed a chunk at a time into a single
+    bytearray, stopping once it reaches the end, and trimmed to start
+    and end in place."""
+    offset, length, codec = header[section]
+    if end is None:
+        end = length if codec is None else -1
+    if codec is None:
+        anim_file.seek(offset + start)
+        return anim_file.read(min(end, length) - start)
+    
+    unpacker = decompressor(codec)
+    anim_file.seek(offset)
+    section_bytes = bytearray()
+    while length and (end < 0 or len(section_bytes) < end):
+        chunk = anim_file.read(min(CHUNK_SIZE, length))
+        length -= len(chunk)
+        section_bytes.extend(unpacker.decompress(chunk))
+    if end >= 0:
+        del section_bytes[end:]
+    if start:
+        del section_bytes[:start]
+    return section_bytes
+
+
+#======================================================================
+def read_json(anim_file):
+    """Reads the open json anim file, decompressing it a chunk at a time
+    into a single bytearray if its first bytes are those of a codec, and
+    returns it converted from json."""
+    first_bytes = anim_file.read(8)
+    anim_file.seek(0)
+    codec = None
+    for name, magic in CODEC_MAGIC:
+        if first_bytes.startswith(magic):
+            codec = name
+    zlib_header = bytearray(first_bytes[:2])
+    if (len(zlib_header) == 2 and zlib_header[0] == 0x78 and
+            (zlib_header[0] * 256 + zlib_header[1]) % 31 == 0):
+        codec = 'zlib'
+    if codec is None:
+        return loads(anim_file.read())
+    
+    unpacker = decompressor(codec)
+    file_bytes = bytearray()
+    while True:
+        chunk = anim_file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        file_bytes.extend(unpacker.decompress(chunk))
+    return loads(file_bytes)
+
+
+#======================================================================
+def loads(json_bytes):
+    """Returns the utf-8 json bytes converted from json. The bytes are
+    emptied once decoded when they are a bytearray, so the decoded text
+    and the bytes are not both held while the text is converted."""
+    text = json_bytes.decode('utf-8')
+    if isinstance(json_bytes, bytearray):
+        del json_bytes[:]
+    return json.loads(text)
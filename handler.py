@@ -0,0 +1,207 @@
+"""Registers the node types the exporter can export, with the functions
+that export, rebuild and list the channels of each.
+
+Each handler owns a token prefix and the section of the export data its
+nodes are stored in. The exporter and animlib.apply.build() find the
+handler of a node by a single lookup of its type, or of a token by its
+prefix, so a new kind of node is supported by registering a handler for
+it rather than by adding a branch to each of them:
+
+    animlib.handler.register(animlib.handler.Handler(
+                                    prefix='@XYZ',
+                                    name='xyz_nodes',
+                                    section=animlib.handler.CONSTRAINTS,
+                                    node_types=xyz.EXPORTABLE_TYPES,
+                                    export=xyz.export,
+                                    build=xyz.build,
+                                    list_channels=xyz.list_channels))
+
+Anim curves have a handler for their prefix, type and channels, but are
+exported and rebuilt by their own pipeline, which shares, reduces and
+retimes them.
+"""
+import animlib.curve
+import animlib.constraint
+import animlib.pairblend
+import animlib.utility
+
+# The token prefix of referenced nodes, which are exported by reference
+# rather than by node type.
+REFERENCE = '@REF'
+
+# The token prefix of anim curves.
+CURVE = '@CRV'
+
+# The sections of the export data that nodes can be stored in.
+CURVES = 3
+CONSTRAINTS = 4
+PAIRBLENDS = 5
+
+_handlers = []
+_by_type = {}
+_by_prefix = {}
+
+#======================================================================
+class Handler(object):
+    """Exports and rebuilds one kind of node.
+
+    prefix: the start of the tokens of the nodes, such as '@CON'
+    name: the name of the kind of node, used for its trace spans
+    section: the index of the section of the export data it uses
+    node_types: the node types it exports
+    export: returns the data of a node, given the node, its token and
+            the channel data
+    build: rebuilds a node from its data and the token remap, returning
+           the new node
+    list_channels: returns the channels of a node to export
+    filters: the reference filter modes of animlib.apply.build() that
+             build the node when a reference it drives is applied
+    tidy: tidies a rebuilt node once the channel data is applied
+    label: the name of the kind of node in the build report
+    """
+
+    def __init__(self,
+                 prefix,
+                 name,
+                 section,
+                 node_types,
+                 export,
+                 build,
+                 list_channels,
+                 filters=('connections', 'constraints'),
+                 tidy=None,
+                 label=None):
+        self.prefix = prefix
+        self.name = name
+        self.section = section
+        self.node_types = tuple(sorted(node_types))
+        self.export = export
+        self.build = build
+        self.list_channels = list_channels
+        self.filters = tuple(filters)
+        self.tidy = tidy
+        self.label = label or name
+
+    def token(self, index):
+        """Returns the token of the node exported at the index."""
+        return "{0}{1}!".format(self.prefix, index)
+
+
+#======================================================================
+def register(handler):
+    """Adds the handler to the registry, replacing any handler with the
+    same prefix, and returns it."""
+    if handler.prefix in _by_prefix:
+        unregister(handler.prefix)
+    _handlers.append(handler)
+    _by_prefix[handler.prefix] = handler
+    for node_type in handler.node_types:
+        _by_type[node_type] = handler
+    return handler
+
+
+#======================================================================
+def unregister(prefix):
+    """Removes the handler of the prefix from the registry."""
+    handler = _by_prefix.pop(prefix)
+    _handlers.remove(handler)
+    for node_type in handler.node_types:
+        if _by_type.get(node_type) is handler:
+            del _by_type[node_type]
+
+
+#======================================================================
+def handlers():
+    """Returns the registered handlers, in the order they were
+    registered."""
+    return list(_handlers)
+
+
+#======================================================================
+def for_type(node_type):
+    """Returns the handler of the node type, or None if it is not
+    exportable."""
+    return _by_type.get(node_type)
+
+
+#======================================================================
+def for_token(token):
+    """Returns the handler of the token or tokenised name, or None if it
+    has none, as with references."""
+    if not token or not token.startswith('@'):
+        return None
+    return _by_prefix.get(token.split('!')[0].rstrip('0123456789'))
+
+
+#======================================================================
+def node_lists():
+    """Returns an empty dictionary of nodes to export for the reference
+    prefix and the prefix of each handler."""
+    node_list = dict([(x.prefix, {}) for x in _handlers])
+    node_list[REFERENCE] = {}
+    return node_list
+
+
+#======================================================================
+def export_pairblend(pairblend_node, token, channel_data):
+    """Exports the pairBlend with the channel its weight is driven by,
+    or returns None if its weight was not exported."""
+    try:
+        pairblend_object = channel_data[token][token+'.weight']
+    except KeyError:
+        return None
+    return animlib.pairblend.export(pairblend_node, pairblend_object)
+
+
+#======================================================================
+def export_node(export):
+    """Returns an export function for the handler of a kind of node that
+    needs only the node to export it."""
+    def export_wrapper(node, token, channel_data):
+        return export(node)
+    return export_wrapper
+
+
+#======================================================================
+def build_node(build):
+    """Returns a build function for the handler of a kind of node that
+    needs only its data to rebuild it."""
+    def build_wrapper(data, remap):
+        return build(data)
+    return build_wrapper
+
+
+register(Handler(prefix=CURVE,
+                 name='curves',
+                 section=CURVES,
+                 node_types=animlib.curve.EXPORTABLE_TYPES,
+                 export=export_node(animlib.curve.export),
+                 build=build_node(animlib.curve.build),
+                 list_channels=animlib.curve.list_channels,
+                 filters=('connections', 'curves'),
+                 label='Curves'))
+register(Handler(prefix='@PRB',
+                 name='pairblends',
+                 section=PAIRBLENDS,
+                 node_types=animlib.pairblend.EXPORTABLE_TYPES,
+                 export=export_pairblend,
+                 build=animlib.pairblend.build,
+                 list_channels=animlib.pairblend.list_channels,
+                 label='Pair Blends'))
+register(Handler(prefix='@CON',
+                 name='constraints',
+                 section=CONSTRAINTS,
+                 node_types=animlib.constraint.EXPORTABLE_TYPES,
+                 export=export_node(animlib.constraint.export),
+                 build=build_node(animlib.constraint.build),
+                 list_channels=animlib.constraint.list_channels,
+                 tidy=animlib.constraint.tidy_constraint_node,
+                 label='Constraints'))
+register(Handler(prefix='@UTL',
+                 name='utilities',
+                 section=CONSTRAINTS,
+                 node_types=animlib.utility.EXPORTABLE_TYPES,
+                 export=export_node(animlib.utility.export),
+                 build=animlib.utility.build,
+                 list_channels=animlib.utility.list_channels,
+                 label='Utility Nodes'))
@@ -2,7 +2,16 @@
 data about the export."""
 
 import time
-import maya.cmds as cmds
+from animlib.scene import cmds
+
+# Frames per second of Maya's named time units.
+TIME_UNITS = {'game': 15.0,
+              'film': 24.0,
+              'pal': 25.0,
+              'ntsc': 30.0,
+              'show': 48.0,
+              'palf': 50.0,
+              'ntscf': 60.0,}
 
 #======================================================================
 def export(channels, reference_data):
@@ -10,12 +19,14 @@ def export(channels, reference_data):
     """
     info_data = {}
     
-    # Record the export time.
+    # Record the export time, readably and in seconds since the epoch.
     info_data['time'] = time.strftime("%c")
+    info_data['timestamp'] = time.time()
     
     # Record the user and filepath.
     
     # Record the first and last frame, and the frame rate.
+    info_data['fps'] = frame_rate()
     
     # Record the namespaces and references in the channel list.
     reference_info = {}
@@ -26,4 +37,12 @@ def export(channels, reference_data):
             reference_info[namespace]={'filename':filename,
                                        'token':token}
     info_data['references']=reference_info
-    return info_data
\ No newline at end of file
+    return info_data
+
+#======================================================================
+def frame_rate():
+    """Returns the scene's frame rate in frames per second."""
+    unit = cmds.currentUnit(query=True, time=True)
+    if unit in TIME_UNITS:
+        return TIME_UNITS[unit]
+    return float(unit.replace('fps', ''))
@@ -0,0 +1,347 @@
+"""Stores the keys of exported anim curves as binary arrays in the anim
+file, which can be viewed in place without converting them from json.
+
+The keys section of a sectioned anim file starts aligned to 8 bytes,
+and holds a little-endian directory followed by a block per curve:
+
+    count                      uint64, the number of curves
+    entries                    per curve: the offset of its block from
+                               the start of the section, its key count
+                               and its first and last key times, as
+                               uint64, uint64, float64, float64
+    blocks                     per curve: the time, value, in_angle,
+                               in_weight, out_angle and out_weight of
+                               each key as float64 arrays, then the
+                               in_type, out_type and locked arrays as
+                               uint8, padded to 8 bytes
+
+The curve data in the curves section has its keys replaced by the
+index of its entry, and animlib.file.read() puts them back. Offline
+tools can instead open the file with KeyArrays, which maps it into
+memory and returns each array as a view of the mapped file, so only the
+pages that are read are loaded:
+
+    with animlib.keyarray.KeyArrays(filepath) as key_arrays:
+        times = key_arrays.arrays('@CRV0!')['time']
+        print(key_arrays.frame_range(), key_arrays.key_count())
+
+The arrays are numpy arrays if numpy can be imported, else memoryviews
+cast to their type, or copied into arrays on Python 2. frame_range()
+and key_count() read only the directory. To scan a library from a
+shell:
+
+    python -m animlib.keyarray /library --recursive
+
+Curves are only stored as arrays in uncompressed files, and only if
+they are keyed in time (animCurveT*) and all of their tangent types are
+enums in TANGENT_TYPES. Curves driven by other attributes are left in
+the curves section, so the directory's key times are all frames.
+"""
+import argparse
+import array
+import mmap
+import os
+import os.path
+import struct
+import sys
+import tempfile
+import animlib.file
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The key fields stored as float64 and as uint8 arrays, in the order
+# they are stored in each block.
+FLOAT_FIELDS = ('time',
+                'value',
+                'in_angle',
+                'in_weight',
+                'out_angle',
+                'out_weight',)
+BYTE_FIELDS = ('in_type',
+               'out_type',
+               'locked',)
+
+# The byte alignment of the keys section and of each block.
+ALIGNMENT = 8
+
+COUNT = struct.Struct('<Q')
+ENTRY = struct.Struct('<QQdd')
+
+#======================================================================
+class KeyWriter(object):
+    """Gathers the keys of the curves written to an anim file into a
+    temporary file of blocks, and writes them as the keys section."""
+
+    def __init__(self):
+        self.part = tempfile.TemporaryFile(mode='w+b')
+        self.entries = []
+        self.tokens = {}
+
+    def add(self, token, curve_data):
+        """Writes the keys of the curve data to a block and returns the
+        curve data with its keys replaced by the index of its entry, or
+        returns the curve data unchanged if its keys can't be stored
+        as arrays."""
+        if not is_packable(curve_data):
+            return curve_data
+        keys = curve_data['keys']
+        count = len(keys['time'])
+        self.tokens[token] = len(self.entries)
+        self.entries.append((self.part.tell(),
+                             count,
+                             keys['time'][0],
+                             keys['time'][-1],))
+        for field in FLOAT_FIELDS:
+            write_array(self.part, 'd', keys[field])
+        for field in BYTE_FIELDS:
+            write_array(self.part, 'B', [int(x) for x in keys[field]])
+        self.part.write(b'\0' * (-self.part.tell() % ALIGNMENT))
+        curve_data = dict(curve_data)
+        del curve_data['keys']
+        curve_data['key_array'] = self.tokens[token]
+        return curve_data
+
+    def write(self, export_file):
+        """Writes the keys section to the open anim file and returns its
+        length, or 0 if no curves were added."""
+        if not self.entries:
+            return 0
+        start = export_file.tell()
+        size = COUNT.size + ENTRY.size * len(self.entries)
+        size += -size % ALIGNMENT
+        export_file.write(COUNT.pack(len(self.entries)))
+        for offset, count, first, last in self.entries:
+            export_file.write(ENTRY.pack(offset + size, count, first, last))
+        export_file.write(b'\0' * (start + size - export_file.tell()))
+        animlib.file.copy_section(self.part, export_file)
+        return export_file.tell() - start
+
+    def close(self):
+        """Removes the temporary file of blocks."""
+        self.part.close()
+
+
+#======================================================================
+class KeyArrays(object):
+    """Maps the keys section of an anim file into memory and returns
+    views of the key arrays of its curves, without reading the rest of
+    the file."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.anim_file = open(filepath, 'rb')
+        self.memory = None
+        self.header = animlib.file.read_header(self.anim_file)
+        self.offset, self.length = 0, 0
+        if self.header:
+            self.offset, self.length = self.header[animlib.file.KEYS][:2]
+        self.count = 0
+        self._tokens = None
+        if self.length:
+            self.memory = mmap.mmap(self.anim_file.fileno(),
+                                    0,
+                                    access=mmap.ACCESS_READ)
+            self.count = COUNT.unpack_from(self.memory, self.offset)[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+        return False
+
+    def close(self):
+        """Unmaps and closes the anim file. Any views of its arrays must
+        be released first."""
+        if self.memory is not None:
+            self.memory.close()
+            self.memory = None
+        self.anim_file.close()
+
+    def entry(self, index):
+        """Returns the offset of the block of the curve at the index from
+        the start of the file, with its key count and first and last key
+        times."""
+        offset, count, first, last = ENTRY.unpack_from(
+                        self.memory,
+                        self.offset + COUNT.size + ENTRY.size * index)
+        return (self.offset + offset, count, first, last)
+
+    def tokens(self):
+        """Returns a dictionary of the index of the entry of each curve
+        token, read from the index section of the file."""
+        if self._tokens is None:
+            self._tokens = {}
+            if self.length:
+                self._tokens = animlib.file.read_section(
+                                    self.anim_file,
+                                    self.header,
+                                    animlib.file.INDEX).get('keys', {})
+        return self._tokens
+
+    def arrays(self, token):
+        """Returns a dictionary of a view of each key array of the curve
+        token, or None if its keys are not stored as arrays."""
+        index = self.tokens().get(token)
+        if index is None:
+            return None
+        offset, count, first, last = self.entry(index)
+        return read_arrays(self.memory, offset, count)
+
+    def frame_range(self):
+        """Returns the first and last key times of all the curves, or
+        None if there are none. Only curves keyed in time are stored, so
+        these are frames."""
+        entries = [self.entry(x) for x in range(self.count)]
+        if not entries:
+            return None
+        return (min([x[2] for x in entries]), max([x[3] for x in entries]))
+
+    def key_count(self):
+        """Returns the number of keys of all the curves."""
+        return sum([self.entry(x)[1] for x in range(self.count)])
+
+
+#======================================================================
+def is_packable(curve_data):
+    """Returns True if the keys of the curve data can be stored as
+    arrays. Only curves keyed in time are."""
+    if not is_timed(curve_data):
+        return False
+    keys = curve_data.get('keys')
+    if not keys or not keys['time']:
+        return False
+    for field in ('in_type', 'out_type',):
+        for tangent_type in keys[field]:
+            if not isinstance(tangent_type, int) or not 0 <= tangent_type < 256:
+                return False
+    return True
+
+
+#======================================================================
+def is_timed(curve_data):
+    """Returns True if the curve data is of a curve keyed in time,
+    rather than driven by another attribute."""
+    return curve_data.get('type', '').startswith('animCurveT')
+
+
+#======================================================================
+def write_array(part, typecode, values):
+    """Writes the values to the open file as a little-endian array of the
+    typecode."""
+    values = array.array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    values.tofile(part)
+
+
+#======================================================================
+def read_arrays(buffer, offset, count):
+    """Returns a dictionary of a view of each key array of the block of
+    count keys at the offset in the buffer."""
+    arrays = {}
+    for i, field in enumerate(FLOAT_FIELDS):
+        arrays[field] = view(buffer, offset + 8 * count * i, 'd', count)
+    offset += 8 * count * len(FLOAT_FIELDS)
+    for i, field in enumerate(BYTE_FIELDS):
+        arrays[field] = view(buffer, offset + count * i, 'B', count)
+    return arrays
+
+
+#======================================================================
+def view(buffer, offset, typecode, count):
+    """Returns count little-endian values of the typecode at the offset in
+    the buffer, as a numpy array or memoryview of it where possible, or
+    else as a copy in an array."""
+    size = struct.calcsize(typecode) * count
+    if numpy is not None:
+        return numpy.frombuffer(buffer,
+                                dtype=numpy.dtype(typecode).newbyteorder('<'),
+                                count=count,
+                                offset=offset)
+    if hasattr(memoryview, 'cast') and sys.byteorder == 'little':
+        return memoryview(buffer)[offset:offset + size].cast(typecode)
+    values = array.array(typecode)
+    if hasattr(values, 'frombytes'):
+        values.frombytes(buffer[offset:offset + size])
+    else:
+        values.fromstring(buffer[offset:offset + size])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+#======================================================================
+def restore(anim_file, header, curve_data):
+    """Puts back the keys of each curve in the curve data that were
+    stored as arrays in the open anim file, as lists."""
+    offset = header[animlib.file.KEYS][0]
+    for token in curve_data:
+        data = curve_data[token]
+        if 'key_array' not in data:
+            continue
+        anim_file.seek(offset + COUNT.size + ENTRY.size * data['key_array'])
+        block, count, first, last = ENTRY.unpack(anim_file.read(ENTRY.size))
+        anim_file.seek(offset + block)
+        buffer = anim_file.read((8 * len(FLOAT_FIELDS) +
+                                 len(BYTE_FIELDS)) * count)
+        arrays = read_arrays(buffer, 0, count)
+        keys = dict([(x, arrays[x].tolist()) for x in arrays])
+        keys['locked'] = [bool(x) for x in keys['locked']]
+        data = dict(data)
+        del data['key_array']
+        data['keys'] = keys
+        curve_data[token] = data
+
+
+#======================================================================
+def scan(paths, recursive=False):
+    """Returns a list of the filepath, curve count, key count and frame
+    range of each anim file in the paths, which may be files or
+    directories. Only the directory of the keys section of each file is
+    read. Files without key arrays have no curves or frame range."""
+    results = []
+    for path in paths:
+        if os.path.isdir(path):
+            filepaths = []
+            for root, dirs, files in os.walk(path):
+                filepaths += [os.path.join(root, x) for x in sorted(files)
+                              if x.endswith(animlib.file.EXT)]
+                if not recursive:
+                    break
+        else:
+            filepaths = [path]
+        for filepath in filepaths:
+            with KeyArrays(filepath) as key_arrays:
+                results.append((filepath,
+                                key_arrays.count,
+                                key_arrays.key_count(),
+                                key_arrays.frame_range(),))
+    return results
+
+
+#======================================================================
+def main(argv=None):
+    """Prints the curve and key counts and frame range of each anim file
+    in the paths given on the command line."""
+    parser = argparse.ArgumentParser(
+                    description="Prints the curve and key counts and "
+                                "frame range of each anim file.")
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--recursive', action='store_true')
+    args = parser.parse_args(argv)
+    print('{0:<60} {1:>7} {2:>9} {3:>10} {4:>10}'.format(
+                                'File', 'Curves', 'Keys', 'First', 'Last'))
+    for filepath, curves, keys, frame_range in scan(args.paths,
+                                                    args.recursive):
+        first, last = frame_range or ('-', '-')
+        print('{0:<60} {1:>7} {2:>9} {3:>10} {4:>10}'.format(
+                                filepath, curves, keys, first, last))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
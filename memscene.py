@@ -0,0 +1,1034 @@
+"""A pure-Python, in-memory stand-in for the parts of maya.cmds that
+animlib uses, so the export and apply engine can run outside Maya.
+
+The Scene class mirrors the maya.cmds call signatures (including the
+camelCase flag names) so it can be installed with animlib.scene.
+set_backend() and driven by the unmodified engine modules. It models
+nodes, attributes, connections, anim curves with keys and tangents,
+file references and namespaces. It does not attempt to be a full DG:
+only anim curves are evaluated, everything else passes values through.
+"""
+import copy
+import fnmatch
+import math
+import re
+import animlib.constraint
+import animlib.evaluate
+
+try:
+    STRING_TYPES = basestring
+except NameError:
+    STRING_TYPES = str
+
+# Attributes created with each node type, as (name, type, default,
+# keyable). Anything not listed here can still be added with addAttr.
+TRANSFORM_ATTRS = (('translateX', 'doubleLinear', 0.0, True),
+                   ('translateY', 'doubleLinear', 0.0, True),
+                   ('translateZ', 'doubleLinear', 0.0, True),
+                   ('rotateX', 'doubleAngle', 0.0, True),
+                   ('rotateY', 'doubleAngle', 0.0, True),
+                   ('rotateZ', 'doubleAngle', 0.0, True),
+                   ('scaleX', 'double', 1.0, True),
+                   ('scaleY', 'double', 1.0, True),
+                   ('scaleZ', 'double', 1.0, True),
+                   ('visibility', 'bool', True, True),
+                   ('rotateOrder', 'enum', 0, False),)
+
+CURVE_ATTRS = (('preInfinity', 'enum', 0, False),
+               ('postInfinity', 'enum', 0, False),
+               ('useCurveColor', 'bool', False, False),
+               ('curveColorR', 'float', 0.0, False),
+               ('curveColorG', 'float', 0.0, False),
+               ('curveColorB', 'float', 0.0, False),
+               ('weightedTangents', 'bool', False, False),
+               ('input', 'double', 0.0, False),
+               ('output', 'double', 0.0, False),)
+
+PAIRBLEND_ATTRS = tuple(
+    [(x, 'doubleLinear', 0.0, False)
+     for x in ('inTranslateX1', 'inTranslateY1', 'inTranslateZ1',
+               'inTranslateX2', 'inTranslateY2', 'inTranslateZ2',
+               'outTranslateX', 'outTranslateY', 'outTranslateZ',)] +
+    [(x, 'doubleAngle', 0.0, False)
+     for x in ('inRotateX1', 'inRotateY1', 'inRotateZ1',
+               'inRotateX2', 'inRotateY2', 'inRotateZ2',
+               'outRotateX', 'outRotateY', 'outRotateZ',)] +
+    [(x, 'enum', 0, False)
+     for x in ('currentDriver', 'rotateOrder', 'translateXMode',
+               'translateYMode', 'translateZMode', 'rotateMode',
+               'rotInterpolation',)] +
+    [('weight', 'double', 1.0, True)])
+
+CONSTRAINT_TYPES = ('pointConstraint',
+                    'aimConstraint',
+                    'orientConstraint',
+                    'scaleConstraint',
+                    'parentConstraint',)
+
+# Compound attributes and their children, so that queries on a parent
+# attribute such as 'translate' resolve to a tuple of child values.
+COMPOUNDS = {'translate': ('translateX', 'translateY', 'translateZ'),
+             'rotate': ('rotateX', 'rotateY', 'rotateZ'),
+             'scale': ('scaleX', 'scaleY', 'scaleZ'),
+             'curveColor': ('curveColorR', 'curveColorG', 'curveColorB'),
+             'inTranslate1': ('inTranslateX1', 'inTranslateY1',
+                              'inTranslateZ1'),
+             'inTranslate2': ('inTranslateX2', 'inTranslateY2',
+                              'inTranslateZ2'),
+             'inRotate1': ('inRotateX1', 'inRotateY1', 'inRotateZ1'),
+             'inRotate2': ('inRotateX2', 'inRotateY2', 'inRotateZ2'),}
+
+SHORT_NAMES = {'tx': 'translateX', 'ty': 'translateY', 'tz': 'translateZ',
+               'rx': 'rotateX', 'ry': 'rotateY', 'rz': 'rotateZ',
+               'sx': 'scaleX', 'sy': 'scaleY', 'sz': 'scaleZ',
+               'v': 'visibility', 't': 'translate', 'r': 'rotate',
+               's': 'scale', 'wgt': 'weightedTangents',
+               'pre': 'preInfinity', 'pst': 'postInfinity',
+               'i': 'input', 'o': 'output',
+               'ktv': 'keyTimeValue', 'kv': 'keyValue',}
+
+# Tangent types whose angles are derived from the neighbouring keys.
+COMPUTED_TANGENTS = ('spline', 'linear', 'flat', 'step', 'stepnext',
+                     'clamped', 'plateau', 'auto', 'fast', 'slow',)
+
+FPS = 24.0
+
+# Keyframe flags shadow the float builtin inside the Scene methods.
+_to_float = float
+
+
+#======================================================================
+class Scene(object):
+    """An in-memory scene exposing a maya.cmds compatible interface."""
+
+    def __init__(self):
+        self.clear()
+
+    #==================================================================
+    def clear(self):
+        """Empties the scene, as if a new file had been opened."""
+        self.nodes = {}
+        self.connections = {}
+        self.references = {}
+        self.files = {}
+        self.scene_name = ''
+        self.time = 1.0
+        self.selection = []
+
+    #==================================================================
+    def register_file(self, filepath, builder):
+        """Registers a callable builder(scene, namespace) that creates
+        the contents of filepath when it is referenced or opened."""
+        self.files[filepath] = builder
+
+    #==================================================================
+    # Internal helpers.
+    #==================================================================
+    def _clean(self, name):
+        # Strip DAG paths and the root namespace prefix from a name.
+        return name.split('|')[-1].lstrip(':')
+
+    def _node(self, name):
+        node = self.nodes.get(self._clean(name))
+        if node is None:
+            raise RuntimeError("No object matches name: {0}".format(name))
+        return node
+
+    def _split(self, plug):
+        if '.' not in plug:
+            raise RuntimeError("Invalid attribute: {0}".format(plug))
+        node, attr = plug.split('.', 1)
+        return self._clean(node), self._long_name(attr)
+
+    def _long_name(self, attr):
+        parts = []
+        for part in attr.split('.'):
+            name, bracket, index = part.partition('[')
+            parts.append(SHORT_NAMES.get(name, name) + bracket + index)
+        return '.'.join(parts)
+
+    def _plug(self, plug):
+        node, attr = self._split(plug)
+        return '{0}.{1}'.format(node, attr)
+
+    def _element(self, node, attr):
+        # Constraint target elements are created on first use, as Maya
+        # does for the elements of any multi attribute.
+        match = re.match(r'^target\[(\d+)\]\.\w+$', attr)
+        data = self.nodes[node]
+        if (match and attr not in data['attrs'] and
+                                    data['type'] in CONSTRAINT_TYPES):
+            templates = animlib.constraint.TARGET_ATTRS[data['type']]
+            index = int(match.group(1))
+            if attr in [x.format(index) for x in templates]:
+                self.add_constraint_target(node, index)
+        # As are the input and weight elements of blendWeighted nodes.
+        match = re.match(r'^(input|weight)\[(\d+)\]$', attr)
+        if (match and attr not in data['attrs'] and
+                                    data['type'] == 'blendWeighted'):
+            self._add_attr(node, attr, 'double',
+                           1.0 if match.group(1) == 'weight' else 0.0)
+
+    def _has_attr(self, node, attr):
+        data = self.nodes[node]
+        self._element(node, attr)
+        if attr in data['attrs'] or attr in COMPOUNDS:
+            return attr in data['attrs'] or all(
+                [x in data['attrs'] for x in COMPOUNDS[attr]])
+        # Multi parents, such as 'target', exist if any element does.
+        prefix = attr + '['
+        return any([x.startswith(prefix) for x in data['attrs']])
+
+    def _is_curve(self, node):
+        return (node in self.nodes and
+                self.nodes[node]['type'].startswith('animCurve'))
+
+    def _unique(self, name):
+        if name not in self.nodes:
+            return name
+        base = name.rstrip('0123456789')
+        i = 1
+        while '{0}{1}'.format(base, i) in self.nodes:
+            i += 1
+        return '{0}{1}'.format(base, i)
+
+    def _add_attr(self, node, name, attr_type, value, keyable=False,
+                  channel_box=False):
+        data = self.nodes[node]
+        data['attrs'][name] = value
+        data['types'][name] = attr_type
+        if keyable:
+            data['keyable'].add(name)
+        if channel_box:
+            data['channel_box'].add(name)
+
+    def _namespace(self, name):
+        name = name.split('|')[-1]
+        if ':' not in name:
+            return ''
+        return ':' + name.rsplit(':', 1)[0]
+
+    #==================================================================
+    # Node commands.
+    #==================================================================
+    def createNode(self, node_type, name=None, skipSelect=False,
+                   parent=None, **kwargs):
+        name = self._unique(name or node_type + '1')
+        self.nodes[name] = {'type': node_type,
+                            'attrs': {},
+                            'types': {},
+                            'keyable': set(),
+                            'channel_box': set(),
+                            'changed': set(),
+                            'keys': [],
+                            'reference': None,
+                            'parent': parent,
+                            'locked': False,}
+        if node_type in ('transform', 'joint') or (
+                                        node_type in CONSTRAINT_TYPES):
+            for attr, attr_type, value, keyable in TRANSFORM_ATTRS:
+                self._add_attr(name, attr, attr_type, value, keyable)
+        if node_type.startswith('animCurve'):
+            for attr, attr_type, value, keyable in CURVE_ATTRS:
+                self._add_attr(name, attr, attr_type, value, keyable)
+        if node_type == 'pairBlend':
+            for attr, attr_type, value, keyable in PAIRBLEND_ATTRS:
+                self._add_attr(name, attr, attr_type, value, keyable)
+        if node_type in CONSTRAINT_TYPES:
+            for attr in animlib.constraint.SINGLE_ATTRS[node_type]:
+                if attr.endswith('Matrix'):
+                    self._add_attr(name, attr, 'matrix',
+                                   [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0,
+                                    0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0,
+                                    0.0, 1.0])
+                else:
+                    self._add_attr(name, attr, 'double', 0.0)
+            for attr in ('constraintTranslateX', 'constraintTranslateY',
+                         'constraintTranslateZ', 'constraintRotateX',
+                         'constraintRotateY', 'constraintRotateZ',):
+                self._add_attr(name, attr, 'double', 0.0)
+        if node_type in ('unitConversion',):
+            self._add_attr(name, 'input', 'double', 0.0)
+            self._add_attr(name, 'output', 'double', 0.0)
+            self._add_attr(name, 'conversionFactor', 'double', 1.0)
+        if node_type in ('blendWeighted',):
+            self._add_attr(name, 'output', 'double', 0.0)
+            self._add_attr(name, 'current', 'long', 0)
+        if node_type.startswith('animBlendNode'):
+            for attr in ('inputA', 'inputB', 'weightA', 'weightB',
+                         'output',):
+                self._add_attr(name, attr, 'double', 0.0)
+        return name
+
+    def add_constraint_target(self, constraint, index, weight=1.0):
+        """Adds the element attributes of a constraint target."""
+        node_type = self.nodes[constraint]['type']
+        for attr in animlib.constraint.TARGET_ATTRS[node_type]:
+            attr = attr.format(index)
+            if attr.split('.')[-1] in COMPOUNDS.get(attr, ()):
+                continue
+            if attr.endswith('Matrix'):
+                self._add_attr(constraint, attr, 'matrix', [0.0]*16)
+            elif attr.endswith('Weight'):
+                self._add_attr(constraint, attr, 'double', weight)
+            else:
+                self._add_attr(constraint, attr, 'double', 0.0)
+
+    def objExists(self, name):
+        if '.' in name:
+            try:
+                node, attr = self._split(name)
+            except RuntimeError:
+                return False
+            return node in self.nodes and self._has_attr(node, attr)
+        return self._clean(name) in self.nodes
+
+    def nodeType(self, name):
+        if '.' in name:
+            name = name.split('.')[0]
+        return self._node(name)['type']
+
+    def delete(self, *names, **kwargs):
+        for name in names:
+            if isinstance(name, (list, tuple)):
+                self.delete(*name)
+                continue
+            node = self._clean(name)
+            self._node(node)
+            del self.nodes[node]
+            for dest, src in list(self.connections.items()):
+                if (dest.split('.')[0] == node or
+                                            src.split('.')[0] == node):
+                    del self.connections[dest]
+
+    def rename(self, old, new, **kwargs):
+        new = self._unique(new)
+        self.nodes[new] = self.nodes.pop(old)
+        renamed = {}
+        for dest, src in self.connections.items():
+            if dest.split('.')[0] == old:
+                dest = new + dest[len(old):]
+            if src.split('.')[0] == old:
+                src = new + src[len(old):]
+            renamed[dest] = src
+        self.connections = renamed
+        for ref in self.references.values():
+            if ref['node'] == old:
+                ref['node'] = new
+        return new
+
+    def duplicate(self, original, name=None, **kwargs):
+        new = self._unique(name or original)
+        data = copy.deepcopy(self._node(original))
+        data['reference'] = None
+        self.nodes[new] = data
+        return [new]
+
+    def lockNode(self, name, lock=True, **kwargs):
+        self._node(name)['locked'] = lock
+
+    def parent(self, child, parent=None, world=False, **kwargs):
+        self._node(child)['parent'] = None if world else parent
+        return [child]
+
+    def listRelatives(self, name, parent=False, children=False,
+                      **kwargs):
+        name = self._clean(name)
+        if parent:
+            node_parent = self._node(name)['parent']
+            return [node_parent] if node_parent else None
+        found = [x for x in sorted(self.nodes)
+                 if self.nodes[x]['parent'] == name]
+        return found or None
+
+    def ls(self, *patterns, **kwargs):
+        if kwargs.get('selection') or kwargs.get('sl'):
+            return list(self.selection)
+        names = []
+        if not patterns:
+            patterns = ('*',)
+        for pattern in patterns:
+            if isinstance(pattern, (list, tuple)):
+                names += [x for x in pattern if x in self.nodes]
+                continue
+            for name in sorted(self.nodes):
+                if fnmatch.fnmatchcase(name, pattern):
+                    names.append(name)
+                elif kwargs.get('recursive') and ':' in pattern:
+                    # Recursive matching ignores nested namespaces.
+                    top, rest = pattern.split(':', 1)
+                    if (name.startswith(top.lstrip('*') + ':') and
+                                    fnmatch.fnmatchcase(
+                                        name.rsplit(':', 1)[-1], rest)):
+                        names.append(name)
+        types = kwargs.get('type')
+        if types:
+            if not isinstance(types, (list, tuple)):
+                types = (types,)
+            names = [x for x in names if self.nodes[x]['type'] in types]
+        if kwargs.get('dagObjects'):
+            names = [x for x in names
+                     if self.nodes[x]['type'] in ('transform', 'joint')]
+        if kwargs.get('long'):
+            names = [self._long_path(x) for x in names]
+        if kwargs.get('showType'):
+            result = []
+            for name in names:
+                result += [name, self.nodes[name.split('|')[-1]]['type']]
+            return result
+        return names
+
+    def _long_path(self, name):
+        path = [name]
+        parent = self.nodes[name]['parent']
+        while parent:
+            path.insert(0, parent)
+            parent = self.nodes[parent]['parent']
+        return '|' + '|'.join(path)
+
+    def select(self, *names, **kwargs):
+        self.selection = [x for x in names
+                          if isinstance(x, STRING_TYPES)]
+
+    def listHistory(self, name, **kwargs):
+        history = []
+        todo = [name]
+        while todo:
+            node = todo.pop()
+            if node in history:
+                continue
+            history.append(node)
+            for dest, src in self.connections.items():
+                if dest.split('.')[0] == node:
+                    todo.append(src.split('.')[0])
+        return history
+
+    #==================================================================
+    # Attribute commands.
+    #==================================================================
+    def addAttr(self, name, longName=None, attributeType='double',
+                keyable=False, defaultValue=0.0, **kwargs):
+        if '.' in name:
+            name = name.split('.')[0]
+        name = self._clean(name)
+        self._node(name)
+        self._add_attr(name, longName, attributeType,
+                       defaultValue, keyable)
+
+    def renameAttr(self, plug, new_name):
+        node, attr = self._split(plug)
+        data = self.nodes[node]
+        for table in (data['attrs'], data['types']):
+            table[new_name] = table.pop(attr)
+        for table in (data['keyable'], data['channel_box']):
+            if attr in table:
+                table.discard(attr)
+                table.add(new_name)
+        old_plug = '{0}.{1}'.format(node, attr)
+        new_plug = '{0}.{1}'.format(node, new_name)
+        renamed = {}
+        for dest, src in self.connections.items():
+            renamed[new_plug if dest == old_plug else dest] = (
+                                new_plug if src == old_plug else src)
+        self.connections = renamed
+        return new_name
+
+    def listAttr(self, name, keyable=False, channelBox=False,
+                 changedSinceFileOpen=False, **kwargs):
+        if '.' in name:
+            node, attr = self._split(name)
+            if changedSinceFileOpen:
+                changed = self.nodes[node]['changed']
+                return [attr] if attr in changed else None
+            return [attr]
+        data = self._node(name)
+        if changedSinceFileOpen:
+            return sorted(data['changed']) or None
+        attrs = []
+        for attr in sorted(data['attrs']):
+            if keyable and attr in data['keyable']:
+                attrs.append(attr)
+            elif channelBox and attr in data['channel_box']:
+                attrs.append(attr)
+            elif not keyable and not channelBox:
+                attrs.append(attr)
+        return attrs or None
+
+    def getAttr(self, plug, type=False, settable=False,
+                multiIndices=False, time=None, **kwargs):
+        node, attr = self._split(plug)
+        data = self._node(node)
+        self._element(node, attr)
+        if multiIndices:
+            prefix = attr + '['
+            indices = set()
+            for x in data['attrs']:
+                if x.startswith(prefix):
+                    indices.add(int(x[len(prefix):].split(']')[0]))
+            return sorted(indices) or None
+        if attr in COMPOUNDS and attr not in data['attrs']:
+            if type:
+                return 'double3'
+            return [tuple([self.getAttr('{0}.{1}'.format(node, x),
+                                        time=time)
+                           for x in COMPOUNDS[attr]])]
+        if attr not in data['attrs']:
+            raise RuntimeError("No attribute: {0}".format(plug))
+        if type:
+            return data['types'][attr]
+        full = '{0}.{1}'.format(node, attr)
+        if settable:
+            return (full not in self.connections and
+                    not data.get('locked_attrs', {}).get(attr))
+        if full in self.connections:
+            return self._evaluate_plug(self.connections[full], time)
+        if data['type'].startswith('animCurve') and attr == 'output':
+            return self._evaluate_curve(node, time)
+        return copy.copy(data['attrs'][attr])
+
+    def _evaluate_plug(self, plug, time=None):
+        node, attr = plug.split('.', 1)
+        if self._is_curve(node) and attr == 'output':
+            return self._evaluate_curve(node, time)
+        return self.getAttr(plug, time=time)
+
+    def _evaluate_curve(self, node, time=None):
+        data = self.nodes[node]
+        if data['type'].startswith('animCurveU'):
+            at = self.getAttr(node + '.input', time=time)
+        else:
+            at = self.time if time is None else time
+        if not data['keys']:
+            return 0.0
+        curve_data = self._curve_data(node)
+        return float(animlib.evaluate.curve(curve_data, [at], fps=FPS)[0])
+
+    def _curve_data(self, node):
+        """Returns the curve's keys in the columnar curve dictionary
+        format used by animlib.evaluate."""
+        data = self.nodes[node]
+        keys = data['keys']
+        return {'type': data['type'],
+                'schema': 2,
+                'pre': data['attrs']['preInfinity'],
+                'post': data['attrs']['postInfinity'],
+                'weighted': bool(data['attrs']['weightedTangents']),
+                'keys': {'time': [x['time'] for x in keys],
+                         'value': [x['value'] for x in keys],
+                         'in_type': [x['in_type'] for x in keys],
+                         'out_type': [x['out_type'] for x in keys],
+                         'in_angle': [x['in_angle'] for x in keys],
+                         'out_angle': [x['out_angle'] for x in keys],
+                         'in_weight': [x['in_weight'] for x in keys],
+                         'out_weight': [x['out_weight'] for x in keys],
+                         'locked': [x['lock'] for x in keys],},}
+
+    def setAttr(self, plug, *values, **kwargs):
+        node, attr = self._split(plug)
+        data = self._node(node)
+        self._element(node, attr)
+        full = '{0}.{1}'.format(node, attr)
+        if attr.startswith(('keyTimeValue[', 'keyValue[')):
+            return self._set_key_time_values(node, attr, values)
+        if 'keyable' in kwargs:
+            if kwargs['keyable']:
+                data['keyable'].add(attr)
+            else:
+                data['keyable'].discard(attr)
+        if 'channelBox' in kwargs:
+            if kwargs['channelBox']:
+                data['channel_box'].add(attr)
+            else:
+                data['channel_box'].discard(attr)
+        if 'lock' in kwargs:
+            data.setdefault('locked_attrs', {})[attr] = kwargs['lock']
+        if not values:
+            return
+        if full in self.connections:
+            raise RuntimeError(
+                "setAttr: '{0}' is connected and cannot be set.".format(
+                                                                  full))
+        if attr in COMPOUNDS and attr not in data['attrs']:
+            for child, value in zip(COMPOUNDS[attr], values):
+                self.setAttr('{0}.{1}'.format(node, child), value)
+            return
+        if attr not in data['attrs']:
+            raise RuntimeError("No attribute: {0}".format(plug))
+        value = values[0] if len(values) == 1 else list(values)
+        data['attrs'][attr] = value
+        if data['reference']:
+            data['changed'].add(attr)
+
+    def _set_key_time_values(self, node, attr, values):
+        """Sets a block of keys through the keyTimeValue multi attr as
+        'setAttr -s n .ktv[a:b] t v t v ...' does, or the keyValue multi
+        attr of curves driven by another attribute. As in Maya, curves
+        keyed in time only have keyTimeValue and driven curves only
+        keyValue."""
+        name, bracket, index = attr.partition('[')
+        timed = self.nodes[node]['type'].startswith('animCurveT')
+        if timed != (name == 'keyTimeValue'):
+            raise RuntimeError("No attribute: {0}.{1}".format(node, attr))
+        index = index.split(']')[0]
+        if ':' in index:
+            start, end = [int(x) for x in index.split(':')]
+        else:
+            start = end = int(index)
+        keys = self.nodes[node]['keys']
+        for i, key_index in enumerate(range(start, end+1)):
+            time, value = values[i*2], values[i*2+1]
+            while len(keys) <= key_index:
+                keys.append(self._new_key(0.0, 0.0))
+            keys[key_index]['time'] = float(time)
+            keys[key_index]['value'] = float(value)
+        keys.sort(key=lambda x: x['time'])
+        self._recompute(node)
+
+    def connectAttr(self, src, dest, force=False, **kwargs):
+        src = self._plug(src)
+        dest = self._plug(dest)
+        for plug in (src, dest):
+            if not self.objExists(plug):
+                raise RuntimeError("No attribute: {0}".format(plug))
+        if dest in self.connections and not force:
+            raise RuntimeError("{0} is already connected.".format(dest))
+        self.connections[dest] = src
+
+    def disconnectAttr(self, src, dest, **kwargs):
+        dest = self._plug(dest)
+        if self.connections.get(dest) == self._plug(src):
+            del self.connections[dest]
+
+    def isConnected(self, src, dest, ignoreUnitConversion=False,
+                    **kwargs):
+        src = self._plug(src)
+        dest = self._plug(dest)
+        found = self.connections.get(dest)
+        if ignoreUnitConversion and found:
+            found = self._skip_conversion(found)
+        return found == src
+
+    def connectionInfo(self, plug, isDestination=False,
+                       sourceFromDestination=False, **kwargs):
+        plug = self._plug(plug)
+        if isDestination:
+            return plug in self.connections
+        if sourceFromDestination:
+            return self.connections.get(plug, '')
+        return False
+
+    def _skip_conversion(self, src):
+        node = src.split('.')[0]
+        while self.nodes.get(node, {}).get('type') == 'unitConversion':
+            src = self.connections.get(node + '.input')
+            if not src:
+                return None
+            node = src.split('.')[0]
+        return src
+
+    def listConnections(self, name, source=True, destination=True,
+                        plugs=False, connections=False,
+                        skipConversionNodes=False, type=None, **kwargs):
+        pairs = []
+        if '.' in name:
+            node, attr = self._split(name)
+            own = lambda x: (x == '{0}.{1}'.format(node, attr) or
+                             x.startswith('{0}.{1}.'.format(node, attr)))
+        else:
+            node = self._clean(name)
+            self._node(node)
+            own = lambda x: x.split('.')[0] == node
+        for dest in sorted(self.connections):
+            src = self.connections[dest]
+            if source and own(dest):
+                other = src
+                if skipConversionNodes:
+                    other = self._skip_conversion(src)
+                    if not other:
+                        continue
+                pairs.append((dest, other))
+            if destination and own(src):
+                pairs.append((src, dest))
+        if type:
+            pairs = [x for x in pairs
+                     if self.nodes[x[1].split('.')[0]]['type'] == type]
+        result = []
+        for this, other in pairs:
+            if connections:
+                result.append(this)
+            result.append(other if plugs else other.split('.')[0])
+        return result or None
+
+    #==================================================================
+    # Keyframe commands.
+    #==================================================================
+    def _new_key(self, time, value, in_type='auto', out_type='auto'):
+        return {'time': float(time),
+                'value': float(value),
+                'in_type': in_type,
+                'out_type': out_type,
+                'in_angle': 0.0,
+                'out_angle': 0.0,
+                'in_weight': 1.0,
+                'out_weight': 1.0,
+                'lock': True,}
+
+    def _curve_name(self, name):
+        if isinstance(name, (list, tuple)):
+            name = name[0]
+        name = name.split('.')[0]
+        if not self._is_curve(name):
+            raise RuntimeError("{0} is not an anim curve.".format(name))
+        return name
+
+    def _selected_keys(self, node, index=None, time=None, float=None):
+        """Returns the indices of the keys matched by the index, time
+        or float flags, which may be single values, ranges, range
+        strings or lists of any of these."""
+        keys = self.nodes[node]['keys']
+        flags = [(x, y) for x, y in (('index', index), ('time', time),
+                                     ('float', float)) if y is not None]
+        if not flags:
+            return list(range(len(keys)))
+        mode, ranges = flags[0]
+        if not isinstance(ranges, list):
+            ranges = [ranges]
+        selected = set()
+        for item in ranges:
+            if isinstance(item, STRING_TYPES):
+                item = tuple([_to_float(x) if x else None
+                              for x in item.split(':')])
+            if not isinstance(item, tuple):
+                item = (item,)
+            start = item[0]
+            end = item[-1]
+            for i, key in enumerate(keys):
+                at = i if mode == 'index' else key['time']
+                if ((start is None or at >= start - 1e-6) and
+                        (end is None or at <= end + 1e-6)):
+                    selected.add(i)
+        return sorted(selected)
+
+    def keyframe(self, name, query=False, edit=False, index=None,
+                 time=None, float=None, valueChange=None,
+                 timeChange=None, floatChange=None, keyframeCount=False,
+                 indexValue=False, absolute=True, relative=False,
+                 **kwargs):
+        node = self._curve_name(name)
+        keys = self.nodes[node]['keys']
+        selected = self._selected_keys(node, index, time, float)
+        if query:
+            if keyframeCount:
+                return len(selected)
+            if indexValue:
+                return selected or None
+            fields = []
+            if timeChange:
+                fields.append('time')
+            if floatChange:
+                fields.append('time')
+            if valueChange:
+                fields.append('value')
+            if not fields:
+                fields = ['time']
+            result = []
+            for i in selected:
+                result += [keys[i][x] for x in fields]
+            return result or None
+        for i in selected:
+            if valueChange is not None:
+                if relative:
+                    keys[i]['value'] += valueChange
+                else:
+                    keys[i]['value'] = valueChange
+            change = timeChange if timeChange is not None else floatChange
+            if change is not None:
+                if relative:
+                    keys[i]['time'] += change
+                else:
+                    keys[i]['time'] = change
+        keys.sort(key=lambda x: x['time'])
+        self._recompute(node)
+        return len(selected)
+
+    def keyTangent(self, name, query=False, edit=False, index=None,
+                   time=None, float=None, **kwargs):
+        node = self._curve_name(name)
+        data = self.nodes[node]
+        keys = data['keys']
+        selected = self._selected_keys(node, index, time, float)
+        fields = (('inTangentType', 'in_type'),
+                  ('outTangentType', 'out_type'),
+                  ('inAngle', 'in_angle'),
+                  ('outAngle', 'out_angle'),
+                  ('inWeight', 'in_weight'),
+                  ('outWeight', 'out_weight'),
+                  ('lock', 'lock'),)
+        if query:
+            if kwargs.get('weightedTangents'):
+                return [bool(data['attrs']['weightedTangents'])]
+            queried = [y for x, y in fields if kwargs.get(x)]
+            result = []
+            for i in selected:
+                result += [keys[i][x] for x in queried]
+            return result or None
+        if 'weightedTangents' in kwargs:
+            data['attrs']['weightedTangents'] = bool(
+                                             kwargs['weightedTangents'])
+        for i in selected:
+            key = keys[i]
+            if 'lock' in kwargs:
+                key['lock'] = bool(kwargs['lock'])
+            for flag, field in (('inWeight', 'in_weight'),
+                                ('outWeight', 'out_weight'),):
+                if flag in kwargs:
+                    key[field] = kwargs[flag]
+            if 'inAngle' in kwargs:
+                key['in_angle'] = kwargs['inAngle']
+                key['in_type'] = 'fixed'
+                if key['lock'] and 'outAngle' not in kwargs:
+                    key['out_angle'] = kwargs['inAngle']
+                    key['out_type'] = 'fixed'
+            if 'outAngle' in kwargs:
+                key['out_angle'] = kwargs['outAngle']
+                key['out_type'] = 'fixed'
+                if key['lock'] and 'inAngle' not in kwargs:
+                    key['in_angle'] = kwargs['outAngle']
+                    key['in_type'] = 'fixed'
+            if kwargs.get('inTangentType'):
+                key['in_type'] = kwargs['inTangentType']
+            if kwargs.get('outTangentType'):
+                key['out_type'] = kwargs['outTangentType']
+        self._recompute(node)
+        return len(selected)
+
+    def setKeyframe(self, name, time=None, float=None, value=None,
+                    inTangentType=None, outTangentType=None,
+                    insert=False, **kwargs):
+        node = self._curve_name(name)
+        keys = self.nodes[node]['keys']
+        at = time if time is not None else float
+        if isinstance(at, (tuple, list)):
+            at = at[0]
+        if at is None:
+            at = self.time
+        if value is None or insert:
+            value = self._evaluate_curve(node, at) if keys else 0.0
+        for key in keys:
+            if abs(key['time'] - at) < 1e-6:
+                key['value'] = value
+                break
+        else:
+            key = self._new_key(at, value)
+            keys.append(key)
+            keys.sort(key=lambda x: x['time'])
+        if inTangentType:
+            key['in_type'] = inTangentType
+        if outTangentType:
+            key['out_type'] = outTangentType
+        self._recompute(node)
+        return 1
+
+    def cutKey(self, name, time=None, float=None, index=None,
+               option='keys', **kwargs):
+        node = self._curve_name(name)
+        keys = self.nodes[node]['keys']
+        selected = self._selected_keys(node, index, time, float)
+        self.nodes[node]['keys'] = [x for i, x in enumerate(keys)
+                                    if i not in selected]
+        self._recompute(node)
+        return len(selected)
+
+    def scaleKey(self, name, time=None, newStartTime=None,
+                 newEndTime=None, **kwargs):
+        node = self._curve_name(name)
+        keys = self.nodes[node]['keys']
+        start, end = time
+        if end == start:
+            scale = 1.0
+        else:
+            scale = (newEndTime - newStartTime)/(end - start)
+        for i in self._selected_keys(node, time=(start, end)):
+            key = keys[i]
+            key['time'] = newStartTime + (key['time'] - start)*scale
+            if scale:
+                for field in ('in_angle', 'out_angle'):
+                    slope = math.tan(math.radians(key[field]))/scale
+                    key[field] = math.degrees(math.atan(slope))
+        keys.sort(key=lambda x: x['time'])
+        self._recompute(node)
+        return 1
+
+    def _recompute(self, node):
+        """Derives the angles of tangents whose type is computed from
+        the neighbouring keys."""
+        keys = self.nodes[node]['keys']
+        for i, key in enumerate(keys):
+            prev = keys[i-1] if i > 0 else None
+            post = keys[i+1] if i < len(keys)-1 else None
+            for side, neighbour in (('in', prev), ('out', post)):
+                tan_type = key[side + '_type']
+                if tan_type not in COMPUTED_TANGENTS:
+                    continue
+                if tan_type in ('flat', 'step', 'stepnext'):
+                    angle = 0.0
+                elif tan_type == 'linear':
+                    angle = self._slope_angle(key, neighbour)
+                else:
+                    angle = self._slope_angle(prev or key, post or key)
+                key[side + '_angle'] = angle
+
+    def _slope_angle(self, key_a, key_b):
+        if key_a is None or key_b is None:
+            return 0.0
+        if key_a['time'] > key_b['time']:
+            key_a, key_b = key_b, key_a
+        span = (key_b['time'] - key_a['time'])/FPS
+        if not span:
+            return 0.0
+        return math.degrees(math.atan((key_b['value'] -
+                                       key_a['value'])/span))
+
+    def currentTime(self, time=None, query=False, update=True,
+                    **kwargs):
+        if query or time is None:
+            return self.time
+        self.time = time
+        return time
+
+    def currentUnit(self, query=False, time=False, **kwargs):
+        if time:
+            return 'film'
+
+    def playbackOptions(self, query=False, minTime=False, maxTime=False,
+                        **kwargs):
+        if minTime:
+            return 1.0
+        if maxTime:
+            return 120.0
+
+    #==================================================================
+    # Reference and namespace commands.
+    #==================================================================
+    def add_reference(self, filepath, namespace, builder=None):
+        """Creates a reference node and, through the builder registered
+        for filepath, the referenced nodes in the namespace."""
+        namespace = namespace.lstrip(':')
+        ref_node = self._unique(namespace + 'RN')
+        copy_number = len([x for x in self.references.values()
+                           if x['path'] == filepath])
+        filename = filepath
+        if copy_number:
+            filename = '{0}{{{1}}}'.format(filepath, copy_number)
+        self.nodes[ref_node] = {'type': 'reference', 'attrs': {},
+                                'types': {}, 'keyable': set(),
+                                'channel_box': set(), 'changed': set(),
+                                'keys': [], 'reference': None,
+                                'parent': None, 'locked': True,}
+        self.references[filename] = {'node': ref_node,
+                                     'namespace': namespace,
+                                     'path': filepath,}
+        before = set(self.nodes)
+        builder = builder or self.files.get(filepath)
+        if builder:
+            builder(self, namespace)
+        for name in set(self.nodes) - before:
+            self.nodes[name]['reference'] = ref_node
+        return filename
+
+    def _reference_of(self, name):
+        for filename, ref in self.references.items():
+            if ref['node'] == name or filename == name:
+                return filename, ref
+        name = self._clean(name.split('.')[0])
+        node = self.nodes.get(name)
+        if node and node['reference']:
+            for filename, ref in self.references.items():
+                if ref['node'] == node['reference']:
+                    return filename, ref
+        return None, None
+
+    def referenceQuery(self, name, isNodeReferenced=False,
+                       referenceNode=False, topReference=False,
+                       namespace=False, filename=False, **kwargs):
+        if isNodeReferenced:
+            node = self._node(name.split('.')[0])
+            return bool(node['reference'])
+        ref_file, ref = self._reference_of(name)
+        if ref is None:
+            raise RuntimeError("{0} is not referenced.".format(name))
+        if referenceNode:
+            return ref['node']
+        if namespace:
+            return ':' + ref['namespace']
+        if filename:
+            return ref_file
+
+    def file(self, filepath=None, query=False, reference=False,
+             namespace=None, list=False, open=False, force=False,
+             new=False, sceneName=False, **kwargs):
+        if new:
+            self.clear()
+            return
+        if open:
+            files = self.files
+            self.clear()
+            self.files = files
+            self.scene_name = filepath
+            if filepath not in files:
+                raise RuntimeError("File not found: {0}".format(filepath))
+            files[filepath](self, '')
+            for node in self.nodes.values():
+                node['changed'] = set()
+            return filepath
+        if query:
+            if sceneName:
+                return self.scene_name
+            if reference and filepath is None:
+                return sorted(self.references)
+            if list:
+                return [self.scene_name or 'untitled'] + sorted(
+                                                       self.references)
+            if namespace and filepath:
+                return self.references[filepath]['namespace']
+            return None
+        if reference:
+            return self.add_reference(filepath, namespace or 'ref')
+
+    def namespace(self, exists=None, **kwargs):
+        if exists is not None:
+            exists = exists.strip(':')
+            return any([x.startswith(exists + ':') for x in self.nodes])
+        return None
+
+    def namespaceInfo(self, namespace=None, listNamespace=False,
+                      listOnlyNamespaces=False, **kwargs):
+        namespace = (namespace or '').strip(':')
+        prefix = namespace + ':' if namespace else ''
+        if listNamespace:
+            found = [x for x in sorted(self.nodes)
+                     if x.startswith(prefix) and ':' not in x[len(prefix):]]
+            return found or None
+        if listOnlyNamespaces:
+            children = set()
+            for name in self.nodes:
+                if name.startswith(prefix):
+                    rest = name[len(prefix):]
+                    if ':' in rest:
+                        children.add(prefix + rest.split(':')[0])
+            return sorted(children) or None
+
+    #==================================================================
+    # Interface commands that have no meaning outside Maya.
+    #==================================================================
+    def error(self, message, **kwargs):
+        raise RuntimeError(message)
+
+    def warning(self, message, **kwargs):
+        print('Warning: {0}'.format(message))
+
+    def confirmDialog(self, **kwargs):
+        return kwargs.get('defaultButton', 'OK')
+
+    def progressWindow(self, *args, **kwargs):
+        return False
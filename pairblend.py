@@ -1,6 +1,8 @@
 """Exports and rebuilds pairBlend nodes."""
 
-import maya.cmds as cmds
+from animlib.scene import cmds
+
+EXPORTABLE_TYPES = frozenset(["pairBlend"])
 
 #=======================================================================
 def export(pairblend, object):
@@ -43,7 +45,7 @@ def build(data, remap):
 #=======================================================================
 def is_type_exportable(node_type):
     """Returns True if the node type is something we can export."""
-    return node_type == "pairBlend"
+    return node_type in EXPORTABLE_TYPES
 
     
 #======================================================================
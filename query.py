@@ -0,0 +1,169 @@
+"""Memoises the scene queries that an export repeats for many channels
+of the same node or reference.
+
+An export reads the scene without changing it, so the answers to these
+queries hold for its duration. export.channels() clears the cache at
+its start and end, and records the hit rates in the info data. The
+cache holds at most MAX_SIZE answers, dropping the least recently used
+first.
+"""
+import collections
+from animlib.scene import cmds
+
+MAX_SIZE = 100000
+
+#======================================================================
+class QueryCache(object):
+    """A bounded least recently used cache of query answers, keyed by
+    the kind of query and its arguments, that counts hits and misses
+    for each kind of query."""
+
+    def __init__(self, max_size=MAX_SIZE):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.hits = {}
+        self.misses = {}
+
+    def get(self, kind, key, query, *args, **kwargs):
+        """Returns the cached answer for the kind and key, calling the
+        query with the args and kwargs to answer it on a miss."""
+        entry = (kind, key)
+        if entry in self.entries:
+            # Move the entry to the most recently used end.
+            answer = self.entries.pop(entry)
+            self.entries[entry] = answer
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            return answer
+        self.misses[kind] = self.misses.get(kind, 0) + 1
+        answer = query(*args, **kwargs)
+        self.entries[entry] = answer
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return answer
+
+    def put(self, kind, key, answer):
+        """Caches an answer found by a bulk query, without counting it
+        as a hit or a miss."""
+        entry = (kind, key)
+        self.entries.pop(entry, None)
+        self.entries[entry] = answer
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def has(self, kind, key):
+        """Returns True if an answer for the kind and key is cached."""
+        return (kind, key) in self.entries
+
+    def clear(self):
+        """Empties the cache and resets the counts."""
+        self.entries.clear()
+        self.hits.clear()
+        self.misses.clear()
+
+    def stats(self):
+        """Returns a dictionary of the hits, misses and hit rate of each
+        kind of query."""
+        stats = {}
+        for kind in set(self.hits) | set(self.misses):
+            hits = self.hits.get(kind, 0)
+            misses = self.misses.get(kind, 0)
+            stats[kind] = {'hits': hits,
+                           'misses': misses,
+                           'hit_rate': float(hits) / (hits + misses),}
+        return stats
+
+    def report(self):
+        """Prints the hit rate of each kind of query."""
+        stats = self.stats()
+        for kind in sorted(stats):
+            print(" > Cached {0}: {1} hits, {2} queries ({3:.0%}).".format(
+                                            kind,
+                                            stats[kind]['hits'],
+                                            stats[kind]['misses'],
+                                            stats[kind]['hit_rate']))
+
+cache = QueryCache()
+
+#======================================================================
+def node_type(node):
+    """Returns the type of the node."""
+    return cache.get('node_type', node, cmds.nodeType, node)
+
+
+#======================================================================
+def prime_node_types(nodes):
+    """Resolves the types of the nodes that aren't cached yet with a
+    single listing of the scene, so that node_type() answers them
+    without a query each. Returns the number of types resolved."""
+    resolved = 0
+    missing = [x for x in set(nodes) if not cache.has('node_type', x)]
+    if missing:
+        # Nodes the listing names differently, or not at all, are left
+        # for node_type() to query one at a time.
+        listing = cmds.ls(sorted(missing), showType=True) or []
+        missing = set(missing)
+        for node, type in zip(listing[0::2], listing[1::2]):
+            if node in missing:
+                cache.put('node_type', node, type)
+                resolved += 1
+    return resolved
+
+
+#======================================================================
+def is_referenced(node):
+    """Returns True if the node comes from a referenced file."""
+    return cache.get('is_referenced',
+                     node,
+                     cmds.referenceQuery,
+                     node,
+                     isNodeReferenced=True)
+
+
+#======================================================================
+def reference_node(node):
+    """Returns the top level reference node of a referenced node."""
+    return cache.get('reference_node',
+                     node,
+                     cmds.referenceQuery,
+                     node,
+                     referenceNode=True,
+                     topReference=True)
+
+
+#======================================================================
+def namespace(ref_node):
+    """Returns the namespace of a reference node."""
+    return cache.get('namespace',
+                     ref_node,
+                     cmds.referenceQuery,
+                     ref_node,
+                     namespace=True)
+
+
+#======================================================================
+def multi_indices(attr):
+    """Returns the indices of the existing elements of a multi
+    attribute."""
+    return cache.get('multi_indices',
+                     attr,
+                     cmds.getAttr,
+                     attr,
+                     multiIndices=True)
+
+
+#======================================================================
+def clear():
+    """Empties the cache and resets its counts."""
+    cache.clear()
+
+
+#======================================================================
+def stats():
+    """Returns the hits, misses and hit rate of each kind of query."""
+    return cache.stats()
+
+
+#======================================================================
+def report():
+    """Prints the hit rate of each kind of query."""
+    cache.report()
@@ -0,0 +1,218 @@
+"""Removes keys from exported anim curves where the remaining keys
+reproduce the curve within a tolerance.
+
+This works on the curve dictionary format alone, so it can be run on
+export or offline on existing library files without Maya.
+"""
+import math
+import animlib.curve
+import animlib.evaluate
+import animlib.file
+
+# Tangent types that Maya recomputes from the neighbouring keys when the
+# curve is rebuilt. Keys that lose a neighbour have these tangents fixed
+# at their exported angles so the reduced curve keeps its shape.
+COMPUTED_TYPES = ('spline',
+                  'linear',
+                  'fast',
+                  'slow',
+                  'clamped',
+                  'plateau',
+                  'auto',)
+
+#======================================================================
+def curve(data, tolerance, fps=24.0):
+    """Returns a tuple of the reduced curve data and a dictionary of
+    stats: the number of keys before and after, and the maximum and root
+    mean square value error at the original keys and between them.
+
+    A key is removed when the segment between the keys either side of
+    it, using their existing tangents, stays within tolerance of the
+    original curve. Each segment is checked only against the samples
+    inside it, and is grown by doubling its reach and then searching
+    between the last reach that fitted and the first that didn't, so
+    long runs of removable keys cost little more than a single pass.
+    """
+    data = animlib.curve.upgrade(data)
+    keys = data['keys']
+    key_count = len(keys['time'])
+    stats = {'keys': key_count,
+             'kept': key_count,
+             'max_error': 0.0,
+             'rms_error': 0.0,}
+    if key_count < 3:
+        return (data, stats)
+    time_scale = animlib.evaluate.time_scale(data, fps)
+
+    # Sample the original curve at each key and half way between keys,
+    # so the samples strictly inside the segment from key a to key b are
+    # those from 2a+1 to 2b-1.
+    samples = []
+    for i in range(key_count-1):
+        samples.append((keys['time'][i], keys['value'][i]))
+        mid_time = (keys['time'][i] + keys['time'][i+1]) * 0.5
+        samples.append((mid_time, animlib.evaluate.segment(
+                                                        keys,
+                                                        data['weighted'],
+                                                        i,
+                                                        i+1,
+                                                        mid_time,
+                                                        time_scale)))
+    samples.append((keys['time'][-1], keys['value'][-1]))
+
+    # Walk along the curve, extending each segment from the last kept
+    # key as far as it stays within tolerance. The segment to the next
+    # key always fits, as it is the original curve.
+    kept = [0]
+    errors = []
+    start = 0
+    while start < key_count-1:
+        fitted = start+1
+        missed = None
+        reach = 2
+        while fitted < key_count-1:
+            end = min(start+reach, key_count-1)
+            if not _segment_fits(keys,
+                                 data['weighted'],
+                                 start,
+                                 end,
+                                 samples,
+                                 time_scale,
+                                 tolerance):
+                missed = end
+                break
+            fitted = end
+            reach *= 2
+        while missed is not None and missed - fitted > 1:
+            end = (fitted + missed) // 2
+            if _segment_fits(keys,
+                             data['weighted'],
+                             start,
+                             end,
+                             samples,
+                             time_scale,
+                             tolerance):
+                fitted = end
+            else:
+                missed = end
+        if fitted > start+1:
+            errors += _segment_errors(keys,
+                                      data['weighted'],
+                                      start,
+                                      fitted,
+                                      samples,
+                                      time_scale)
+        kept.append(fitted)
+        start = fitted
+
+    # Build the reduced key arrays, fixing the tangents that would be
+    # recomputed by Maya around the removed keys.
+    reduced = dict([(x, [keys[x][i] for i in kept]) for x in keys])
+    for i in range(len(kept)):
+        removed_before = i > 0 and kept[i] - kept[i-1] > 1
+        removed_after = i < len(kept)-1 and kept[i+1] - kept[i] > 1
+        if not (removed_before or removed_after):
+            continue
+        for field in ('in_type', 'out_type'):
+            tangent_type = animlib.curve.type_name(reduced[field][i])
+            if tangent_type in COMPUTED_TYPES:
+                reduced[field][i] = animlib.curve.type_index('fixed')
+
+    data = dict(data)
+    data['keys'] = reduced
+    stats['kept'] = len(kept)
+    if errors:
+        stats['max_error'] = max(errors)
+        stats['rms_error'] = math.sqrt(sum([x*x for x in errors]) /
+                                       len(errors))
+    return (data, stats)
+
+
+#======================================================================
+def anim_data(data, tolerance):
+    """Reduces every anim curve in the data read from an anim file in
+    place. Returns a dictionary of each curve token's stats, which is
+    also recorded in the info data under 'reduction'."""
+    info_data = data[0]
+    anim_curve_data = data[3]
+    fps = info_data.get('fps', 24.0)
+    reduction = {}
+    for token in sorted(anim_curve_data):
+        if 'shared' in anim_curve_data[token]:
+            continue
+        anim_curve_data[token], reduction[token] = curve(
+                                                anim_curve_data[token],
+                                                tolerance,
+                                                fps)
+    info_data['reduction'] = reduction
+    return reduction
+
+
+#======================================================================
+def library_file(filepath, tolerance, output_filepath=None):
+    """Reduces the curves in an anim file and writes the result to the
+    output filepath, or back over the file if none is given. Prints and
+    returns a summary of the stats."""
+    data = animlib.file.read(filepath)
+    reduction = anim_data(data, tolerance)
+    animlib.file.write(output_filepath or filepath, data, overwrite=True)
+    summary = summarise(reduction)
+    print("Reduced {0} curves in {1}: {2} keys to {3}, "
+          "max error {4}.".format(summary['curves'],
+                                  filepath,
+                                  summary['keys'],
+                                  summary['kept'],
+                                  summary['max_error']))
+    return summary
+
+
+#======================================================================
+def summarise(reduction):
+    """Returns the totals of a dictionary of per-curve stats."""
+    summary = {'curves': len(reduction),
+               'keys': 0,
+               'kept': 0,
+               'max_error': 0.0,}
+    for stats in reduction.values():
+        summary['keys'] += stats['keys']
+        summary['kept'] += stats['kept']
+        summary['max_error'] = max(summary['max_error'],
+                                   stats['max_error'])
+    return summary
+
+
+#======================================================================
+def _segment_errors(keys, weighted, start, end, samples, time_scale):
+    """Returns the absolute errors of the segment from key start to key
+    end against the original samples between them."""
+    return [abs(animlib.evaluate.segment(keys,
+                                         weighted,
+                                         start,
+                                         end,
+                                         sample_time,
+                                         time_scale) - sample_value)
+            for sample_time, sample_value in samples[2*start+1:2*end]]
+
+
+#======================================================================
+def _segment_fits(keys,
+                  weighted,
+                  start,
+                  end,
+                  samples,
+                  time_scale,
+                  tolerance):
+    """Returns True if the segment from key start to key end stays within
+    tolerance of the original samples between them, stopping at the
+    first sample that doesn't."""
+    for i in range(2*start+1, 2*end):
+        sample_time, sample_value = samples[i]
+        if abs(animlib.evaluate.segment(keys,
+                                        weighted,
+                                        start,
+                                        end,
+                                        sample_time,
+                                        time_scale) -
+               sample_value) > tolerance:
+            return False
+    return True
@@ -10,7 +10,7 @@ ref_namespace = (get_top_namespace(channel))
         channel = channel.replace(ref_namespace, token, 1);
 """
 import os.path
-import maya.cmds as cmds
+from animlib.scene import cmds
 
 #======================================================================
 def export(ref_node):
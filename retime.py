@@ -1,4 +1,4 @@
-import maya.cmds as cmds
+from animlib.scene import cmds
 import pprint
 import animlib.curve as crv
 
@@ -96,6 +96,11 @@ def curve(anim_curve, time_filter, skip_cycle=True, trim=False):
     # buffer curve to hold the keys from each time block while we scale
     # them.
     node_type = cmds.nodeType(anim_curve)
+    
+    # Read the keys of the curve once. The curve isn't edited again
+    # until the remapped keys are transferred back to it, and the
+    # snapshot isn't kept beyond this retime.
+    source = crv.CurveSnapshot(anim_curve, node_type)
     temp_curve = cmds.createNode(node_type,
                                  name=anim_curve+'remap_temp',
                                  skipSelect=True)
@@ -109,17 +114,14 @@ def curve(anim_curve, time_filter, skip_cycle=True, trim=False):
         # time block then we need to treat it as a held frame.
         if src_end == src_start:
             # Add a duplicate key at the start and end of the time block.
-            keys = cmds.keyframe(anim_curve,
-                                 time=(src_start,),
-                                 query=True)
-            key_data = crv.key_info_by_time(anim_curve, keys[0])
+            key_data = source.key_by_time(src_start)
             key_data['key_time'] = new_end
-            crv.add_keyframe(temp_curve, key_data)
+            crv.add_keyframe(temp_curve, key_data, node_type)
             key_data['key_time'] = new_start
             key_data['out_type'] = 'step'
             key_data['out_angle'] = 0
             key_data['out_weight'] = 0
-            crv.add_keyframe(temp_curve, key_data) 
+            crv.add_keyframe(temp_curve, key_data, node_type)
         
         # If the time block uses different source frames at the start
         # and end of the time block then we need to scale the region
@@ -138,12 +140,10 @@ def curve(anim_curve, time_filter, skip_cycle=True, trim=False):
             buffer_curve = cmds.createNode(node_type,
                                          name=anim_curve+'buffer_temp',
                                          skipSelect=True)
-            keys = cmds.keyframe(anim_curve,
-                                 time=(src_start,src_end,),
-                                 query=True)
+            keys = source.times(src_start, src_end)
             for key in keys:
-                key_data = crv.key_info_by_time(anim_curve, key)
-                crv.add_keyframe(buffer_curve, key_data)
+                key_data = source.key_by_time(key)
+                crv.add_keyframe(buffer_curve, key_data, node_type)
                 
             # Scale the keys on the buffer curve.
             cmds.scaleKey(buffer_curve,
@@ -155,49 +155,45 @@ def curve(anim_curve, time_filter, skip_cycle=True, trim=False):
             # for that.
             if reverse:
                 for key_index in range(0, len(keys)-1):
-                    if cmds.keyTangent(anim_curve,
-                              outTangentType=True,
-                              index=(key_index, key_index),
-                              query=True)[0] == 'step':
+                    out_type = crv.type_name(
+                                        source.keys['out_type'][key_index])
+                    if out_type == 'step':
                         new_index = len(keys)-key_index-2
                         cmds.keyTangent(buffer_curve,
                                         index=(new_index,),
                                         outTangentType = 'stepnext')
-                    if cmds.keyTangent(anim_curve,
-                              outTangentType=True,
-                              index=(key_index, key_index),
-                              query=True)[0] == 'stepnext':
+                    if out_type == 'stepnext':
                         new_index = len(keys)-key_index-2
                         cmds.keyTangent(buffer_curve,
                                         index=(new_index,),
                                         outTangentType = 'step')
 
             # Transcribe the keys to the temp curve.
-            buffer_keys = cmds.keyframe(buffer_curve, query=True)
+            buffer_keys, weighted = crv.key_columns(buffer_curve,
+                                                    node_type)
             temp_keys = cmds.keyframe(temp_curve, query=True)
-            for key_index in range(0, len(buffer_keys)):
-                key_data = crv.key_info_by_index(buffer_curve,
-                                                 key_index)
+            for key_index in range(0, len(buffer_keys['time'])):
+                key_data = crv.key_row(buffer_keys, weighted, key_index)
                 # If the start/end keys already exist on the curve we
                 # don't want to overwrite the tangents before or after
                 # the time block.
                 if temp_keys and key_index == 0:
                     if key_data['key_time'] in temp_keys:
                         old_data = crv.key_info_by_time(temp_curve,
-                                                key_data['key_time'])
+                                                    key_data['key_time'])
                         key_data['in_type'] = old_data['in_type']
                         key_data['in_angle'] = old_data['in_angle']
                         key_data['in_weight'] = old_data['in_weight']
                         
-                if temp_keys and key_index == len(buffer_keys)-1:
+                if temp_keys and key_index == len(buffer_keys['time'])-1:
                     if key_data['key_time'] in temp_keys:
                         old_data = crv.key_info_by_time(temp_curve,
-                                                key_data['key_time'])
+                                                    key_data['key_time'])
                         key_data['out_type'] = old_data['out_type']
                         key_data['out_angle'] = old_data['out_angle']
                         key_data['out_weight'] = old_data['out_weight']
 
-                crv.add_keyframe(temp_curve, key_data)
+                crv.add_keyframe(temp_curve, key_data, node_type)
             cmds.delete(buffer_curve)
 
     # Transfer the keys from the temp curve to the original curve.
@@ -220,9 +216,10 @@ def curve(anim_curve, time_filter, skip_cycle=True, trim=False):
                 option='keys')
 
     # Copy the keys from the temp curve.
-    for key in temp_keys:
-        key_data = crv.key_info_by_time(temp_curve, key)
-        crv.add_keyframe(anim_curve, key_data)
+    copy_keys, weighted = crv.key_columns(temp_curve, node_type)
+    for key_index in range(0, len(copy_keys['time'])):
+        key_data = crv.key_row(copy_keys, weighted, key_index)
+        crv.add_keyframe(anim_curve, key_data, node_type)
     cmds.delete(temp_curve)
 
     # Delete the placeholder key.
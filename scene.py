@@ -0,0 +1,48 @@
+"""Routes the engine's scene access through a swappable backend.
+
+The engine modules use the cmds proxy here in place of maya.cmds:
+
+    from animlib.scene import cmds
+
+Every call is passed to the current backend. Inside Maya that is
+maya.cmds. Outside Maya any object with the same commands can be
+installed with set_backend(), such as an animlib.memscene.Scene, so
+exports, builds and format conversions can run headless.
+"""
+try:
+    import maya.cmds as maya_cmds
+except ImportError:
+    maya_cmds = None
+
+_backend = maya_cmds
+
+#======================================================================
+class Proxy(object):
+    """Looks up each command on the current backend when it is used, so
+    modules that imported the proxy follow later set_backend() calls."""
+
+    def __getattr__(self, name):
+        if _backend is None:
+            raise RuntimeError("No scene backend is set. Outside Maya "
+                               "install one with "
+                               "animlib.scene.set_backend().")
+        return getattr(_backend, name)
+
+cmds = Proxy()
+
+#======================================================================
+def set_backend(backend):
+    """Installs the backend that receives scene commands, or restores
+    maya.cmds if backend is None. Returns the previous backend."""
+    global _backend
+    previous = _backend
+    if backend is None:
+        backend = maya_cmds
+    _backend = backend
+    return previous
+
+
+#======================================================================
+def get_backend():
+    """Returns the backend that currently receives scene commands."""
+    return _backend
@@ -0,0 +1,29 @@
+"""Tests of the engine run against an animlib.memscene.Scene, without
+Maya. From the directory holding the animlib package:
+
+    python -m unittest discover -s animlib/tests -t .
+"""
+import unittest
+import animlib.memscene
+import animlib.scene
+
+#======================================================================
+class SceneTestCase(unittest.TestCase):
+    """Installs an empty in-memory scene as the scene backend for each
+    test, and restores the previous backend afterwards."""
+
+    def setUp(self):
+        self.scene = animlib.memscene.Scene()
+        self.previous = animlib.scene.set_backend(self.scene)
+
+    def tearDown(self):
+        animlib.scene.set_backend(self.previous)
+
+    def make_curve(self, name, node_type, keys, pre=0, post=0):
+        """Creates an anim curve with a key at each (time, value)."""
+        anim_curve = self.scene.createNode(node_type, name=name)
+        for time, value in keys:
+            self.scene.setKeyframe(anim_curve, time=time, value=value)
+        self.scene.setAttr(anim_curve + '.preInfinity', pre)
+        self.scene.setAttr(anim_curve + '.postInfinity', post)
+        return anim_curve
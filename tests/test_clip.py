@@ -0,0 +1,52 @@
+"""Tests of exporting anim curves clipped to a frame range."""
+import math
+import unittest
+import animlib.curve
+import animlib.evaluate
+from animlib.tests import SceneTestCase
+
+#======================================================================
+class CycleClipTest(SceneTestCase):
+
+    def setUp(self):
+        SceneTestCase.setUp(self)
+        self.keys = [(float(x), round(math.sin(x / 7.0) * 3.0 +
+                                      x * 0.05, 3))
+                     for x in range(1, 97)]
+
+    def assert_same_values(self, anim_curve, frame_range, times):
+        full = animlib.curve.export(anim_curve)
+        clipped = animlib.curve.export(anim_curve, frame_range)
+        for expected, value in zip(animlib.evaluate.curve(full, times),
+                                   animlib.evaluate.curve(clipped, times)):
+            self.assertAlmostEqual(expected, value, places=6)
+        return clipped
+
+    def test_range_into_pre_cycle_keeps_all_keys(self):
+        anim_curve = self.make_curve('cycle', 'animCurveTL', self.keys,
+                                     pre=3)
+        clipped = self.assert_same_values(anim_curve,
+                                          (-20, 30),
+                                          [-20.0, -10.0, -5.0, 0.0, 15.0])
+        self.assertEqual(len(clipped['keys']['time']), len(self.keys))
+
+    def test_range_into_post_cycle_keeps_all_keys(self):
+        anim_curve = self.make_curve('cycle', 'animCurveTL', self.keys,
+                                     post=4)
+        clipped = self.assert_same_values(anim_curve,
+                                          (60, 130),
+                                          [70.0, 100.0, 115.0, 130.0])
+        self.assertEqual(len(clipped['keys']['time']), len(self.keys))
+
+    def test_range_within_keys_is_clipped(self):
+        anim_curve = self.make_curve('cycle', 'animCurveTL', self.keys,
+                                     pre=3, post=3)
+        clipped = self.assert_same_values(anim_curve,
+                                          (20, 30),
+                                          [20.0, 24.5, 30.0])
+        self.assertEqual(clipped['keys']['time'][0], 20.0)
+        self.assertEqual(clipped['keys']['time'][-1], 30.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Tests of animlib.curve."""
+import unittest
+import animlib.curve
+from animlib.tests import SceneTestCase
+
+#======================================================================
+class SetKeysTest(SceneTestCase):
+
+    def test_driven_curve_rebuilds(self):
+        driven = self.make_curve('driven',
+                                 'animCurveUL',
+                                 [(-1.0, 2.0), (0.0, 0.0), (3.5, 7.0)])
+        data = animlib.curve.export(driven)
+        self.scene.delete(driven)
+        built = animlib.curve.build(data)
+        self.assertEqual(self.scene.nodeType(built), 'animCurveUL')
+        self.assertEqual(animlib.curve.export(built)['keys'],
+                         data['keys'])
+
+    def test_time_curve_rebuilds(self):
+        timed = self.make_curve('timed',
+                                'animCurveTL',
+                                [(1.0, 2.0), (5.0, 0.0), (9.0, 7.0)])
+        data = animlib.curve.export(timed)
+        self.scene.delete(timed)
+        built = animlib.curve.build(data)
+        self.assertEqual(animlib.curve.export(built)['keys'],
+                         data['keys'])
+
+    def test_key_attrs_match_curve_kind(self):
+        driven = self.scene.createNode('animCurveUL', name='driven')
+        timed = self.scene.createNode('animCurveTL', name='timed')
+        self.assertRaises(RuntimeError,
+                          self.scene.setAttr,
+                          driven + '.ktv[0:0]', 1.0, 2.0, size=1)
+        self.assertRaises(RuntimeError,
+                          self.scene.setAttr,
+                          timed + '.kv[0:0]', 1.0, 2.0, size=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Tests of delta exports, made with animlib.export.channels() against a
+base anim file and merged over it by animlib.file.read()."""
+import json
+import os.path
+import shutil
+import tempfile
+import unittest
+import animlib.export
+import animlib.file
+from animlib.tests import SceneTestCase
+
+#======================================================================
+class UntokenisedChannelTest(SceneTestCase):
+    """Channels of nodes outside any reference are keyed under None in an
+    export and under 'null' once written."""
+
+    def setUp(self):
+        SceneTestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+        self.scene.createNode('transform', name='prop')
+        self.scene.setAttr('prop.translateX', 4.0)
+        anim_curve = self.make_curve('prop_translateY',
+                                     'animCurveTL',
+                                     [(1.0, 0.0), (10.0, 5.0)])
+        self.scene.connectAttr(anim_curve + '.output', 'prop.translateY')
+        self.channels = ['prop.translateX', 'prop.translateY']
+        self.base_filepath = os.path.join(self.directory, 'base.anim')
+        animlib.file.write(self.base_filepath,
+                           animlib.export.channels(self.channels))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        SceneTestCase.tearDown(self)
+
+    def test_unchanged_delta_is_empty(self):
+        data = animlib.export.channels(self.channels,
+                                       base_filepath=self.base_filepath)
+        self.assertEqual(data[3], {})
+        self.assertEqual(data[6], {})
+        self.assertEqual(data[0]['removed']['channels'], {})
+
+    def test_changed_channel_only(self):
+        self.scene.setAttr('prop.translateX', 6.0)
+        data = animlib.export.channels(self.channels,
+                                       base_filepath=self.base_filepath)
+        self.assertEqual(list(data[6]), [None])
+        self.assertEqual(list(data[6][None]), ['prop.translateX'])
+        self.assertEqual(data[0]['removed']['channels'], {})
+        delta_filepath = os.path.join(self.directory, 'delta.anim')
+        animlib.file.write(delta_filepath, data)
+        merged = animlib.file.read(delta_filepath)
+        full = json.loads(json.dumps(animlib.export.channels(self.channels)))
+        self.assertEqual(merged[6], full[6])
+
+
+if __name__ == '__main__':
+    unittest.main()
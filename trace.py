@@ -0,0 +1,206 @@
+"""Times the phases of exports and builds with nested spans.
+
+Tracing is off unless enable() is called, or the ANIMLIB_TRACE
+environment variable is set. While it is off span() returns a shared
+span that does nothing, so the spans left in the engine cost little
+more than a function call.
+
+    animlib.trace.enable()
+    data = animlib.export.channels(channel_list)
+    animlib.trace.report()
+    animlib.trace.write_chrome('/tmp/export.json')
+
+The Chrome trace can be loaded in chrome://tracing or Perfetto.
+"""
+import json
+import os
+import threading
+import time
+
+# The most precise clock available.
+clock = getattr(time, 'perf_counter', time.time)
+
+_enabled = bool(os.environ.get('ANIMLIB_TRACE'))
+_events = []
+_stack = []
+
+#======================================================================
+class Span(object):
+    """Records the time between entering and leaving it as a complete
+    event, with any counts added to it in between."""
+
+    def __init__(self, name, counts):
+        self.name = name
+        self.counts = counts
+        self.start = 0.0
+
+    def __enter__(self):
+        self.path = tuple([x.name for x in _stack]) + (self.name,)
+        _stack.append(self)
+        self.start = clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        end = clock()
+        if _stack and _stack[-1] is self:
+            _stack.pop()
+        _events.append({'name': self.name,
+                        'path': self.path,
+                        'start': self.start,
+                        'seconds': end - self.start,
+                        'counts': self.counts,
+                        'thread': threading.current_thread().ident,})
+        return False
+
+    def count(self, **counts):
+        """Adds to the counts recorded with the span."""
+        for key in counts:
+            self.counts[key] = self.counts.get(key, 0) + counts[key]
+
+
+#======================================================================
+class NullSpan(object):
+    """Stands in for a span while tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+    def count(self, **counts):
+        pass
+
+NULL_SPAN = NullSpan()
+
+#======================================================================
+def span(name, **counts):
+    """Returns a span to time a block with, carrying the counts."""
+    if not _enabled:
+        return NULL_SPAN
+    return Span(name, counts)
+
+
+#======================================================================
+def traced(name):
+    """Returns a decorator that times each call of a function with a
+    span of the given name."""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+
+#======================================================================
+def enable():
+    """Turns tracing on."""
+    global _enabled
+    _enabled = True
+
+
+#======================================================================
+def disable():
+    """Turns tracing off. The events recorded so far are kept."""
+    global _enabled
+    _enabled = False
+
+
+#======================================================================
+def is_enabled():
+    """Returns True if tracing is on."""
+    return _enabled
+
+
+#======================================================================
+def clear():
+    """Forgets the events recorded so far."""
+    del _events[:]
+    del _stack[:]
+
+
+#======================================================================
+def events():
+    """Returns the events recorded so far, in the order they ended."""
+    return list(_events)
+
+
+#======================================================================
+def chrome_events():
+    """Returns the events as Chrome trace events, with times in micro-
+    seconds from the first event."""
+    if not _events:
+        return []
+    origin = min([x['start'] for x in _events])
+    pid = os.getpid()
+    return [{'name': x['name'],
+             'cat': x['name'].split('.')[0],
+             'ph': 'X',
+             'ts': (x['start'] - origin) * 1000000.0,
+             'dur': x['seconds'] * 1000000.0,
+             'pid': pid,
+             'tid': x['thread'],
+             'args': x['counts'],} for x in _events]
+
+
+#======================================================================
+def write_chrome(filepath):
+    """Writes the events to the filepath in the Chrome trace event
+    format and returns the filepath."""
+    with open(filepath, 'w') as trace_file:
+        json.dump({'traceEvents': chrome_events(),
+                   'displayTimeUnit': 'ms',},
+                  trace_file)
+    return filepath
+
+
+#======================================================================
+def summary():
+    """Returns a text table of the calls, total and mean time and summed
+    counts of the spans, grouped by where they were nested, in the order
+    they began."""
+    groups = {}
+    for event in _events:
+        path = event['path']
+        if not path in groups:
+            groups[path] = {'calls': 0,
+                            'seconds': 0.0,
+                            'start': event['start'],
+                            'counts': {},}
+        group = groups[path]
+        group['calls'] += 1
+        group['seconds'] += event['seconds']
+        group['start'] = min(group['start'], event['start'])
+        for key, value in event['counts'].items():
+            if isinstance(value, (int, float)):
+                group['counts'][key] = group['counts'].get(key, 0) + value
+
+    # Order each span after its parent, then by when it began.
+    def sort_key(path):
+        return [groups[path[:x + 1]]['start'] if path[:x + 1] in groups
+                else 0.0 for x in range(len(path))]
+
+    lines = ['{0:<40} {1:>6} {2:>11} {3:>10}  {4}'.format(
+                            'Span', 'Calls', 'Total ms', 'Mean ms', 'Counts')]
+    for path in sorted(groups, key=sort_key):
+        group = groups[path]
+        counts = ' '.join(['{0}={1}'.format(x, group['counts'][x])
+                           for x in sorted(group['counts'])])
+        lines.append('{0:<40} {1:>6} {2:>11.2f} {3:>10.2f}  {4}'.format(
+                            '  ' * (len(path) - 1) + path[-1],
+                            group['calls'],
+                            group['seconds'] * 1000.0,
+                            group['seconds'] * 1000.0 / group['calls'],
+                            counts))
+    return '\n'.join(lines)
+
+
+#======================================================================
+def report():
+    """Prints the summary of the spans."""
+    print(summary())
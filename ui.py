@@ -3,6 +3,7 @@
 import maya.cmds as cmds
 import re
 import animlib.defaults
+import animlib.document
 import animlib.file
 import animlib.apply
 
@@ -123,7 +124,7 @@ def build():
 #======================================================================
 def file_update(filepath):
     try:
-        data = animlib.file.read(filepath)
+        info_data = animlib.file.read_info(filepath)
     except:
         cmds.textField('animlib_filepath',
                         edit=True,
@@ -136,13 +137,6 @@ def file_update(filepath):
                     edit=True,
                        backgroundColor=[0.4,0.8,0.4],
                        enableBackground = True)
-    (info_data,
-     dependency_data,
-     reference_data,
-     anim_curve_data,
-     constraint_data,
-     pairblend_data,
-     channel_data,) = data
     if 'time' in info_data:
         cmds.textField('animlib_date',
                         edit=True,
@@ -394,14 +388,8 @@ def check_ref_map(input):
 #======================================================================
 def apply_file(input):
     filepath = cmds.textField('animlib_filepath', query=True, text=True)
-    data = animlib.file.read(filepath)
-    (info_data,
-     dependency_data,
-     reference_data,
-     anim_curve_data,
-     constraint_data,
-     pairblend_data,
-     channel_data,) = data
+    data = animlib.document.load(filepath)
+    info_data = data.info
     if 'references' in info_data.keys():
         reference_remap = read_ref_map(info_data['references'].keys())
     else:
@@ -413,10 +401,11 @@ def apply_file(input):
     build_unfound = cmds.radioButton('animlib_build_unfound',         
                                          query=True,
                                          select=True)
-    result = animlib.apply.build(data,
-                                 force_build=force_build_state,
-                                 reference_filter=reference_remap,
-                                 reference_unfound=build_unfound)
+    with data:
+        result = animlib.apply.build(data,
+                                     force_build=force_build_state,
+                                     reference_filter=reference_remap,
+                                     reference_unfound=build_unfound)
     ref_update(None)
     
 #======================================================================
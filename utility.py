@@ -0,0 +1,92 @@
+"""Exports and rebuilds utility nodes, such as blendWeighted, unitConver-
+sion and animBlendNode nodes, that only combine or convert the values
+passing between channels.
+
+Only the name and type of a utility node are exported. The values and
+connections of its input channels are exported with the channel data,
+and reapplied to the rebuilt node like those of any other channel.
+"""
+from animlib.scene import cmds
+import animlib.query
+
+# The input channels of each utility node type that are exported.
+ANIM_BLEND_ATTRS = ('inputA',
+                    'inputB',
+                    'weightA',
+                    'weightB',)
+SINGLE_ATTRS = {'blendWeighted':                  ('current',),
+                'unitConversion':                 ('input',
+                                                   'conversionFactor',),
+                'animBlendNodeAdditive':          ANIM_BLEND_ATTRS,
+                'animBlendNodeAdditiveDA':        ANIM_BLEND_ATTRS,
+                'animBlendNodeAdditiveDL':        ANIM_BLEND_ATTRS,
+                'animBlendNodeAdditiveF':         ANIM_BLEND_ATTRS,
+                'animBlendNodeAdditiveFA':        ANIM_BLEND_ATTRS,
+                'animBlendNodeAdditiveFL':        ANIM_BLEND_ATTRS,
+                'animBlendNodeAdditiveI16':       ANIM_BLEND_ATTRS,
+                'animBlendNodeAdditiveI32':       ANIM_BLEND_ATTRS,
+                'animBlendNodeAdditiveScale':     ANIM_BLEND_ATTRS +
+                                                  ('accumulationMode',),
+                'animBlendNodeBoolean':           ANIM_BLEND_ATTRS,
+                'animBlendNodeEnum':              ANIM_BLEND_ATTRS,
+                'animBlendNodeTime':              ANIM_BLEND_ATTRS,
+                'animBlendNodeAdditiveRotation':  ('inputAX',
+                                                   'inputAY',
+                                                   'inputAZ',
+                                                   'inputBX',
+                                                   'inputBY',
+                                                   'inputBZ',
+                                                   'weightA',
+                                                   'weightB',
+                                                   'rotateOrder',),}
+
+# The multi attributes of each utility node type, with the channels
+# exported for each of their elements.
+MULTI_ATTRS = {'blendWeighted': ('input', ('input[{0}]',
+                                           'weight[{0}]',)),}
+
+EXPORTABLE_TYPES = frozenset(SINGLE_ATTRS)
+
+#=======================================================================
+def export(utility_node):
+    """Returns the data necessary to rebuild the utility node so it is
+    ready to receive channel data.
+    """
+    node_type = cmds.nodeType(utility_node)
+    if not is_type_exportable(node_type):
+        return None
+    return {'name': utility_node,
+            'type': node_type,}
+
+
+#=======================================================================
+def build(utility_data, remap=None):
+    """Uses the utility data to rebuild the utility node ready to
+    receive channel data.
+    """
+    return cmds.createNode(utility_data['type'],
+                           name=utility_data['name'],
+                           skipSelect=True)
+
+
+#=======================================================================
+def is_type_exportable(node_type):
+    """Returns True if the node type is something we can export."""
+    return node_type in EXPORTABLE_TYPES
+
+
+#=======================================================================
+def list_channels(utility_node):
+    """Returns a list of channels that need values/connections published
+    to later rebuild the utility node.
+    """
+    node_type = animlib.query.node_type(utility_node)
+    if not is_type_exportable(node_type):
+        return None
+    attrs = [utility_node+'.'+x for x in SINGLE_ATTRS[node_type]]
+    if node_type in MULTI_ATTRS:
+        multi_attr, templates = MULTI_ATTRS[node_type]
+        indices = animlib.query.multi_indices(utility_node+'.'+multi_attr)
+        for i in indices or []:
+            attrs += [utility_node+'.'+x.format(i) for x in templates]
+    return attrs